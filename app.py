@@ -40,6 +40,7 @@ from dotenv import load_dotenv
 from main import run_scraper_with_progress
 import requests
 from services.uazapi import UazapiService
+from services.uazapi_async import run_uazapi_batch
 import re
 import pandas as pd
 import io
@@ -61,6 +62,8 @@ from utils.limits import (
 )
 from utils.cadence_uazapi import iter_fu1_folder_ids, merge_fu1_folder_into_config, parse_cadence_config
 from utils.lead_numeric_parse import coerce_lead_numeric_fields
+from utils.lead_bulk_update import bulk_update_campaign_leads
+from utils.media_public_url import resolve_media_token
 from utils.campaign_dispatch_audit import append_dispatch_audit_event
 from utils.uazapi_support_notify import (
     fetch_reconnect_inapp_alerts_for_user,
@@ -123,8 +126,8 @@ _UI_SEND_TERMINAL_STATUSES = frozenset({"failed", "invalid"})
 
 def sql_expr_campaign_lead_has_outbox_sent(lead_table_alias="campaign_leads"):
     """
-    Expressão SQL reutilizável: há linha em campaign_message_outbox com status sent
-    para o lead da linha externa. Usar na SELECT de listagens (tech-spec ui_send_status).
+    Expressão SQL reutilizável: há linha em campaign_message_outbox (viva ou arquivada) com
+    status sent para o lead da linha externa. Usar na SELECT de listagens (tech-spec ui_send_status).
 
     lead_table_alias: identificador da tabela campaign_leads no FROM (ex.: campaign_leads ou cl).
     """
@@ -132,7 +135,7 @@ def sql_expr_campaign_lead_has_outbox_sent(lead_table_alias="campaign_leads"):
     if not alias or not alias.replace("_", "").isalnum():
         raise ValueError("lead_table_alias deve ser identificador SQL seguro (alfanumérico + _)")
     return (
-        f"EXISTS (SELECT 1 FROM campaign_message_outbox o "
+        f"EXISTS (SELECT 1 FROM campaign_message_outbox_all o "
         f"WHERE o.campaign_lead_id = {alias}.id AND o.status = 'sent')"
     )
 
@@ -856,6 +859,52 @@ def _init_db_body() -> None:
             """
         )
 
+        # Variantes de telefone (com/sem 55, regra de normalize_phone_for_match) de phone e
+        # whatsapp_link, para casar leads com mensagens Uazapi num lookup indexado (``&&`` + GIN).
+        # Trigger preenche em qualquer INSERT/UPDATE; linhas antigas (NULL) ficam para
+        # scripts/backfill_campaign_leads_phone_norm.py — não reescrever a tabela a cada arranque.
+        cur.execute(
+            r"""
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'campaign_leads' AND column_name = 'phone_norm'
+                      AND data_type <> 'ARRAY'
+                ) THEN
+                    ALTER TABLE campaign_leads DROP COLUMN phone_norm;
+                END IF;
+            END $$;
+            ALTER TABLE campaign_leads ADD COLUMN IF NOT EXISTS phone_norm TEXT[];
+            CREATE OR REPLACE FUNCTION campaign_lead_phone_variants(raw TEXT) RETURNS TEXT[] AS $$
+                SELECT CASE
+                    WHEN length(d) < 10 THEN ARRAY[]::TEXT[]
+                    WHEN length(d) <= 11 AND d NOT LIKE '55%' THEN ARRAY[d, '55' || d]
+                    WHEN length(d) >= 12 AND d LIKE '55%' THEN ARRAY[d, substr(d, 3)]
+                    ELSE ARRAY[d]
+                END
+                FROM (SELECT regexp_replace(split_part(COALESCE(raw, ''), '@', 1), '\D', '', 'g') AS d) s;
+            $$ LANGUAGE sql IMMUTABLE;
+            CREATE OR REPLACE FUNCTION campaign_leads_set_phone_norm() RETURNS trigger AS $$
+            BEGIN
+                NEW.phone_norm := campaign_lead_phone_variants(NEW.phone)
+                    || campaign_lead_phone_variants(NEW.whatsapp_link);
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+            DROP FUNCTION IF EXISTS campaign_lead_phone_norm(TEXT);
+            DROP TRIGGER IF EXISTS trg_campaign_leads_phone_norm ON campaign_leads;
+            CREATE TRIGGER trg_campaign_leads_phone_norm
+                BEFORE INSERT OR UPDATE OF phone, whatsapp_link ON campaign_leads
+                FOR EACH ROW
+                EXECUTE FUNCTION campaign_leads_set_phone_norm();
+            CREATE INDEX IF NOT EXISTS idx_campaign_leads_phone_norm
+                ON campaign_leads USING GIN (phone_norm);
+            CREATE INDEX IF NOT EXISTS idx_campaign_leads_phone_norm_missing
+                ON campaign_leads (id) WHERE phone_norm IS NULL;
+            """
+        )
+
         # uazapi_last_send_lead_ids para sync via listfolders (F9)
         cur.execute(
             """
@@ -904,6 +953,8 @@ def _init_db_body() -> None:
             ALTER TABLE campaign_stage_sends ADD COLUMN IF NOT EXISTS fu_rollover_done BOOLEAN DEFAULT FALSE;
             ALTER TABLE campaign_stage_sends ADD COLUMN IF NOT EXISTS last_materialize_error TEXT;
             ALTER TABLE campaign_stage_sends ADD COLUMN IF NOT EXISTS materialize_attempt_count INTEGER DEFAULT 0;
+            ALTER TABLE campaign_stage_sends ADD COLUMN IF NOT EXISTS sync_watermark JSONB;
+            ALTER TABLE campaign_stage_sends ADD COLUMN IF NOT EXISTS sync_full_at TIMESTAMP;
             CREATE INDEX IF NOT EXISTS idx_campaign_stage_sends_campaign_stage
                 ON campaign_stage_sends(campaign_id, stage);
             CREATE INDEX IF NOT EXISTS idx_campaign_stage_sends_folder_id
@@ -985,6 +1036,8 @@ def _init_db_body() -> None:
                 ON campaign_message_outbox (instance_id, next_run_at);
             CREATE INDEX IF NOT EXISTS idx_campaign_message_outbox_campaign_updated
                 ON campaign_message_outbox (campaign_id, updated_at);
+            CREATE INDEX IF NOT EXISTS idx_campaign_message_outbox_pending_next_run
+                ON campaign_message_outbox (next_run_at) WHERE status = 'pending';
             CREATE UNIQUE INDEX IF NOT EXISTS uq_campaign_send_attempts_outbox_attempt
                 ON campaign_send_attempts (outbox_id, attempt_no);
             CREATE INDEX IF NOT EXISTS idx_campaign_send_attempts_outbox
@@ -992,6 +1045,25 @@ def _init_db_body() -> None:
             """
         )
 
+        # Outbox: NOTIFY quando há linha pending nova/reprogramada (acorda worker_message_outbox).
+        # Payload constante → o Postgres agrupa as notificações de uma mesma transação.
+        cur.execute(
+            """
+            CREATE OR REPLACE FUNCTION campaign_message_outbox_notify() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_notify('campaign_message_outbox', '');
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            DROP TRIGGER IF EXISTS trg_campaign_message_outbox_notify ON campaign_message_outbox;
+            CREATE TRIGGER trg_campaign_message_outbox_notify
+                AFTER INSERT OR UPDATE OF status, next_run_at ON campaign_message_outbox
+                FOR EACH ROW
+                WHEN (NEW.status = 'pending')
+                EXECUTE FUNCTION campaign_message_outbox_notify();
+            """
+        )
+
         # Pausa sistema vs utilizador (desconexão Uazapi — tech-spec desconexao-whatsapp)
         cur.execute(
             """
@@ -1056,6 +1128,164 @@ def _init_db_body() -> None:
             """
         )
 
+        # Gate de cooldown outbox: 1 UPDATE por envio em vez de reprogramar todas as linhas pending
+        cur.execute(
+            """
+            ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS outbox_next_allowed_send_at TIMESTAMP;
+            ALTER TABLE instances ADD COLUMN IF NOT EXISTS outbox_next_allowed_send_at TIMESTAMP;
+            COMMENT ON COLUMN campaigns.outbox_next_allowed_send_at IS
+                'Próximo envio outbox permitido para a campanha (cooldown ADR-2 após cada envio); NULL = livre.';
+            COMMENT ON COLUMN instances.outbox_next_allowed_send_at IS
+                'Próximo envio outbox permitido na instância (UAZAPI_OUTBOX_INSTANCE_MIN_INTERVAL_SECONDS); NULL = livre.';
+            """
+        )
+
+        # Contador de tentativas na própria linha outbox (evita MAX(attempt_no) por envio);
+        # backfill a partir de campaign_send_attempts só quando a coluna é criada.
+        cur.execute(
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name='campaign_message_outbox' AND column_name='attempt_count'
+                ) THEN
+                    ALTER TABLE campaign_message_outbox ADD COLUMN attempt_count INTEGER NOT NULL DEFAULT 0;
+                    UPDATE campaign_message_outbox o
+                    SET attempt_count = a.n
+                    FROM (
+                        SELECT outbox_id, MAX(attempt_no) AS n
+                        FROM campaign_send_attempts
+                        GROUP BY outbox_id
+                    ) a
+                    WHERE a.outbox_id = o.id;
+                END IF;
+            END $$;
+            COMMENT ON COLUMN campaign_message_outbox.attempt_count IS
+                'Tentativas registadas em campaign_send_attempts; incrementada no mesmo statement que grava o resultado (attempt_no = attempt_count).';
+            """
+        )
+
+        # Outbox multi-nó: claims com lease por worker, heartbeat e última instância servida (RR) por campanha
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox_workers (
+                worker_id TEXT PRIMARY KEY,
+                hostname TEXT,
+                pid INTEGER,
+                started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                heartbeat_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+            ALTER TABLE campaign_message_outbox ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+            ALTER TABLE campaign_message_outbox ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+            ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS outbox_last_instance_id INTEGER;
+            COMMENT ON TABLE outbox_workers IS
+                'Workers outbox vivos (heartbeat); base do hash consistente de instance_id entre nós.';
+            COMMENT ON COLUMN campaign_message_outbox.claimed_by IS
+                'worker_id que fez o claim (status sending); NULL fora de sending.';
+            COMMENT ON COLUMN campaign_message_outbox.lease_expires_at IS
+                'Fim do lease do claim; renovado pelo heartbeat do dono, reaper devolve a pending após expirar.';
+            COMMENT ON COLUMN campaigns.outbox_last_instance_id IS
+                'Última instância servida pela outbox (rotação round_robin entre instâncias da campanha).';
+            CREATE INDEX IF NOT EXISTS idx_campaign_message_outbox_sending_campaign
+                ON campaign_message_outbox (campaign_id) WHERE status = 'sending';
+            CREATE INDEX IF NOT EXISTS idx_campaign_message_outbox_sending_instance
+                ON campaign_message_outbox (instance_id) WHERE status = 'sending';
+            """
+        )
+
+        # Versão do conteúdo de envio (templates/mídia): invalida o cache em processo do worker outbox
+        cur.execute(
+            """
+            ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS outbox_content_version INTEGER NOT NULL DEFAULT 0;
+            COMMENT ON COLUMN campaigns.outbox_content_version IS
+                'Incrementada ao editar message_template da campanha ou dos passos; chave do cache de templates do worker outbox.';
+            """
+        )
+
+        # Follow-ups da cadência: leads em buffer (snoozed) com snooze vencido — enqueue set-based
+        # do worker outbox varre só este índice parcial (custo ∝ leads vencidos, não a campanhas).
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_campaign_leads_snoozed_due
+                ON campaign_leads (snooze_until)
+                WHERE cadence_status = 'snoozed'
+                  AND snooze_until IS NOT NULL
+                  AND COALESCE(removed_from_funnel, FALSE) = FALSE;
+            """
+        )
+
+        # Hot/cold da outbox: linhas finalizadas (sent/failed) antigas e as suas tentativas saem da
+        # fila viva para histórico particionado por mês (partições criadas por utils.outbox_archive).
+        # Leituras de estatística/auditoria usam as views *_all (viva + histórico).
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS campaign_message_outbox_history (
+                id INTEGER NOT NULL,
+                campaign_id INTEGER NOT NULL REFERENCES campaigns(id) ON DELETE CASCADE,
+                campaign_lead_id INTEGER NOT NULL,
+                instance_id INTEGER,
+                stage TEXT NOT NULL,
+                step_priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                queued_at TIMESTAMP NOT NULL,
+                next_run_at TIMESTAMP NOT NULL,
+                idempotency_key TEXT NOT NULL,
+                uazapi_track_id TEXT,
+                payload_summary JSONB NOT NULL DEFAULT '{}'::jsonb,
+                attempt_count INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP NOT NULL,
+                updated_at TIMESTAMP NOT NULL,
+                archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, updated_at)
+            ) PARTITION BY RANGE (updated_at);
+            CREATE TABLE IF NOT EXISTS campaign_send_attempts_history (
+                id INTEGER NOT NULL,
+                outbox_id INTEGER NOT NULL,
+                campaign_id INTEGER NOT NULL REFERENCES campaigns(id) ON DELETE CASCADE,
+                attempt_no INTEGER NOT NULL,
+                http_status INTEGER,
+                uazapi_response TEXT,
+                outcome TEXT NOT NULL,
+                latency_ms INTEGER,
+                started_at TIMESTAMP NOT NULL,
+                finished_at TIMESTAMP,
+                PRIMARY KEY (id, started_at)
+            ) PARTITION BY RANGE (started_at);
+            COMMENT ON TABLE campaign_message_outbox_history IS
+                'Linhas sent/failed arquivadas da campaign_message_outbox (partição mensal por updated_at).';
+            COMMENT ON TABLE campaign_send_attempts_history IS
+                'Tentativas das linhas arquivadas (partição mensal por started_at); uazapi_response compactado.';
+            CREATE INDEX IF NOT EXISTS idx_campaign_message_outbox_history_lead_stage
+                ON campaign_message_outbox_history (campaign_lead_id, stage);
+            CREATE INDEX IF NOT EXISTS idx_campaign_message_outbox_history_campaign
+                ON campaign_message_outbox_history (campaign_id, id);
+            CREATE INDEX IF NOT EXISTS idx_campaign_send_attempts_history_outbox
+                ON campaign_send_attempts_history (outbox_id);
+            CREATE INDEX IF NOT EXISTS idx_campaign_send_attempts_history_campaign
+                ON campaign_send_attempts_history (campaign_id, id);
+            CREATE OR REPLACE VIEW campaign_message_outbox_all AS
+                SELECT id, campaign_id, campaign_lead_id, instance_id, stage, step_priority, status,
+                       queued_at, next_run_at, idempotency_key, uazapi_track_id, payload_summary,
+                       attempt_count, created_at, updated_at, FALSE AS archived
+                FROM campaign_message_outbox
+                UNION ALL
+                SELECT id, campaign_id, campaign_lead_id, instance_id, stage, step_priority, status,
+                       queued_at, next_run_at, idempotency_key, uazapi_track_id, payload_summary,
+                       attempt_count, created_at, updated_at, TRUE AS archived
+                FROM campaign_message_outbox_history;
+            CREATE OR REPLACE VIEW campaign_send_attempts_all AS
+                SELECT a.id, a.outbox_id, o.campaign_id, a.attempt_no, a.http_status,
+                       a.uazapi_response, a.outcome, a.latency_ms, a.started_at, a.finished_at
+                FROM campaign_send_attempts a
+                JOIN campaign_message_outbox o ON o.id = a.outbox_id
+                UNION ALL
+                SELECT id, outbox_id, campaign_id, attempt_no, http_status,
+                       uazapi_response, outcome, latency_ms, started_at, finished_at
+                FROM campaign_send_attempts_history;
+            """
+        )
+
         # ============================================================
         # END UAZAPI CAMPAIGN API MIGRATIONS
         # ============================================================
@@ -2743,6 +2973,19 @@ def download():
     return send_file(path, as_attachment=True, download_name=filename)
 
 
+@app.route("/media/public/<token>", methods=["GET"])
+def public_campaign_media(token):
+    """
+    Mídia de campanha por link assinado (``UAZAPI_MEDIA_PUBLIC_BASE_URL``): a Uazapi baixa o
+    arquivo em vez de receber base64 em cada envio. Sem login; o token só vale enquanto o
+    arquivo não mudar.
+    """
+    path = resolve_media_token(token)
+    if not path:
+        abort(404)
+    return send_file(path, max_age=86400, conditional=True)
+
+
 
 
 @app.route("/webhook/hubla", methods=["POST"])
@@ -3409,7 +3652,7 @@ def campaign_kanban_data(campaign_id):
         cur.execute(
             """
             SELECT campaign_lead_id, lower(trim(stage)) AS stage
-            FROM campaign_message_outbox
+            FROM campaign_message_outbox_all
             WHERE campaign_id = %s AND status = 'sent'
             """,
             (campaign_id,),
@@ -4250,6 +4493,7 @@ def admin_campaign_detail_api(campaign_id):
 def admin_campaign_outbox_state(campaign_id):
     """
     Polling da fila Postgres ``campaign_message_outbox`` + tentativas (tech-spec §7, AC6).
+    Lê fila viva e histórico arquivado (views ``*_all``); ids são preservados no arquivo.
     Query: ``since_id`` (cursor de id outbox), ``since_attempt_id``, ``updated_after`` (ISO-8601).
     """
     gate = _require_message_outbox_phase1_api()
@@ -4291,7 +4535,7 @@ def admin_campaign_outbox_state(campaign_id):
             cur.execute(
                 """
                 SELECT id, user_id, name, status, sent_today, use_uazapi_sender, uazapi_folder_id,
-                       scheduled_start, created_at
+                       scheduled_start, created_at, outbox_next_allowed_send_at
                 FROM campaigns
                 WHERE id = %s
                 """,
@@ -4304,7 +4548,7 @@ def admin_campaign_outbox_state(campaign_id):
             cur.execute(
                 """
                 SELECT status, COUNT(*)::int AS n
-                FROM campaign_message_outbox
+                FROM campaign_message_outbox_all
                 WHERE campaign_id = %s
                 GROUP BY status
                 """,
@@ -4317,7 +4561,7 @@ def admin_campaign_outbox_state(campaign_id):
                 SELECT id, campaign_id, campaign_lead_id, instance_id, stage, step_priority, status,
                        queued_at, next_run_at, idempotency_key, uazapi_track_id, payload_summary,
                        created_at, updated_at
-                FROM campaign_message_outbox
+                FROM campaign_message_outbox_all
                 WHERE campaign_id = %s
                   AND (
                     id > %s
@@ -4334,9 +4578,8 @@ def admin_campaign_outbox_state(campaign_id):
                 """
                 SELECT a.id, a.outbox_id, a.attempt_no, a.http_status, a.outcome, a.latency_ms,
                        a.started_at, a.finished_at
-                FROM campaign_send_attempts a
-                INNER JOIN campaign_message_outbox o ON o.id = a.outbox_id
-                WHERE o.campaign_id = %s AND a.id > %s
+                FROM campaign_send_attempts_all a
+                WHERE a.campaign_id = %s AND a.id > %s
                 ORDER BY a.id ASC
                 LIMIT 400
                 """,
@@ -4363,7 +4606,7 @@ def admin_campaign_outbox_state(campaign_id):
 
         c = dict(camp)
         c["sent_today"] = _campaign_sent_today_for_display(campaign_id)
-        for k in ("scheduled_start", "created_at"):
+        for k in ("scheduled_start", "created_at", "outbox_next_allowed_send_at"):
             if k in c:
                 c[k] = _isoformat_dt(c[k])
 
@@ -4391,8 +4634,9 @@ def admin_campaign_outbox_state(campaign_id):
 @login_required
 def admin_campaign_dispatch_audit(campaign_id):
     """
-    Auditoria append-only dos disparos outbox (JSONL em disco).
-    Query: ``tail`` (max linhas a partir do fim, default 800, máx 5000), ``format=json|ndjson``.
+    Auditoria append-only dos disparos outbox (JSONL em disco, segmentado + índice).
+    Query: ``tail`` (max linhas a partir do fim, default 800, máx 5000), ``format=json|ndjson``,
+    filtros opcionais ``lead_id``, ``outbox_id``, ``outcome`` (resolvidos pelo índice).
     """
     gate = _require_message_outbox_phase1_api()
     if gate:
@@ -4403,8 +4647,23 @@ def admin_campaign_dispatch_audit(campaign_id):
         tail_n = min(5000, max(1, int(request.args.get("tail", "800"))))
     except (TypeError, ValueError):
         tail_n = 800
-
-    from utils.campaign_dispatch_audit import dispatch_audit_jsonl_path
+    filters = {}
+    for key in ("lead_id", "outbox_id"):
+        raw = (request.args.get(key) or "").strip()
+        if raw:
+            try:
+                filters[key] = int(raw)
+            except ValueError:
+                return jsonify({"error": "invalid_filter", "message": f"{key} deve ser inteiro."}), 400
+    outcome_filter = (request.args.get("outcome") or "").strip()
+    if outcome_filter:
+        filters["outcome"] = outcome_filter
+
+    from utils.campaign_dispatch_audit import (
+        dispatch_audit_jsonl_path,
+        dispatch_audit_segment_paths,
+        read_dispatch_audit_tail,
+    )
 
     conn = get_db_connection()
     try:
@@ -4418,15 +4677,13 @@ def admin_campaign_dispatch_audit(campaign_id):
         conn.close()
 
     path = dispatch_audit_jsonl_path(uid, campaign_id, ensure_parent=False)
-    if not os.path.isfile(path):
+    if not dispatch_audit_segment_paths(uid, campaign_id):
         if fmt == "ndjson":
             return Response("", mimetype="application/x-ndjson")
         return jsonify({"campaign_id": campaign_id, "path": path, "events": [], "truncated": False})
 
-    with open(path, "r", encoding="utf-8") as f:
-        all_lines = f.readlines()
-    chunk = all_lines[-tail_n:]
-    truncated = len(all_lines) > tail_n
+    raw_lines, truncated = read_dispatch_audit_tail(uid, campaign_id, tail_n, **filters)
+    chunk = [ln.decode("utf-8", errors="replace") for ln in raw_lines]
 
     if fmt == "ndjson":
         return Response("".join(chunk), mimetype="application/x-ndjson")
@@ -4448,6 +4705,7 @@ def admin_campaign_dispatch_audit(campaign_id):
             "events": events,
             "truncated": truncated,
             "returned_lines": len(chunk),
+            "filters": filters,
         }
     )
 
@@ -5272,10 +5530,18 @@ def admin_sync_campaigns():
 
         uazapi = UazapiService()
         synced_campaign_ids = set()
+        # Um list_folders por token, todos em paralelo (~1 round-trip no total).
+        tokens = list(sends_by_token)
+        folders_by_token = dict(zip(
+            tokens,
+            run_uazapi_batch([("list_folders_cached", t, {}) for t in tokens], service=uazapi),
+        ))
 
         for token, token_sends in sends_by_token.items():
             try:
-                folders_list = uazapi.list_folders(token)
+                folders_list = folders_by_token.get(token)
+                if isinstance(folders_list, Exception):
+                    raise folders_list
                 if not folders_list:
                     continue
                 folders_by_id = {}
@@ -5361,6 +5627,22 @@ def admin_sync_campaigns():
         conn.close()
 
 
+def _bump_campaign_outbox_content_version(cur, campaign_id: int) -> None:
+    """Invalida o cache de templates/mídia do worker outbox (chave ``outbox_content_version``)."""
+    cur.execute(
+        "UPDATE campaigns SET outbox_content_version = outbox_content_version + 1 WHERE id = %s",
+        (campaign_id,),
+    )
+
+
+def _reset_campaign_outbox_send_gate(cur, campaign_id: int) -> None:
+    """Janela de envio alterada: limpa ``outbox_next_allowed_send_at`` (adiado para a janela antiga)."""
+    cur.execute(
+        "UPDATE campaigns SET outbox_next_allowed_send_at = NULL WHERE id = %s",
+        (campaign_id,),
+    )
+
+
 @app.route('/api/admin/campaigns/<int:campaign_id>/update', methods=['POST'])
 @login_required
 @admin_required
@@ -5410,6 +5692,8 @@ def admin_update_campaign(campaign_id):
                 cur.execute("UPDATE campaigns SET send_saturday = %s WHERE id = %s", (bool(data['send_saturday']), campaign_id))
             if 'send_sunday' in data and 'send_sunday' in allowed:
                 cur.execute("UPDATE campaigns SET send_sunday = %s WHERE id = %s", (bool(data['send_sunday']), campaign_id))
+            if {'send_hour_start', 'send_hour_end', 'send_saturday', 'send_sunday'} & set(data) & allowed:
+                _reset_campaign_outbox_send_gate(cur, campaign_id)
             if 'delay_min_minutes' in data and 'delay_min_minutes' in allowed:
                 cur.execute("UPDATE campaigns SET delay_min_minutes = %s WHERE id = %s", (data['delay_min_minutes'], campaign_id))
             if 'delay_max_minutes' in data and 'delay_max_minutes' in allowed:
@@ -5417,6 +5701,7 @@ def admin_update_campaign(campaign_id):
             if 'message_templates' in data and 'message_templates' in allowed:
                 templates = json.dumps(data['message_templates'])
                 cur.execute("UPDATE campaigns SET message_template = %s WHERE id = %s", (templates, campaign_id))
+                _bump_campaign_outbox_content_version(cur, campaign_id)
             if 'scheduled_start' in data and 'scheduled_start' in allowed:
                 val = data['scheduled_start']
                 if val:
@@ -5446,6 +5731,7 @@ def admin_update_campaign(campaign_id):
                             message_template = EXCLUDED.message_template,
                             delay_days = EXCLUDED.delay_days
                     """, (campaign_id, step_number, step_label, step_template_json, delay_days))
+                _bump_campaign_outbox_content_version(cur, campaign_id)
 
         conn.commit()
         return json.dumps({'success': True})
@@ -6451,7 +6737,7 @@ def _campaign_has_message_outbox_rows(campaign_id: int) -> bool:
     try:
         with conn.cursor() as cur:
             cur.execute(
-                "SELECT 1 FROM campaign_message_outbox WHERE campaign_id = %s LIMIT 1",
+                "SELECT 1 FROM campaign_message_outbox_all WHERE campaign_id = %s LIMIT 1",
                 (campaign_id,),
             )
             return cur.fetchone() is not None
@@ -7217,8 +7503,10 @@ def _enqueue_uazapi_initial_outbox(
 ) -> tuple[int, datetime]:
     """
     Enfileira etapa ``initial`` em ``campaign_message_outbox`` (worker → ``/send/text``).
-    Retorna (n_rows, next_run_at).
+    Retorna (n_rows, next_run_at); ``n_rows`` conta só as linhas inseridas.
     """
+    from worker_message_outbox import insert_outbox_rows, outbox_enqueue_row
+
     parsed_ss = (
         _parse_iso_datetime_local(scheduled_start) if scheduled_start else None
     )
@@ -7228,49 +7516,34 @@ def _enqueue_uazapi_initial_outbox(
     else:
         next_run_at_val = now_utc
     n_allowed = len(allowed_instances)
+    payload_summary = json.dumps(
+        {
+            "stage": "initial",
+            "enqueue": flow,
+            "rotation_mode": rotation_mode,
+        }
+    )
+    rows = [
+        outbox_enqueue_row(
+            campaign_id=campaign_id,
+            lead_id=int(lead["id"]),
+            instance_id=int(
+                allowed_instances[i % n_allowed if rotation_mode == "round_robin" else 0][
+                    "instance_id"
+                ]
+            ),
+            stage="initial",
+            position=i,
+            queued_base=now_utc,
+            next_run_at=next_run_at_val,
+            payload_summary=payload_summary,
+        )
+        for i, lead in enumerate(leads)
+    ]
     conn_o = get_db_connection()
     try:
         with conn_o.cursor() as cur:
-            for i, lead in enumerate(leads):
-                if rotation_mode == "round_robin":
-                    inst = allowed_instances[i % n_allowed]
-                else:
-                    inst = allowed_instances[0]
-                lead_id = int(lead["id"])
-                instance_id = int(inst["instance_id"])
-                idempotency_key = f"campaign-{campaign_id}-lead-{lead_id}-initial"
-                payload_summary = json.dumps(
-                    {
-                        "stage": "initial",
-                        "enqueue": flow,
-                        "rotation_mode": rotation_mode,
-                    }
-                )
-                queued_at_val = now_utc + timedelta(
-                    seconds=i // 1_000_000, microseconds=i % 1_000_000
-                )
-                cur.execute(
-                    """
-                    INSERT INTO campaign_message_outbox (
-                        campaign_id, campaign_lead_id, instance_id,
-                        stage, step_priority, status, queued_at,
-                        next_run_at, idempotency_key, payload_summary
-                    )
-                    VALUES (
-                        %s, %s, %s, 'initial', 0, 'pending',
-                        %s, %s, %s, %s::jsonb
-                    )
-                    """,
-                    (
-                        campaign_id,
-                        lead_id,
-                        instance_id,
-                        queued_at_val,
-                        next_run_at_val,
-                        idempotency_key,
-                        payload_summary,
-                    ),
-                )
+            n_rows = insert_outbox_rows(cur, rows)
             lead_ids_out = [int(x["id"]) for x in leads]
             cur.execute(
                 """
@@ -7287,7 +7560,7 @@ def _enqueue_uazapi_initial_outbox(
         conn_o.commit()
     finally:
         conn_o.close()
-    return len(leads), next_run_at_val
+    return n_rows, next_run_at_val
 
 
 def _enqueue_uazapi_stage_outbox(
@@ -7306,27 +7579,22 @@ def _enqueue_uazapi_stage_outbox(
     from worker_message_outbox import enqueue_outbox_rows_for_leads
 
     cid = int(campaign_id)
-    n_allowed = len(allowed_instances)
+    instance_ids = [int(inst["instance_id"]) for inst in allowed_instances]
+    if rotation_mode != "round_robin":
+        instance_ids = instance_ids[:1]
     nr = next_run_at if next_run_at is not None else datetime.utcnow()
     conn_o = get_db_connection()
-    total = 0
     try:
-        for i, lead in enumerate(leads):
-            if rotation_mode == "round_robin":
-                inst = allowed_instances[i % n_allowed]
-            else:
-                inst = allowed_instances[0]
-            lead_id = int(lead["id"] if isinstance(lead, dict) else lead)
-            instance_id = int(inst["instance_id"])
-            total += enqueue_outbox_rows_for_leads(
-                conn_o,
-                campaign_id=cid,
-                stage=stage,
-                lead_ids=[lead_id],
-                instance_id=instance_id,
-                enqueue_source=flow,
-                next_run_at=nr,
-            )
+        total = enqueue_outbox_rows_for_leads(
+            conn_o,
+            campaign_id=cid,
+            stage=stage,
+            lead_ids=[int(lead["id"] if isinstance(lead, dict) else lead) for lead in leads],
+            instance_id=instance_ids[0],
+            enqueue_source=flow,
+            next_run_at=nr,
+            instance_ids=instance_ids,
+        )
         if total:
             with conn_o.cursor() as cur:
                 cur.execute(
@@ -7723,9 +7991,13 @@ def _create_campaign_core(user_id, data, admin_id=None):
                     (campaign_id,)
                 )
                 pending_ids = [r[0] for r in cur.fetchall()]
-                for i, lead_id in enumerate(pending_ids):
-                    batch_num = (i // per_instance_limit) + 1
-                    cur.execute("UPDATE campaign_leads SET send_batch = %s WHERE id = %s", (batch_num, lead_id))
+                bulk_update_campaign_leads(
+                    cur,
+                    (
+                        (lead_id, {"send_batch": (i // per_instance_limit) + 1})
+                        for i, lead_id in enumerate(pending_ids)
+                    ),
+                )
             conn.commit()
             conn.close()
         
@@ -8567,7 +8839,9 @@ def sync_campaign_uazapi_stats(campaign_id):
         folder_id = campaign.get('uazapi_folder_id')
         conn = get_db_connection()
         try:
-            result = sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi)
+            result = sync_campaign_leads_from_uazapi(
+                conn, campaign_id, token, folder_id, uazapi, force_full=True
+            )
         finally:
             conn.close()
 
@@ -9105,7 +9379,7 @@ def _reconciled_uazapi_single_folder_list_folders(campaign_id, campaign_row, tot
     uazapi = UazapiService()
     folder_id = campaign_row.get("uazapi_folder_id")
     token = inst["apikey"]
-    folders = uazapi.list_folders(token)
+    folders = uazapi.list_folders_cached(token)
     if isinstance(folders, dict):
         folders = folders.get("folders") or folders.get("data") or folders.get("items") or []
     if not isinstance(folders, list):
@@ -10204,6 +10478,7 @@ def update_campaign(campaign_id):
             if 'message_templates' in data:
                 templates = json.dumps(data['message_templates'])
                 cur.execute("UPDATE campaigns SET message_template = %s WHERE id = %s", (templates, campaign_id))
+                _bump_campaign_outbox_content_version(cur, campaign_id)
                 
         conn.commit()
         return json.dumps({'success': True})
@@ -10291,6 +10566,7 @@ def update_step_template(campaign_id, step_number):
                 SET message_template = %s 
                 WHERE campaign_id = %s AND step_number = %s
             """, (json_tpl, campaign_id, step_number))
+            _bump_campaign_outbox_content_version(cur, campaign_id)
             
         conn.commit()
         return json.dumps({'success': True})
@@ -10458,6 +10734,7 @@ def migrate_cadence_route():
                             INSERT INTO campaign_steps (campaign_id, step_number, step_label, message_template, delay_days)
                             VALUES (%s, %s, %s, %s, %s)
                         """, (cid, s_num, s_label, s_msg, s_delay))
+                    _bump_campaign_outbox_content_version(cur, cid)
                     log.append(" <span style='color:green'>Steps criados.</span>")
                 else:
                     log.append(" <span style='color:gray'>Steps já existem.</span>")
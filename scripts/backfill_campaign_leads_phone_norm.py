@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Preenche ``campaign_leads.phone_norm`` (variantes com/sem 55 de phone e whatsapp_link) nas
+linhas anteriores ao trigger ``trg_campaign_leads_phone_norm``.
+
+Executar UMA vez após o deploy que criou a coluna (``init_db`` só cria coluna, função, trigger
+e índices). Trabalha em lotes por ``id`` com commit por lote; pode ser interrompido e relançado.
+Enquanto houver linhas NULL, o match de telefone do sync calcula-as em Python.
+
+Uso:
+  python scripts/backfill_campaign_leads_phone_norm.py
+  python scripts/backfill_campaign_leads_phone_norm.py --batch-size 2000
+"""
+import argparse
+import os
+
+import psycopg2
+
+
+def get_db_connection():
+    return psycopg2.connect(
+        host=os.environ.get("DB_HOST", "localhost"),
+        database=os.environ.get("DB_NAME", "leads_infinitos"),
+        user=os.environ.get("DB_USER", "postgres"),
+        password=os.environ.get("DB_PASSWORD", ""),
+        port=os.environ.get("DB_PORT", "5432"),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill de campaign_leads.phone_norm (linhas NULL)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Linhas por lote/commit")
+    args = parser.parse_args()
+    batch_size = max(1, args.batch_size)
+
+    conn = get_db_connection()
+    total = 0
+    try:
+        while True:
+            with conn.cursor() as cur:
+                # Índice parcial idx_campaign_leads_phone_norm_missing: só toca linhas por preencher.
+                cur.execute(
+                    """
+                    UPDATE campaign_leads cl
+                    SET phone_norm = campaign_lead_phone_variants(cl.phone)
+                        || campaign_lead_phone_variants(cl.whatsapp_link)
+                    FROM (
+                        SELECT id FROM campaign_leads
+                        WHERE phone_norm IS NULL
+                        ORDER BY id
+                        LIMIT %s
+                    ) todo
+                    WHERE cl.id = todo.id
+                    """,
+                    (batch_size,),
+                )
+                updated = cur.rowcount
+            conn.commit()
+            total += updated
+            if updated:
+                print(f"phone_norm: +{updated} (total {total})")
+            if updated < batch_size:
+                break
+    finally:
+        conn.close()
+    print(f"Backfill concluído: {total} linha(s).")
+
+
+if __name__ == "__main__":
+    main()
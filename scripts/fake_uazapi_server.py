@@ -0,0 +1,677 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor Uazapi falso (local) guiado por ``uazapi-openapi-spec (1).yaml``.
+
+Implementa, com estado em memória, as rotas que o projeto usa:
+``/send/text``, ``/send/media``, ``/sender/advanced``, ``/sender/listfolders``,
+``/sender/listmessages``, ``/sender/edit``, ``/message/find``, ``/chat/check`` e
+``/instance/status``. O spec define as rotas válidas (uma rota implementada que não exista no
+YAML aborta o arranque) e os campos obrigatórios de cada corpo JSON (ausentes → HTTP 400).
+
+Pastas de ``/sender/advanced`` avançam com o tempo: cada mensagem fica ``Scheduled`` até ao
+seu instante (``delayMin``..``delayMax`` × ``--delay-scale``) e passa a ``Sent``/``Failed``,
+atualizando ``log_sucess``/``log_failed`` e o histórico usado por ``/message/find``.
+
+Injeção de falhas (global, alterável em runtime via ``POST /__fake__/config``): latência fixa +
+jitter, taxa de erro 500 e taxa de 504 (gateway). ``POST /__fake__/reset`` limpa o estado;
+``GET /__fake__/state`` devolve contadores para benchmarks.
+
+Uso (raiz do repo)::
+
+  python scripts/fake_uazapi_server.py --port 8088 --latency-ms 80 --jitter-ms 40 \\
+      --error-rate 0.01 --gateway-timeout-rate 0.005
+  UAZAPI_URL=http://127.0.0.1:8088 python worker_message_outbox.py
+
+Tokens desconhecidos são registados como instâncias ligadas. ``--disconnected TOKEN`` e
+``--revoked TOKEN`` simulam instância sem sessão (500 "No session") e token inválido (401).
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import http.server
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SPEC_PATH = os.path.join(ROOT, "uazapi-openapi-spec (1).yaml")
+
+# (método, caminho) implementados pelo fake.
+ROUTES = (
+    ("POST", "/send/text"),
+    ("POST", "/send/media"),
+    ("POST", "/sender/advanced"),
+    ("GET", "/sender/listfolders"),
+    ("POST", "/sender/listmessages"),
+    ("POST", "/sender/edit"),
+    ("POST", "/message/find"),
+    ("POST", "/chat/check"),
+    ("GET", "/instance/status"),
+)
+
+_ACTIVE_FOLDER_STATUSES = ("scheduled", "sending", "paused")
+
+
+@functools.lru_cache(maxsize=4)
+def load_spec_routes(spec_path: str = DEFAULT_SPEC_PATH) -> dict[tuple[str, str], list[str]]:
+    """``{(método, caminho): campos obrigatórios do corpo}`` a partir do OpenAPI (em cache)."""
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(spec_path, encoding="utf-8") as fh:
+        spec = yaml.load(fh, Loader=loader)
+    paths = spec.get("paths") or {}
+    routes = {}
+    for method, path in ROUTES:
+        op = (paths.get(path) or {}).get(method.lower())
+        if op is None:
+            raise ValueError(f"rota {method} {path} não existe no spec {spec_path}")
+        schema = (
+            ((op.get("requestBody") or {}).get("content") or {}).get("application/json") or {}
+        ).get("schema") or {}
+        routes[(method, path)] = list(schema.get("required") or [])
+    return routes
+
+
+class FaultConfig:
+    """Falhas injetadas antes do handler (latência em ms; taxas entre 0 e 1)."""
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        gateway_timeout_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.gateway_timeout_rate = gateway_timeout_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def update(self, values: dict[str, Any]) -> None:
+        for key in ("latency_ms", "jitter_ms", "error_rate", "gateway_timeout_rate"):
+            if key in values:
+                setattr(self, key, float(values[key]))
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "latency_ms": self.latency_ms,
+            "jitter_ms": self.jitter_ms,
+            "error_rate": self.error_rate,
+            "gateway_timeout_rate": self.gateway_timeout_rate,
+        }
+
+    def draw(self) -> tuple[float, Optional[int]]:
+        """(atraso em segundos, status HTTP injetado ou None)."""
+        with self._lock:
+            delay = self.latency_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+            roll = self._rng.random()
+        if roll < self.gateway_timeout_rate:
+            return delay / 1000.0, 504
+        if roll < self.gateway_timeout_rate + self.error_rate:
+            return delay / 1000.0, 500
+        return delay / 1000.0, None
+
+
+class FakeUazapiState:
+    """Instâncias, pastas e mensagens em memória (thread-safe)."""
+
+    def __init__(
+        self,
+        delay_scale: float = 0.0,
+        message_failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.delay_scale = delay_scale
+        self.message_failure_rate = message_failure_rate
+        self._rng = random.Random(seed)
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.instances: dict[str, dict[str, Any]] = {}
+            self.revoked: set[str] = set()
+            self.not_on_whatsapp: set[str] = set()
+            self.folders: dict[str, dict[str, Any]] = {}
+            # folder_id -> mensagens (ordem de criação)
+            self.folder_messages: dict[str, list[dict[str, Any]]] = {}
+            # (token, chatid) -> mensagens
+            self.chats: dict[tuple[str, str], list[dict[str, Any]]] = {}
+            # (token, track_source, track_id) -> mensagem (idempotência de /send/*)
+            self.tracked: dict[tuple[str, str, str], dict[str, Any]] = {}
+            self.requests: dict[str, int] = {}
+            # (caminho, token) -> pedidos (testes contam tráfego por instância)
+            self.requests_by_token: dict[tuple[str, str], int] = {}
+
+    # --- instâncias ---
+
+    def instance(self, token: str) -> dict[str, Any]:
+        with self.lock:
+            inst = self.instances.get(token)
+            if inst is None:
+                inst = self.instances[token] = {
+                    "id": "r" + uuid.uuid4().hex[:14],
+                    "name": f"fake-{token[-4:]}",
+                    "status": "connected",
+                }
+            return inst
+
+    def set_connected(self, token: str, connected: bool) -> None:
+        self.instance(token)["status"] = "connected" if connected else "disconnected"
+
+    # --- mensagens ---
+
+    def _new_message(
+        self, token: str, number: str, *, text: str, message_type: str, status: str, **extra
+    ) -> dict[str, Any]:
+        digits = "".join(ch for ch in str(number) if ch.isdigit()) or str(number)
+        now_ms = int(time.time() * 1000)
+        msg = {
+            "id": uuid.uuid4().hex[:20].upper(),
+            "messageid": uuid.uuid4().hex[:20].upper(),
+            "chatid": f"{digits}@s.whatsapp.net",
+            "fromMe": True,
+            "isGroup": False,
+            "messageType": message_type,
+            "messageTimestamp": now_ms,
+            "status": status,
+            "text": text or "",
+            "owner": self.instance(token)["id"],
+            "wasSentByApi": True,
+            "send_folder_id": "",
+            "track_source": "",
+            "track_id": "",
+        }
+        msg.update(extra)
+        return msg
+
+    def _append_chat(self, token: str, msg: dict[str, Any]) -> None:
+        self.chats.setdefault((token, msg["chatid"]), []).append(msg)
+
+    def send_direct(self, token: str, body: dict[str, Any], message_type: str) -> dict[str, Any]:
+        track = (token, str(body.get("track_source") or ""), str(body.get("track_id") or ""))
+        with self.lock:
+            if track[2] and track in self.tracked:
+                return self.tracked[track]
+            msg = self._new_message(
+                token,
+                body.get("number"),
+                text=body.get("text") or "",
+                message_type=message_type,
+                status="Sent",
+                track_source=track[1],
+                track_id=track[2],
+            )
+            if message_type != "text":
+                msg["fileURL"] = str(body.get("file") or "")[:200]
+            self._append_chat(token, msg)
+            if track[2]:
+                self.tracked[track] = msg
+            return msg
+
+    # --- pastas (/sender/advanced) ---
+
+    def create_folder(self, token: str, body: dict[str, Any]) -> dict[str, Any]:
+        now = time.time()
+        sched = body.get("scheduled_for")
+        start = now
+        if isinstance(sched, (int, float)) and sched > 0:
+            # Timestamp em ms ou minutos a partir de agora (como documentado no spec).
+            start = sched / 1000.0 if sched > 10**11 else now + sched * 60 * self.delay_scale
+        dmin = max(0, int(body.get("delayMin") or 0))
+        dmax = max(dmin, int(body.get("delayMax") or dmin))
+        folder_id = "r" + uuid.uuid4().hex[:14]
+        with self.lock:
+            due = start
+            msgs = []
+            for item in body.get("messages") or []:
+                msg = self._new_message(
+                    token,
+                    item.get("number"),
+                    text=item.get("text") or "",
+                    message_type=item.get("type") or "text",
+                    status="Scheduled",
+                    send_folder_id=folder_id,
+                    track_source=str(item.get("track_source") or ""),
+                    track_id=str(item.get("track_id") or ""),
+                )
+                msg["_due_at"] = due
+                msgs.append(msg)
+                due += self._rng.uniform(dmin, dmax) * self.delay_scale
+            self.folder_messages[folder_id] = msgs
+            self.folders[folder_id] = {
+                "id": folder_id,
+                "info": body.get("info") or "",
+                "status": "scheduled",
+                "scheduled_for": int(start * 1000),
+                "delayMin": dmin,
+                "delayMax": dmax,
+                "log_delivered": 0,
+                "log_failed": 0,
+                "log_played": 0,
+                "log_read": 0,
+                "log_sucess": 0,
+                "log_total": len(msgs),
+                "owner": self.instance(token)["id"],
+                "created": int(now * 1000),
+                "updated": int(now * 1000),
+                "_token": token,
+            }
+        return {"folder_id": folder_id, "count": len(msgs), "status": "queued"}
+
+    def advance(self, now: Optional[float] = None) -> None:
+        """Processa mensagens vencidas das pastas ativas de instâncias ligadas."""
+        now = time.time() if now is None else now
+        with self.lock:
+            for folder_id, folder in self.folders.items():
+                if folder["status"] not in ("scheduled", "sending"):
+                    continue
+                if self.instance(folder["_token"])["status"] != "connected":
+                    continue
+                pending = 0
+                for msg in self.folder_messages.get(folder_id, []):
+                    if msg["status"] != "Scheduled":
+                        continue
+                    if msg["_due_at"] > now:
+                        pending += 1
+                        continue
+                    number = msg["chatid"].split("@", 1)[0]
+                    failed = (
+                        number in self.not_on_whatsapp
+                        or self._rng.random() < self.message_failure_rate
+                    )
+                    msg["status"] = "Failed" if failed else "Sent"
+                    msg["messageTimestamp"] = int(now * 1000)
+                    if failed:
+                        msg["error"] = "number not on whatsapp"
+                        folder["log_failed"] += 1
+                    else:
+                        folder["log_sucess"] += 1
+                        folder["log_delivered"] += 1
+                        self._append_chat(folder["_token"], msg)
+                folder["status"] = "sending" if pending else "done"
+                folder["updated"] = int(now * 1000)
+
+    def edit_folder(self, token: str, folder_id: str, action: str) -> Optional[dict[str, Any]]:
+        with self.lock:
+            folder = self.folders.get(folder_id)
+            if folder is None or folder["_token"] != token:
+                return None
+            if action == "delete":
+                del self.folders[folder_id]
+                self.folder_messages.pop(folder_id, None)
+                return {"status": "deleted"}
+            if action == "stop":
+                folder["status"] = "paused"
+                return {"status": "paused"}
+            folder["status"] = "scheduled"
+            return {"status": "scheduled", "message": "Campaign resumed"}
+
+    def list_folders(self, token: str, status: Optional[str]) -> list[dict[str, Any]]:
+        with self.lock:
+            out = []
+            for folder in self.folders.values():
+                if folder["_token"] != token:
+                    continue
+                active = folder["status"] in _ACTIVE_FOLDER_STATUSES
+                if status == "Active" and not active or status == "Archived" and active:
+                    continue
+                out.append(_public(folder))
+            return out
+
+    def list_messages(
+        self, token: str, folder_id: str, status: Optional[str], page: int, page_size: int
+    ) -> Optional[dict[str, Any]]:
+        with self.lock:
+            folder = self.folders.get(folder_id)
+            if folder is None or folder["_token"] != token:
+                return None
+            msgs = [
+                m
+                for m in self.folder_messages.get(folder_id, [])
+                if not status or m["status"].lower() == status.lower()
+            ]
+            total = len(msgs)
+            start = (page - 1) * page_size
+            return {
+                "messages": [_public(m) for m in msgs[start : start + page_size]],
+                "pagination": {
+                    "total": total,
+                    "page": page,
+                    "pageSize": page_size,
+                    "lastPage": max(1, -(-total // page_size)),
+                },
+            }
+
+    def find_messages(self, token: str, body: dict[str, Any]) -> dict[str, Any]:
+        limit = max(1, min(int(body.get("limit") or 100), 1000))
+        offset = max(0, int(body.get("offset") or 0))
+        with self.lock:
+            chatid = body.get("chatid")
+            pool = (
+                self.chats.get((token, chatid), [])
+                if chatid
+                else [m for (tok, _), ms in self.chats.items() if tok == token for m in ms]
+            )
+            msgs = [
+                m
+                for m in pool
+                if (not body.get("id") or body["id"] in (m["id"], m["messageid"]))
+                and (not body.get("track_id") or m["track_id"] == body["track_id"])
+                and (not body.get("track_source") or m["track_source"] == body["track_source"])
+            ]
+            msgs.sort(key=lambda m: m["messageTimestamp"], reverse=True)
+            page = msgs[offset : offset + limit]
+            has_more = offset + limit < len(msgs)
+            return {
+                "returnedMessages": len(page),
+                "messages": [_public(m) for m in page],
+                "limit": limit,
+                "offset": offset,
+                "nextOffset": offset + len(page),
+                "hasMore": has_more,
+            }
+
+    def count_request(self, path: str, token: str = "") -> None:
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            key = (path, token)
+            self.requests_by_token[key] = self.requests_by_token.get(key, 0) + 1
+
+    def hits(self, path: str, token: str) -> int:
+        with self.lock:
+            return self.requests_by_token.get((path, token), 0)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "instances": len(self.instances),
+                "folders": {fid: _public(f) for fid, f in self.folders.items()},
+                "direct_messages": len(self.tracked),
+            }
+
+
+def _public(obj: dict[str, Any]) -> dict[str, Any]:
+    """Cópia sem campos internos (``_due_at``, ``_token``)."""
+    return {k: v for k, v in obj.items() if not k.startswith("_")}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeUazapiServer"
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            super().log_message(*args)
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return {}
+        return json.loads(raw.decode("utf-8"))
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str) -> None:
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip("/") or "/"
+        try:
+            body = self._read_json() if method == "POST" else {}
+        except (ValueError, UnicodeDecodeError):
+            self._send_json(400, {"error": "invalid JSON body"})
+            return
+        if path.startswith("/__fake__/"):
+            self._admin(method, path, body)
+            return
+        state = self.server.state
+        state.count_request(path, (self.headers.get("token") or "").strip())
+        required = self.server.routes.get((method, path))
+        if required is None:
+            self._send_json(404, {"error": f"route not implemented by fake: {method} {path}"})
+            return
+
+        delay, injected = self.server.faults.draw()
+        if delay:
+            time.sleep(delay)
+        if injected == 504:
+            self._send_json(504, {"error": "Gateway Time-out"})
+            return
+        if injected == 500:
+            self._send_json(500, {"error": "internal server error (injected)"})
+            return
+
+        token = (self.headers.get("token") or "").strip()
+        if not token or token in state.revoked:
+            self._send_json(401, {"error": "Invalid token"})
+            return
+        if not isinstance(body, dict):
+            self._send_json(400, {"error": "JSON body must be an object"})
+            return
+        missing = [f for f in required if body.get(f) in (None, "")]
+        if missing:
+            self._send_json(400, {"error": f"missing required field: {missing[0]}"})
+            return
+
+        state.advance()
+        inst = state.instance(token)
+        if path == "/instance/status":
+            connected = inst["status"] == "connected"
+            self._send_json(
+                200,
+                {
+                    "instance": dict(inst, token=token, profileName=inst["name"]),
+                    "status": {"connected": connected, "loggedIn": connected, "jid": None},
+                },
+            )
+            return
+        if path in ("/send/text", "/send/media", "/sender/advanced") and (
+            inst["status"] != "connected"
+        ):
+            self._send_json(500, {"error": "No session"})
+            return
+        if path == "/send/text":
+            msg = state.send_direct(token, body, "text")
+            self._send_json(
+                200,
+                dict(_public(msg), response={"status": "success", "message": "Message sent successfully"}),
+            )
+        elif path == "/send/media":
+            msg = state.send_direct(token, body, str(body.get("type") or "image"))
+            self._send_json(
+                200,
+                dict(_public(msg), response={"status": "success", "message": "Media sent successfully"}),
+            )
+        elif path == "/sender/advanced":
+            self._send_json(200, state.create_folder(token, body))
+        elif path == "/sender/listfolders":
+            status = (parse_qs(parts.query).get("status") or [None])[0]
+            self._send_json(200, state.list_folders(token, status))
+        elif path == "/sender/listmessages":
+            res = state.list_messages(
+                token,
+                str(body.get("folder_id")),
+                body.get("messageStatus"),
+                max(1, int(body.get("page") or 1)),
+                max(1, min(int(body.get("pageSize") or 10), 1000)),
+            )
+            if res is None:
+                self._send_json(400, {"error": "folder not found"})
+            else:
+                self._send_json(200, res)
+        elif path == "/sender/edit":
+            action = body.get("action")
+            if action not in ("stop", "continue", "delete"):
+                self._send_json(400, {"error": f"invalid action: {action}"})
+                return
+            res = state.edit_folder(token, str(body.get("folder_id")), action)
+            if res is None:
+                self._send_json(400, {"error": "folder not found"})
+            else:
+                self._send_json(200, res)
+        elif path == "/message/find":
+            self._send_json(200, state.find_messages(token, body))
+        elif path == "/chat/check":
+            out = []
+            for raw in body.get("numbers") or []:
+                digits = "".join(ch for ch in str(raw) if ch.isdigit())
+                on_wa = bool(digits) and digits not in state.not_on_whatsapp
+                out.append(
+                    {
+                        "query": str(raw),
+                        "jid": f"{digits}@s.whatsapp.net" if on_wa else "",
+                        "lid": "",
+                        "isInWhatsapp": on_wa,
+                        "verifiedName": "",
+                    }
+                )
+            self._send_json(200, out)
+
+    def _admin(self, method: str, path: str, body: Any) -> None:
+        state = self.server.state
+        if method == "GET" and path == "/__fake__/state":
+            self._send_json(200, dict(state.snapshot(), faults=self.server.faults.as_dict()))
+        elif method == "POST" and path == "/__fake__/config":
+            body = body if isinstance(body, dict) else {}
+            self.server.faults.update(body)
+            for tok in body.get("disconnected") or []:
+                state.set_connected(tok, False)
+            for tok in body.get("connected") or []:
+                state.set_connected(tok, True)
+            state.revoked.update(body.get("revoked") or [])
+            state.not_on_whatsapp.update(body.get("not_on_whatsapp") or [])
+            self._send_json(200, {"faults": self.server.faults.as_dict()})
+        elif method == "POST" and path == "/__fake__/reset":
+            state.reset()
+            self._send_json(200, {"status": "reset"})
+        else:
+            self._send_json(404, {"error": f"unknown admin route: {method} {path}"})
+
+
+class FakeUazapiServer(http.server.ThreadingHTTPServer):
+    """Servidor HTTP/1.1 (keep-alive) com ``state`` e ``faults`` acessíveis a testes."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        spec_path: str = DEFAULT_SPEC_PATH,
+        state: Optional[FakeUazapiState] = None,
+        faults: Optional[FaultConfig] = None,
+        verbose: bool = False,
+    ):
+        self.routes = load_spec_routes(spec_path)
+        self.state = state or FakeUazapiState()
+        self.faults = faults or FaultConfig()
+        self.verbose = verbose
+        self._thread: Optional[threading.Thread] = None
+        super().__init__((host, port), _Handler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeUazapiServer":
+        """Serve numa thread daemon (para testes / benchmarks no mesmo processo)."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FakeUazapiServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Servidor Uazapi falso guiado pelo OpenAPI do repo.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8088)
+    ap.add_argument("--spec", default=DEFAULT_SPEC_PATH)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 500")
+    ap.add_argument("--gateway-timeout-rate", type=float, default=0.0, help="fração de 504")
+    ap.add_argument(
+        "--delay-scale",
+        type=float,
+        default=0.01,
+        help="fator sobre delayMin/delayMax das pastas (1.0 = tempo real)",
+    )
+    ap.add_argument("--message-failure-rate", type=float, default=0.0)
+    ap.add_argument("--disconnected", action="append", default=[], metavar="TOKEN")
+    ap.add_argument("--revoked", action="append", default=[], metavar="TOKEN")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    state = FakeUazapiState(
+        delay_scale=args.delay_scale,
+        message_failure_rate=args.message_failure_rate,
+        seed=args.seed,
+    )
+    for tok in args.disconnected:
+        state.set_connected(tok, False)
+    state.revoked.update(args.revoked)
+    faults = FaultConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        gateway_timeout_rate=args.gateway_timeout_rate,
+        seed=args.seed,
+    )
+    server = FakeUazapiServer(
+        args.host, args.port, spec_path=args.spec, state=state, faults=faults, verbose=args.verbose
+    )
+    print(
+        json.dumps(
+            {"event": "fake_uazapi_listening", "url": server.url, "faults": faults.as_dict()},
+            ensure_ascii=False,
+        ),
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Grava ou reproduz o tráfego Uazapi de uma execução de sync / tick outbox e mede tempo de parede
+e número de queries Postgres — para comparar antes/depois de uma mudança com payloads reais.
+
+Fluxo típico (raiz do repo, mesmas envs ``DB_*`` / ``UAZAPI_URL`` da app):
+
+  # 1) Gravar contra a Uazapi real (cassete sanitizada: tokens/apikeys redigidos)
+  python scripts/uazapi_replay_bench.py record --cassette storage/cassettes/c42.jsonl \\
+      --target sync --campaign-id 42
+
+  # 2) Restaurar o snapshot da BD e reproduzir (sem rede, latências originais)
+  python scripts/uazapi_replay_bench.py replay --cassette storage/cassettes/c42.jsonl \\
+      --target sync --campaign-id 42 --out before.json
+
+  # 3) Depois da mudança: mesmo replay, comparado com o anterior
+  python scripts/uazapi_replay_bench.py replay --cassette storage/cassettes/c42.jsonl \\
+      --target sync --campaign-id 42 --baseline before.json
+
+``--target outbox-tick --ticks N`` corre ``process_message_outbox_tick``. O replay só é
+determinístico sobre o mesmo estado da BD da gravação (o sync faz commit): restaure o dump
+antes de cada execução. ``--no-timing`` responde na hora (isola o custo local).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+try:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+except Exception:
+    pass
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+
+_counting_cursor_classes: dict[type, type] = {}
+
+
+def _counting_cursor(base: type) -> type:
+    """Subclasse de ``base`` que conta ``execute``/``executemany`` na conexão."""
+    cls = _counting_cursor_classes.get(base)
+    if cls is None:
+
+        class _Counting(base):
+            def execute(self, query, vars=None):
+                self.connection.query_count += 1
+                return super().execute(query, vars)
+
+            def executemany(self, query, vars_list):
+                self.connection.query_count += 1
+                return super().executemany(query, vars_list)
+
+        cls = _counting_cursor_classes[base] = _Counting
+    return cls
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    """Conexão que conta queries, respeitando o ``cursor_factory`` pedido (ex. RealDictCursor)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query_count = 0
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = _counting_cursor(base)
+        return super().cursor(*args, **kwargs)
+
+
+def get_db_connection():
+    conn = psycopg2.connect(
+        host=os.environ.get("DB_HOST", "localhost"),
+        database=os.environ.get("DB_NAME", "leads_infinitos"),
+        user=os.environ.get("DB_USER", "postgres"),
+        password=os.environ.get("DB_PASSWORD"),
+        port=os.environ.get("DB_PORT", "5432"),
+        connection_factory=CountingConnection,
+    )
+    with conn.cursor() as cur:
+        cur.execute("SET TIME ZONE 'UTC'")
+    conn.query_count = 0
+    return conn
+
+
+def _run_sync(conn, campaign_id: int) -> None:
+    from services.uazapi import UazapiService
+    from utils.sync_uazapi import sync_campaign_leads_from_uazapi
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            SELECT c.uazapi_folder_id, i.apikey
+            FROM campaigns c
+            JOIN campaign_instances ci ON ci.campaign_id = c.id
+            JOIN instances i ON i.id = ci.instance_id
+            WHERE c.id = %s AND COALESCE(i.api_provider, 'megaapi') = 'uazapi'
+            LIMIT 1
+            """,
+            (campaign_id,),
+        )
+        row = cur.fetchone()
+    if not row or not row.get("apikey"):
+        raise SystemExit(f"campanha {campaign_id} sem instância Uazapi")
+    conn.query_count = 0
+    sync_campaign_leads_from_uazapi(
+        conn, campaign_id, row["apikey"], row.get("uazapi_folder_id"), UazapiService()
+    )
+
+
+def _run_outbox_ticks(conn, ticks: int) -> None:
+    import worker_message_outbox as wmo
+
+    for _ in range(max(1, ticks)):
+        wmo.process_message_outbox_tick(conn)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Record/replay do tráfego Uazapi com métricas.")
+    ap.add_argument("mode", choices=("record", "replay"))
+    ap.add_argument("--cassette", required=True)
+    ap.add_argument("--target", choices=("sync", "outbox-tick"), required=True)
+    ap.add_argument("--campaign-id", type=int)
+    ap.add_argument("--ticks", type=int, default=1)
+    ap.add_argument("--no-timing", action="store_true", help="replay sem as latências gravadas")
+    ap.add_argument("--out", help="grava o resultado JSON neste ficheiro")
+    ap.add_argument("--baseline", help="resultado JSON anterior para comparação")
+    args = ap.parse_args(argv)
+    if args.target == "sync" and not args.campaign_id:
+        ap.error("--target sync exige --campaign-id")
+    if args.mode == "record" and os.path.exists(args.cassette):
+        ap.error(f"cassete já existe: {args.cassette}")
+
+    from services.uazapi import http_connection_stats
+    from utils.uazapi_cassette import use_cassette
+
+    conn = get_db_connection()
+    http_before = http_connection_stats()["requests"]
+    try:
+        with use_cassette(args.cassette, args.mode, replay_timing=not args.no_timing) as cassette:
+            started = time.monotonic()
+            if args.target == "sync":
+                _run_sync(conn, args.campaign_id)
+            else:
+                conn.query_count = 0
+                _run_outbox_ticks(conn, args.ticks)
+            wall_ms = int((time.monotonic() - started) * 1000)
+            result = {
+                "target": args.target,
+                "campaign_id": args.campaign_id,
+                "ticks": args.ticks if args.target == "outbox-tick" else None,
+                "wall_ms": wall_ms,
+                "db_queries": conn.query_count,
+                "http_requests": http_connection_stats()["requests"] - http_before,
+                "cassette": cassette.stats(),
+            }
+    finally:
+        conn.close()
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            base = json.load(fh)
+        result["delta"] = {
+            k: result[k] - base.get(k, 0) for k in ("wall_ms", "db_queries", "http_requests")
+        }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
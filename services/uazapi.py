@@ -6,12 +6,24 @@ deletar e enviar mensagens. URL base via UAZAPI_URL; admintoken via UAZAPI_ADMIN
 """
 
 import base64
+import functools
 import json
 import os
+import threading
 import time
+from collections import OrderedDict
 from typing import Any, Optional, Tuple
+from urllib.parse import urlsplit
 
 import requests
+from prometheus_client import Counter
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from utils.media_public_url import media_public_url
+from utils.uazapi_cassette import CassetteMissError, active_cassette
+from utils.uazapi_outbox_errors import trips_instance_circuit
 
 
 def _parse_timeout_seconds(
@@ -28,31 +40,173 @@ def _parse_timeout_seconds(
     return max(minimum, min(maximum, v))
 
 
+_MEDIA_MIME_MAP = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".mp4": "video/mp4",
+    ".webm": "video/webm",
+}
+
+# Cache LRU dos data URLs (path absoluto + mtime_ns + tamanho → payload base64), limitado em
+# bytes; a mesma mídia de passo é enviada a milhares de leads. 0 desliga.
+_MEDIA_CACHE_MAX_BYTES = max(
+    0, int(os.environ.get("UAZAPI_MEDIA_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+)
+_media_cache: "OrderedDict[tuple[str, int, int], str]" = OrderedDict()
+_media_cache_bytes = 0
+_media_cache_lock = threading.Lock()
+
+
+def _media_cache_get(key: tuple[str, int, int]) -> Optional[str]:
+    with _media_cache_lock:
+        value = _media_cache.get(key)
+        if value is not None:
+            _media_cache.move_to_end(key)
+        return value
+
+
+def _media_cache_put(key: tuple[str, int, int], value: str) -> None:
+    global _media_cache_bytes
+
+    size = len(value)
+    if size > _MEDIA_CACHE_MAX_BYTES:
+        return
+    with _media_cache_lock:
+        # Versões antigas do mesmo arquivo (mtime/tamanho diferentes) nunca mais serão pedidas.
+        for stale in [k for k in _media_cache if k[0] == key[0] and k != key]:
+            _media_cache_bytes -= len(_media_cache.pop(stale))
+        if key in _media_cache:
+            _media_cache.move_to_end(key)
+            return
+        _media_cache[key] = value
+        _media_cache_bytes += size
+        while _media_cache_bytes > _MEDIA_CACHE_MAX_BYTES and _media_cache:
+            _, evicted = _media_cache.popitem(last=False)
+            _media_cache_bytes -= len(evicted)
+
+
 def _resolve_media_file_value(file: str) -> Optional[str]:
     """
     Converte path local em data URL base64; mantém URL/http/data: como estão.
+    Com ``UAZAPI_MEDIA_PUBLIC_BASE_URL`` devolve um link assinado (a Uazapi baixa o arquivo);
+    senão o data URL sai do cache LRU enquanto o arquivo não mudar (mtime/tamanho).
     Retorna None se path local não existir.
     """
     if file.startswith(("http://", "https://", "data:")):
         return file
-    if os.path.isfile(file):
+    try:
+        st = os.stat(file)
+    except OSError:
+        st = None
+    if st is not None and os.path.isfile(file):
+        public_url = media_public_url(file, st.st_mtime_ns, st.st_size)
+        if public_url:
+            return public_url
+        key = (os.path.abspath(file), st.st_mtime_ns, st.st_size)
+        cached = _media_cache_get(key)
+        if cached is not None:
+            return cached
         with open(file, "rb") as f:
             data = f.read()
         b64 = base64.b64encode(data).decode("utf-8")
         ext = os.path.splitext(file)[1].lower()
-        mime_map = {
-            ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg",
-            ".png": "image/png",
-            ".gif": "image/gif",
-            ".mp4": "video/mp4",
-            ".webm": "video/webm",
-        }
-        mime = mime_map.get(ext, "application/octet-stream")
-        return f"data:{mime};base64,{b64}"
+        mime = _MEDIA_MIME_MAP.get(ext, "application/octet-stream")
+        value = f"data:{mime};base64,{b64}"
+        _media_cache_put(key, value)
+        return value
     print(f"❌ [Uazapi] send_media: arquivo não encontrado: {file}")
     return None
 
+# Arquivos locais a partir deste tamanho (bytes) vão em corpo JSON streaming (base64 em blocos
+# direto do disco para o socket): pico de memória constante, sem passar pelo cache. 0 desliga.
+_MEDIA_STREAM_MIN_BYTES = max(
+    0, int(os.environ.get("UAZAPI_MEDIA_STREAM_MIN_BYTES", str(1024 * 1024)))
+)
+# Bytes crus lidos por bloco (múltiplo de 3 → base64 sem padding no meio do fluxo).
+_MEDIA_STREAM_CHUNK = 3 * 64 * 1024
+_FILE_PLACEHOLDER = "\u0000uazapi-media-file\u0000"
+
+
+class _Base64JsonMediaBody:
+    """
+    Corpo JSON de ``/send/media`` lido sob demanda: ``prefixo + base64(arquivo) + sufixo``.
+    Tem ``__len__`` (requests manda ``Content-Length``, sem chunked) e ``read(n)``; só um bloco
+    do arquivo fica em memória por vez.
+    """
+
+    def __init__(self, payload: dict[str, Any], path: str, mime: str, size: int) -> None:
+        body = json.dumps({**payload, "file": _FILE_PLACEHOLDER})
+        marker = json.dumps(_FILE_PLACEHOLDER)
+        idx = body.index(marker)
+        self._prefix = (body[:idx] + f'"data:{mime};base64,').encode("utf-8")
+        self._suffix = ('"' + body[idx + len(marker):]).encode("utf-8")
+        self._path = path
+        self._length = len(self._prefix) + 4 * ((size + 2) // 3) + len(self._suffix)
+        self._parts = self._iter_parts()
+        self._pending = b""
+        self._fh = None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _iter_parts(self):
+        yield self._prefix
+        self._fh = open(self._path, "rb")
+        try:
+            while True:
+                raw = self._fh.read(_MEDIA_STREAM_CHUNK)
+                if not raw:
+                    break
+                yield base64.b64encode(raw)
+        finally:
+            self.close()
+        yield self._suffix
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            return self._pending + b"".join(self._parts)
+        while len(self._pending) < size:
+            nxt = next(self._parts, None)
+            if nxt is None:
+                break
+            self._pending += nxt
+        out, self._pending = self._pending[:size], self._pending[size:]
+        return out
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def _media_request_kwargs(payload: dict[str, Any], file: str) -> Optional[dict[str, Any]]:
+    """
+    ``json=`` (URL / link assinado / data URL do cache) ou ``data=`` streaming para arquivo
+    local grande; None se o arquivo não existe.
+    """
+    if _MEDIA_STREAM_MIN_BYTES and not file.startswith(("http://", "https://", "data:")):
+        try:
+            st = os.stat(file)
+        except OSError:
+            st = None
+        if (
+            st is not None
+            and os.path.isfile(file)
+            and st.st_size >= _MEDIA_STREAM_MIN_BYTES
+            and not media_public_url(file, st.st_mtime_ns, st.st_size)
+        ):
+            mime = _MEDIA_MIME_MAP.get(
+                os.path.splitext(file)[1].lower(), "application/octet-stream"
+            )
+            return {"data": _Base64JsonMediaBody(payload, file, mime, st.st_size)}
+    file_value = _resolve_media_file_value(file)
+    if file_value is None:
+        return None
+    return {"json": {**payload, "file": file_value}}
+
+
 # Rate limit para log 401: por chave; intervalo via UAZAPI_401_LOG_INTERVAL_SEC (default 600s).
 _401_log_last: dict[tuple, float] = {}
 
@@ -74,6 +228,344 @@ def _uazapi_should_log_401(key: tuple) -> bool:
     return False
 
 
+# Sessão HTTP partilhada (keep-alive): todas as instâncias de UazapiService / threads reutilizam
+# o mesmo pool de conexões ao host Uazapi em vez de handshake TCP+TLS por chamada.
+_HTTP_POOL_MAXSIZE = max(1, int(os.environ.get("UAZAPI_HTTP_POOL_MAXSIZE", "32")))
+# Retries de transporte (conexão/leitura, 502/503/504) só para GET/HEAD/OPTIONS; POST de envio
+# nunca é reenviado depois de sair (apenas falha de conexão, antes de qualquer byte).
+_HTTP_GET_RETRIES = max(0, int(os.environ.get("UAZAPI_HTTP_GET_RETRIES", "2")))
+_HTTP_RETRY_BACKOFF = 0.5
+
+UAZAPI_HTTP_REQUESTS = Counter(
+    "uazapi_http_requests_total",
+    "Requisições HTTP à Uazapi pela sessão partilhada.",
+    ("method",),
+)
+UAZAPI_HTTP_CONNECTIONS_OPENED = Counter(
+    "uazapi_http_connections_opened_total",
+    "Conexões TCP/TLS novas abertas ao host Uazapi (requests - conexões = reutilizações).",
+)
+_http_stats = {"requests": 0, "connections_opened": 0}
+_http_stats_lock = threading.Lock()
+
+
+def _count_http_stat(key: str) -> None:
+    with _http_stats_lock:
+        _http_stats[key] += 1
+
+
+class _MeteredHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count_http_stat("connections_opened")
+        UAZAPI_HTTP_CONNECTIONS_OPENED.inc()
+        return super()._new_conn()
+
+
+class _MeteredHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count_http_stat("connections_opened")
+        UAZAPI_HTTP_CONNECTIONS_OPENED.inc()
+        return super()._new_conn()
+
+
+# Circuit breaker por token: após N falhas seguidas de instância (desconectada, token
+# revogado, timeout — ver ``trips_instance_circuit``) as chamadas com esse token falham na hora
+# durante o cooldown; depois uma única chamada de prova (half-open) decide se fecha ou reabre.
+_BREAKER_FAILURE_THRESHOLD = max(0, int(os.environ.get("UAZAPI_BREAKER_FAILURE_THRESHOLD", "3")))
+_BREAKER_COOLDOWN_SEC = max(1.0, float(os.environ.get("UAZAPI_BREAKER_COOLDOWN_SECONDS", "60")))
+# GET /instance/status fica fora do short-circuit e não alimenta o breaker: health tick e
+# reconexão precisam do estado real (200 com "disconnected" não é falha de transporte).
+_BREAKER_EXEMPT_PATHS = ("/instance/status",)
+
+UAZAPI_CIRCUIT_REJECTED = Counter(
+    "uazapi_circuit_rejected_total",
+    "Chamadas Uazapi recusadas sem rede porque o circuito do token estava aberto.",
+)
+
+
+class UazapiCircuitOpenError(requests.exceptions.ConnectionError):
+    """Circuito aberto para o token: a requisição não sai (tratada como instância inacessível)."""
+
+
+class TokenCircuitBreaker:
+    """Estados ``closed`` → ``open`` → ``half_open`` por token (thread-safe)."""
+
+    def __init__(self, failure_threshold: int, cooldown_sec: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_sec = cooldown_sec
+        self._lock = threading.Lock()
+        # token -> {"state", "failures", "opened_at", "probing"}
+        self._circuits: dict[str, dict[str, Any]] = {}
+
+    def state(self, token: str) -> str:
+        with self._lock:
+            c = self._circuits.get(token)
+            if c is None:
+                return "closed"
+            if c["state"] == "open" and time.monotonic() - c["opened_at"] >= self.cooldown_sec:
+                return "half_open"
+            return c["state"]
+
+    def allow(self, token: str) -> bool:
+        """False enquanto aberto; após o cooldown deixa passar uma prova por vez."""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            c = self._circuits.get(token)
+            if c is None or c["state"] == "closed":
+                return True
+            if c["state"] == "open":
+                if time.monotonic() - c["opened_at"] < self.cooldown_sec:
+                    return False
+                c["state"] = "half_open"
+                c["probing"] = False
+            if c["probing"]:
+                return False
+            c["probing"] = True
+            return True
+
+    def record_success(self, token: str) -> None:
+        with self._lock:
+            c = self._circuits.pop(token, None)
+        if c is not None and c["state"] != "closed":
+            self._log_transition(token, "closed", c["failures"])
+
+    def record_failure(self, token: str) -> None:
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            c = self._circuits.setdefault(
+                token, {"state": "closed", "failures": 0, "opened_at": 0.0, "probing": False}
+            )
+            c["failures"] += 1
+            opened = c["state"] == "half_open" or (
+                c["state"] == "closed" and c["failures"] >= self.failure_threshold
+            )
+            if opened:
+                c["state"] = "open"
+                c["opened_at"] = time.monotonic()
+                c["probing"] = False
+            failures = c["failures"]
+        if opened:
+            self._log_transition(token, "open", failures)
+
+    def release_probe(self, token: str) -> None:
+        """Prova em ``half_open`` que terminou sem veredito (exceção fora do HTTP, ou erro que não
+        derruba a instância): a próxima requisição volta a poder provar, em vez de o token ficar
+        rejeitado para sempre."""
+        with self._lock:
+            c = self._circuits.get(token)
+            if c is not None and c["state"] == "half_open":
+                c["probing"] = False
+
+    def reset(self, token: Optional[str] = None) -> None:
+        with self._lock:
+            if token is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(token, None)
+
+    def _log_transition(self, token: str, state: str, failures: int) -> None:
+        print(
+            json.dumps(
+                {
+                    "event": "uazapi_circuit_" + state,
+                    "token_suffix": token[-4:],
+                    "consecutive_failures": failures,
+                    "cooldown_sec": self.cooldown_sec,
+                },
+                ensure_ascii=False,
+            ),
+            flush=True,
+        )
+
+
+uazapi_circuit_breaker = TokenCircuitBreaker(_BREAKER_FAILURE_THRESHOLD, _BREAKER_COOLDOWN_SEC)
+
+
+def _breaker_token(request) -> Optional[str]:
+    token = (request.headers.get("token") or "").strip()
+    if not token:
+        return None
+    path = urlsplit(request.url or "").path
+    if path.endswith(_BREAKER_EXEMPT_PATHS):
+        return None
+    return token
+
+
+class _MeteredHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter com pools que contam conexões novas e requisições."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _MeteredHTTPConnectionPool,
+            "https": _MeteredHTTPSConnectionPool,
+        }
+
+    def send(self, request, *args, **kwargs):
+        token = _breaker_token(request)
+        if token and not uazapi_circuit_breaker.allow(token):
+            UAZAPI_CIRCUIT_REJECTED.inc()
+            raise UazapiCircuitOpenError(
+                f"circuit open for Uazapi token ...{token[-4:]}", request=request
+            )
+        _count_http_stat("requests")
+        UAZAPI_HTTP_REQUESTS.labels(method=request.method or "GET").inc()
+        cassette = active_cassette()
+        recorded = False
+        try:
+            try:
+                if cassette is not None:
+                    response = cassette.send(
+                        request, functools.partial(super().send, request, *args, **kwargs)
+                    )
+                else:
+                    response = super().send(request, *args, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if (
+                    token
+                    and not isinstance(e, CassetteMissError)
+                    and trips_instance_circuit(None, None, type(e))
+                ):
+                    uazapi_circuit_breaker.record_failure(token)
+                    recorded = True
+                raise
+            # Só 2xx/3xx zeram as falhas seguidas; 4xx/5xx que não derrubam a instância não
+            # contam para nenhum lado (não escondem uma sequência de falhas da instância).
+            if token:
+                body = response.text if response.status_code >= 400 else None
+                if trips_instance_circuit(response.status_code, body):
+                    uazapi_circuit_breaker.record_failure(token)
+                    recorded = True
+                elif response.status_code < 400:
+                    uazapi_circuit_breaker.record_success(token)
+                    recorded = True
+            return response
+        finally:
+            if token and not recorded:
+                uazapi_circuit_breaker.release_probe(token)
+
+
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+
+def _build_http_session() -> requests.Session:
+    retry = Retry(
+        total=_HTTP_GET_RETRIES,
+        connect=_HTTP_GET_RETRIES,
+        read=_HTTP_GET_RETRIES,
+        status=_HTTP_GET_RETRIES,
+        backoff_factor=_HTTP_RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        raise_on_status=False,
+    )
+    adapter = _MeteredHTTPAdapter(
+        pool_connections=4, pool_maxsize=_HTTP_POOL_MAXSIZE, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def shared_http_session() -> requests.Session:
+    """Sessão ``requests`` única do processo (criada sob demanda; segura entre threads)."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                _http_session = _build_http_session()
+    return _http_session
+
+
+def http_connection_stats() -> dict[str, Any]:
+    """Requisições, conexões abertas e taxa de reutilização da sessão partilhada."""
+    with _http_stats_lock:
+        req = _http_stats["requests"]
+        opened = _http_stats["connections_opened"]
+    return {
+        "requests": req,
+        "connections_opened": opened,
+        "reuse_ratio": round(1.0 - opened / req, 4) if req else None,
+    }
+
+
+# Cache de ``list_folders`` por token: sync, fila de verificação e admin sync do mesmo tick
+# partilham uma listagem por instância. Chamadas concorrentes à mesma chave esperam pela
+# que já está em voo; ``create_advanced_campaign``/``edit_campaign`` invalidam o token.
+_LIST_FOLDERS_CACHE_TTL_SEC = max(
+    0.0, float(os.environ.get("UAZAPI_LIST_FOLDERS_CACHE_TTL_SEC", "20"))
+)
+# (base_url, token, status) -> (pastas, monotonic)
+_folders_cache: dict[tuple[str, str, Optional[str]], tuple[list, float]] = {}
+# (base_url, token, status) -> [Event, resultado]
+_folders_inflight: dict[tuple[str, str, Optional[str]], list] = {}
+_folders_lock = threading.Lock()
+
+
+def list_folders_cached(
+    uazapi_service, token: str, status: Optional[str] = None, context: Optional[dict] = None
+) -> Optional[list[dict[str, Any]]]:
+    """
+    ``uazapi_service.list_folders`` com cache TTL por token e coalescência de chamadas
+    concorrentes. Falhas (None) não entram no cache. Devolve uma cópia rasa da lista.
+    """
+    kwargs: dict[str, Any] = {"context": context}
+    if status is not None:
+        kwargs["status"] = status
+    if _LIST_FOLDERS_CACHE_TTL_SEC <= 0 or not token:
+        return uazapi_service.list_folders(token, **kwargs)
+    key = (getattr(uazapi_service, "base_url", "") or "", token, status)
+    with _folders_lock:
+        hit = _folders_cache.get(key)
+        if hit and time.monotonic() - hit[1] < _LIST_FOLDERS_CACHE_TTL_SEC:
+            return list(hit[0])
+        flight = _folders_inflight.get(key)
+        owner = flight is None
+        if owner:
+            flight = _folders_inflight[key] = [threading.Event(), None]
+    if not owner:
+        flight[0].wait(timeout=30)
+        return list(flight[1]) if isinstance(flight[1], list) else flight[1]
+    folders = None
+    try:
+        folders = uazapi_service.list_folders(token, **kwargs)
+    finally:
+        flight[1] = folders
+        with _folders_lock:
+            # Invalidação durante o fetch remove a entrada em voo: resultado não é guardado.
+            if _folders_inflight.get(key) is flight:
+                del _folders_inflight[key]
+                if isinstance(folders, list):
+                    _folders_cache[key] = (folders, time.monotonic())
+        flight[0].set()
+    return list(folders) if isinstance(folders, list) else folders
+
+
+def invalidate_list_folders_cache(token: Optional[str] = None) -> None:
+    """Descarta o cache (e fetches em voo) de ``token``; sem token limpa tudo."""
+    with _folders_lock:
+        for store in (_folders_cache, _folders_inflight):
+            for key in [k for k in store if token is None or k[1] == token]:
+                del store[key]
+
+
+def _invalidates_list_folders(fn):
+    """Métodos que criam/alteram pastas: invalida ``list_folders_cached`` do token no fim."""
+
+    @functools.wraps(fn)
+    def wrapper(self, token, *args, **kwargs):
+        try:
+            return fn(self, token, *args, **kwargs)
+        finally:
+            invalidate_list_folders_cache(token)
+
+    return wrapper
+
+
 class UazapiService:
     """Cliente para API Uazapi (WhatsApp)."""
 
@@ -83,6 +575,10 @@ class UazapiService:
         ).rstrip("/")
         self.admin_token = os.environ.get("UAZAPI_ADMIN_TOKEN", "")
 
+    @property
+    def _http(self) -> requests.Session:
+        return shared_http_session()
+
     def create_instance(self, name: str) -> Optional[dict[str, Any]]:
         """
         Cria nova instância via POST /instance/init.
@@ -97,7 +593,7 @@ class UazapiService:
         payload = {"name": name}
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 url, json=payload, headers=headers, timeout=15
             )
             if response.status_code != 200:
@@ -125,7 +621,7 @@ class UazapiService:
         payload = {}
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 url, json=payload, headers=headers, timeout=15
             )
             if response.status_code != 200:
@@ -157,7 +653,7 @@ class UazapiService:
                 )
 
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self._http.get(url, headers=headers, timeout=10)
             if response.status_code == 401:
                 body_l = (response.text or "").lower()
                 if "invalid token" in body_l:
@@ -194,7 +690,7 @@ class UazapiService:
         headers = {"token": token}
 
         try:
-            response = requests.delete(url, headers=headers, timeout=15)
+            response = self._http.delete(url, headers=headers, timeout=15)
             if response.status_code in (200, 404):
                 return True, response.status_code
             # Instância já deletada na Uazapi? Tratar como sucesso para remover do nosso DB
@@ -228,7 +724,7 @@ class UazapiService:
         payload = {"number": number, "text": text}
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 url, json=payload, headers=headers, timeout=15
             )
             if response.status_code != 200:
@@ -269,7 +765,7 @@ class UazapiService:
         }
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 url, json=payload, headers=headers, timeout=timeout_seconds
             )
             if response.status_code != 200:
@@ -304,20 +800,18 @@ class UazapiService:
             "Content-Type": "application/json",
         }
 
-        file_value = _resolve_media_file_value(file)
-        if file_value is None:
-            return None
-
         payload: dict[str, Any] = {
             "number": number,
             "type": media_type,
-            "file": file_value,
             "text": caption or "",
         }
+        body_kwargs = _media_request_kwargs(payload, file)
+        if body_kwargs is None:
+            return None
 
         try:
-            response = requests.post(
-                url, json=payload, headers=headers, timeout=30
+            response = self._http.post(
+                url, headers=headers, timeout=30, **body_kwargs
             )
             if response.status_code != 200:
                 print(f"❌ [Uazapi] send_media Status: {response.status_code}")
@@ -329,6 +823,9 @@ class UazapiService:
             if hasattr(e, "response") and e.response is not None:
                 print(f"❌ [Uazapi] Response: {e.response.text}")
             return None
+        finally:
+            if "data" in body_kwargs:
+                body_kwargs["data"].close()
 
     def send_media_campaign(
         self,
@@ -352,10 +849,6 @@ class UazapiService:
             "Content-Type": "application/json",
         }
 
-        file_value = _resolve_media_file_value(file)
-        if file_value is None:
-            return None
-
         timeout = timeout_seconds
         if timeout is None:
             timeout = _parse_timeout_seconds(
@@ -365,15 +858,17 @@ class UazapiService:
         payload: dict[str, Any] = {
             "number": number,
             "type": media_type,
-            "file": file_value,
             "text": caption or "",
             "track_id": track_id,
             "track_source": track_source,
         }
+        body_kwargs = _media_request_kwargs(payload, file)
+        if body_kwargs is None:
+            return None
 
         try:
-            response = requests.post(
-                url, json=payload, headers=headers, timeout=timeout
+            response = self._http.post(
+                url, headers=headers, timeout=timeout, **body_kwargs
             )
             if response.status_code != 200:
                 print(f"❌ [Uazapi] send_media_campaign Status: {response.status_code}")
@@ -385,6 +880,9 @@ class UazapiService:
             if hasattr(e, "response") and e.response is not None:
                 print(f"❌ [Uazapi] Response: {e.response.text}")
             return None
+        finally:
+            if "data" in body_kwargs:
+                body_kwargs["data"].close()
 
     def check_phone(
         self, token: str, numbers: list[str], timeout: int = 15
@@ -403,7 +901,7 @@ class UazapiService:
         payload = {"numbers": numbers}
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 url, json=payload, headers=headers, timeout=timeout
             )
             if response.status_code != 200:
@@ -421,6 +919,7 @@ class UazapiService:
 
     # --- Métodos de campanha (envio em massa avançado) ---
 
+    @_invalidates_list_folders
     def create_advanced_campaign(
         self,
         token: str,
@@ -451,7 +950,7 @@ class UazapiService:
             payload["scheduled_for"] = scheduled_for
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 url, json=payload, headers=headers, timeout=30
             )
             if response.status_code != 200:
@@ -499,6 +998,7 @@ class UazapiService:
                 "exception": str(e)[:2000],
             }
 
+    @_invalidates_list_folders
     def edit_campaign(
         self, token: str, folder_id: str, action: str
     ) -> Optional[dict[str, Any]]:
@@ -518,7 +1018,7 @@ class UazapiService:
         payload = {"folder_id": folder_id, "action": action}
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 url, json=payload, headers=headers, timeout=15
             )
             if response.status_code != 200:
@@ -581,7 +1081,7 @@ class UazapiService:
             print(f"⚠️ [Uazapi] {msg}: 401 Invalid token ({endpoint}). Atualize o apikey da instância.")
 
         try:
-            response = requests.get(
+            response = self._http.get(
                 url, headers=headers, params=params or None, timeout=15
             )
             if _should_silent_return(response):
@@ -604,6 +1104,12 @@ class UazapiService:
                 print(f"❌ [Uazapi] Response: {resp.text}")
             return None
 
+    def list_folders_cached(
+        self, token: str, status: Optional[str] = None, context: Optional[dict] = None
+    ) -> Optional[list[dict[str, Any]]]:
+        """``list_folders`` via cache partilhado por token (ver ``list_folders_cached``)."""
+        return list_folders_cached(self, token, status=status, context=context)
+
     def list_messages(
         self,
         token: str,
@@ -661,7 +1167,7 @@ class UazapiService:
             print(f"⚠️ [Uazapi] {msg}: 401 Invalid token ({endpoint}). Atualize o apikey da instância.")
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 url, json=payload, headers=headers, timeout=15
             )
             if _should_silent_return(response):
@@ -734,7 +1240,7 @@ class UazapiService:
             print(f"⚠️ [Uazapi] {msg}: 401 Invalid token ({endpoint}). Atualize o apikey da instância.")
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 url, json=payload, headers=headers, timeout=20
             )
             if _should_silent_return(response):
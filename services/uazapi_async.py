@@ -0,0 +1,176 @@
+"""
+Cliente asyncio para leituras Uazapi em leque (health por instância, sync de pastas, admin sync).
+
+O projeto não tem cliente HTTP assíncrono: cada corrotina executa o método síncrono de
+``UazapiService`` num executor de threads, sobre a sessão ``requests`` partilhada (pool
+keep-alive). O ganho vem de sobrepor os round-trips — N instâncias custam ~1 RTT em vez de N.
+
+Limites: ``UAZAPI_ASYNC_MAX_CONCURRENCY`` chamadas em voo no total e
+``UAZAPI_ASYNC_PER_TOKEN_CONCURRENCY`` por token (não martelar a mesma instância).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Iterable, Optional
+
+from services.uazapi import UazapiService
+
+logger = logging.getLogger(__name__)
+
+# Chamadas Uazapi simultâneas por lote (e threads do executor dedicado).
+UAZAPI_ASYNC_MAX_CONCURRENCY = max(1, int(os.environ.get("UAZAPI_ASYNC_MAX_CONCURRENCY", "16")))
+# Chamadas simultâneas para o mesmo token de instância.
+UAZAPI_ASYNC_PER_TOKEN_CONCURRENCY = max(
+    1, int(os.environ.get("UAZAPI_ASYNC_PER_TOKEN_CONCURRENCY", "2"))
+)
+
+# Métodos de leitura expostos em lote: ``(método, token, kwargs)``.
+READ_METHODS = (
+    "get_status",
+    "list_folders",
+    "list_folders_cached",
+    "list_messages",
+    "message_find",
+)
+
+
+class AsyncUazapiClient:
+    """
+    Espelho assíncrono dos métodos de leitura de ``UazapiService``.
+    Deve ser criado dentro do event loop que o usa (semáforos ficam presos a ele).
+    """
+
+    def __init__(
+        self,
+        service: Optional[UazapiService] = None,
+        *,
+        executor: Optional[Executor] = None,
+        max_concurrency: Optional[int] = None,
+        per_token_concurrency: Optional[int] = None,
+    ):
+        self._service = service or UazapiService()
+        self._executor = executor
+        self._global = asyncio.Semaphore(
+            max(1, int(max_concurrency or UAZAPI_ASYNC_MAX_CONCURRENCY))
+        )
+        self._per_token_limit = max(
+            1, int(per_token_concurrency or UAZAPI_ASYNC_PER_TOKEN_CONCURRENCY)
+        )
+        self._token_sems: dict[str, asyncio.Semaphore] = {}
+
+    async def _call(self, method: str, token: str, **kwargs) -> Any:
+        if method not in READ_METHODS:
+            raise ValueError(f"método Uazapi não suportado em lote: {method}")
+        token = (token or "").strip()
+        sem = self._token_sems.get(token)
+        if sem is None:
+            sem = self._token_sems[token] = asyncio.Semaphore(self._per_token_limit)
+        # Token primeiro: quem espera pela própria instância não ocupa vaga global.
+        async with sem:
+            async with self._global:
+                fn = functools.partial(getattr(self._service, method), token, **kwargs)
+                return await asyncio.get_running_loop().run_in_executor(self._executor, fn)
+
+    async def get_status(self, token: str) -> Optional[dict[str, Any]]:
+        return await self._call("get_status", token)
+
+    async def list_folders(
+        self, token: str, status: Optional[str] = None, context: Optional[dict] = None
+    ) -> Optional[list[dict[str, Any]]]:
+        return await self._call("list_folders", token, status=status, context=context)
+
+    async def list_folders_cached(
+        self, token: str, status: Optional[str] = None, context: Optional[dict] = None
+    ) -> Optional[list[dict[str, Any]]]:
+        return await self._call("list_folders_cached", token, status=status, context=context)
+
+    async def list_messages(
+        self,
+        token: str,
+        folder_id: str,
+        message_status: Optional[str] = None,
+        page: Optional[int] = None,
+        page_size: Optional[int] = None,
+        context: Optional[dict] = None,
+    ) -> Optional[dict[str, Any]]:
+        return await self._call(
+            "list_messages",
+            token,
+            folder_id=folder_id,
+            message_status=message_status,
+            page=page,
+            page_size=page_size,
+            context=context,
+        )
+
+    async def message_find(
+        self,
+        token: str,
+        chatid: str,
+        limit: int = 30,
+        offset: int = 0,
+        context: Optional[dict] = None,
+    ) -> Optional[dict[str, Any]]:
+        return await self._call(
+            "message_find", token, chatid=chatid, limit=limit, offset=offset, context=context
+        )
+
+    async def gather(self, calls: Iterable[tuple[str, str, dict]]) -> list[Any]:
+        """Executa ``(método, token, kwargs)`` em paralelo; exceções voltam no lugar do resultado."""
+        return await asyncio.gather(
+            *(self._call(method, token, **(kwargs or {})) for method, token, kwargs in calls),
+            return_exceptions=True,
+        )
+
+
+def run_uazapi_batch(
+    calls: Iterable[tuple[str, str, dict]],
+    *,
+    service: Optional[UazapiService] = None,
+    max_concurrency: Optional[int] = None,
+    per_token_concurrency: Optional[int] = None,
+) -> list[Any]:
+    """
+    Ponto de entrada síncrono (worker / Flask): corre o lote num event loop próprio com
+    executor dedicado e devolve os resultados na ordem de ``calls``. Uma chamada que levanta
+    exceção devolve a exceção (o lote não é abortado).
+    """
+    calls = list(calls)
+    if not calls:
+        return []
+    limit = max(1, int(max_concurrency or UAZAPI_ASYNC_MAX_CONCURRENCY))
+    started = time.monotonic()
+    with ThreadPoolExecutor(
+        max_workers=min(limit, len(calls)), thread_name_prefix="uazapi-async"
+    ) as pool:
+
+        async def _main() -> list[Any]:
+            client = AsyncUazapiClient(
+                service,
+                executor=pool,
+                max_concurrency=limit,
+                per_token_concurrency=per_token_concurrency,
+            )
+            return await client.gather(calls)
+
+        results = asyncio.run(_main())
+    errors = sum(1 for r in results if isinstance(r, BaseException))
+    logger.info(
+        json.dumps(
+            {
+                "event": "uazapi_async_batch",
+                "calls": len(calls),
+                "errors": errors,
+                "elapsed_ms": int((time.monotonic() - started) * 1000),
+            },
+            ensure_ascii=False,
+        )
+    )
+    return results
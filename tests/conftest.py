@@ -1,4 +1,12 @@
-"""Pytest: hooks partilhados."""
+"""Pytest: hooks e fixtures partilhados."""
+
+import functools
+import importlib.util
+import os
+
+import pytest
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 def pytest_configure(config):
@@ -16,3 +24,40 @@ def pytest_configure(config):
             return False
 
     dotenv.load_dotenv = _load_dotenv_safe
+
+
+@pytest.fixture(autouse=True)
+def _isolate_uazapi_process_state():
+    """Cache ``list_folders_cached`` e circuit breaker são globais ao processo: fakes de testes
+    diferentes partilham tokens."""
+    from services.uazapi import invalidate_list_folders_cache, uazapi_circuit_breaker
+
+    invalidate_list_folders_cache()
+    uazapi_circuit_breaker.reset()
+    yield
+    invalidate_list_folders_cache()
+    uazapi_circuit_breaker.reset()
+
+
+@functools.lru_cache(maxsize=1)
+def load_fake_uazapi_module():
+    """``scripts/fake_uazapi_server.py`` (não é pacote) carregado uma vez por sessão."""
+    path = os.path.join(_REPO_ROOT, "scripts", "fake_uazapi_server.py")
+    spec = importlib.util.spec_from_file_location("fake_uazapi_server", path)
+    mod = importlib.util.module_from_spec(spec)
+    assert spec.loader is not None
+    spec.loader.exec_module(mod)
+    return mod
+
+
+@pytest.fixture
+def fake_uazapi(monkeypatch):
+    """``FakeUazapiServer`` numa thread com ``UAZAPI_URL`` a apontar para ele. ``state`` (instâncias
+    desligadas, tokens revogados, pedidos por token) e ``faults`` (latência, 500/504) controlam-se
+    no próprio teste."""
+    pytest.importorskip("yaml")
+    fake = load_fake_uazapi_module()
+    srv = fake.FakeUazapiServer(state=fake.FakeUazapiState(delay_scale=0.0, seed=1))
+    with srv:
+        monkeypatch.setenv("UAZAPI_URL", srv.url)
+        yield srv
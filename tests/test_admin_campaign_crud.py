@@ -527,7 +527,9 @@ def test_outbox_tick_writes_attempt_and_marks_sent(
 
                 row = None
                 for _ in range(200):
-                    with patch.object(wmo, 'is_campaign_send_window', return_value=True):
+                    with patch.object(wmo, 'is_campaign_send_window', return_value=True), patch.object(
+                        wmo, 'campaign_send_window_sql', return_value='TRUE'
+                    ):
                         with patch.object(
                             wmo.uazapi_service,
                             'send_text_idempotent',
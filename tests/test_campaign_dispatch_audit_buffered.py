@@ -0,0 +1,61 @@
+"""Auditoria JSONL: modo ``buffered`` (group commit, 1 fsync por lote) vs ``durable``."""
+
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+import utils.campaign_dispatch_audit as cda
+
+
+@pytest.fixture
+def audit_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path))
+    monkeypatch.setenv("DISPATCH_AUDIT_FLUSH_INTERVAL_SECONDS", "3600")
+    cda.flush_dispatch_audit()
+    yield monkeypatch
+    cda.flush_dispatch_audit()
+
+
+def _lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_buffered_mode_flushes_batch_with_single_fsync(audit_env):
+    audit_env.setenv("DISPATCH_AUDIT_WRITE_MODE", "buffered")
+    audit_env.setenv("DISPATCH_AUDIT_FLUSH_MAX_EVENTS", "3")
+    path = cda.dispatch_audit_jsonl_path(1, 50, ensure_parent=False)
+
+    with patch.object(cda.os, "fsync", wraps=os.fsync) as fsync:
+        cda.append_dispatch_event(50, 1, {"outbox_id": 1, "outcome": "sent"})
+        cda.append_dispatch_event(50, 1, {"outbox_id": 2, "outcome": "sent"})
+        assert _lines(path) == []
+        cda.append_dispatch_event(50, 1, {"outbox_id": 3, "outcome": "sent"})
+        assert [r["outbox_id"] for r in _lines(path)] == [1, 2, 3]
+        assert fsync.call_count == 1
+
+
+def test_buffered_mode_drains_on_explicit_flush(audit_env):
+    audit_env.setenv("DISPATCH_AUDIT_WRITE_MODE", "buffered")
+    audit_env.setenv("DISPATCH_AUDIT_FLUSH_MAX_EVENTS", "100")
+    cda.append_dispatch_event(51, 1, {"outbox_id": 9, "request": {"apikey": "s3cret"}})
+    path = cda.dispatch_audit_jsonl_path(1, 51, ensure_parent=False)
+    assert _lines(path) == []
+    assert cda.flush_dispatch_audit() == 1
+    rows = _lines(path)
+    assert rows[0]["outbox_id"] == 9
+    assert rows[0]["request"]["apikey"] == "[REDACTED]"
+
+
+def test_durable_mode_fsyncs_each_event(audit_env):
+    audit_env.delenv("DISPATCH_AUDIT_WRITE_MODE", raising=False)
+    path = cda.dispatch_audit_jsonl_path(1, 52, ensure_parent=False)
+    with patch.object(cda.os, "fsync", wraps=os.fsync) as fsync:
+        cda.append_dispatch_event(52, 1, {"outbox_id": 1})
+        cda.append_dispatch_event(52, 1, {"outbox_id": 2})
+    assert len(_lines(path)) == 2
+    assert fsync.call_count == 2
@@ -0,0 +1,84 @@
+"""Auditoria JSONL: segmentos com índice lateral e leitura reversa só dos bytes devolvidos."""
+
+import json
+import os
+
+import pytest
+
+import utils.campaign_dispatch_audit as cda
+
+
+@pytest.fixture
+def audit_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path))
+    monkeypatch.delenv("DISPATCH_AUDIT_WRITE_MODE", raising=False)
+    monkeypatch.setenv("DISPATCH_AUDIT_SEGMENT_MAX_BYTES", "4096")
+    return monkeypatch
+
+
+def _append(n, campaign_id=60, start=0):
+    for i in range(start, start + n):
+        cda.append_dispatch_event(
+            campaign_id,
+            1,
+            {
+                "outbox_id": i,
+                "lead_id": 1000 + (i % 3),
+                "outcome": "sent" if i % 2 == 0 else "retry_scheduled",
+                "request": {"kind": "text", "text_preview": "x" * 80},
+            },
+        )
+
+
+def _ids(lines):
+    return [json.loads(ln)["outbox_id"] for ln in lines]
+
+
+def test_rotates_into_indexed_segments_and_reads_tail(audit_env):
+    _append(120)
+    segments = cda.dispatch_audit_segment_paths(1, 60)
+    assert len(segments) > 2
+    assert segments[-1].endswith("dispatch_audit.jsonl")
+    assert all(os.path.exists(p + ".idx") for p in segments)
+    assert all(os.path.getsize(p) <= 4096 for p in segments)
+
+    lines, truncated = cda.read_dispatch_audit_tail(1, 60, 5)
+    assert _ids(lines) == [115, 116, 117, 118, 119]
+    assert truncated is True
+
+    lines, truncated = cda.read_dispatch_audit_tail(1, 60, 500)
+    assert _ids(lines) == list(range(120))
+    assert truncated is False
+
+
+def test_filters_by_lead_outbox_and_outcome_across_segments(audit_env):
+    _append(90)
+    lines, _ = cda.read_dispatch_audit_tail(1, 60, 1000, lead_id=1001)
+    assert _ids(lines) == [i for i in range(90) if i % 3 == 1]
+
+    lines, truncated = cda.read_dispatch_audit_tail(1, 60, 10, outbox_id=7)
+    assert _ids(lines) == [7] and truncated is False
+
+    lines, _ = cda.read_dispatch_audit_tail(1, 60, 3, lead_id=1000, outcome="sent")
+    assert _ids(lines) == [72, 78, 84]
+
+    lines, _ = cda.read_dispatch_audit_tail(1, 60, 3, outcome="unknown_outcome")
+    assert lines == []
+
+
+def test_legacy_file_without_index_is_read_and_indexed_on_append(audit_env):
+    path = cda.dispatch_audit_jsonl_path(1, 61)
+    with open(path, "wb") as f:
+        for i in range(4):
+            f.write((json.dumps({"outbox_id": i, "lead_id": 5}) + "\n").encode())
+        f.write(b'{"outbox_id": 99')  # linha incompleta (crash a meio do write)
+
+    lines, _ = cda.read_dispatch_audit_tail(1, 61, 10, lead_id=5)
+    assert _ids(lines) == [0, 1, 2, 3]
+
+    with open(path, "rb+") as f:
+        f.truncate(os.path.getsize(path) - len(b'{"outbox_id": 99'))
+    cda.append_dispatch_event(61, 1, {"outbox_id": 4, "lead_id": 5})
+    assert os.path.getsize(path + ".idx") == 5 * cda._INDEX_RECORD.size
+    lines, _ = cda.read_dispatch_audit_tail(1, 61, 2, lead_id=5)
+    assert _ids(lines) == [3, 4]
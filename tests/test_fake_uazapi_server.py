@@ -0,0 +1,96 @@
+"""Servidor Uazapi falso (scripts/fake_uazapi_server.py) exercitado pelo UazapiService real."""
+
+import pytest
+import requests
+
+pytest.importorskip("yaml")
+
+import services.uazapi as uz
+from conftest import load_fake_uazapi_module
+from utils.sync_uazapi import get_uazapi_campaign_counts
+
+fake = load_fake_uazapi_module()
+
+
+@pytest.fixture
+def server(fake_uazapi):
+    return fake_uazapi
+
+
+def test_routes_come_from_spec():
+    routes = fake.load_spec_routes()
+    assert routes[("POST", "/send/text")] == ["number", "text"]
+    assert routes[("POST", "/sender/listmessages")] == ["folder_id"]
+    assert ("GET", "/instance/status") in routes
+
+
+def test_send_text_is_idempotent_by_track_id_and_findable(server):
+    svc = uz.UazapiService()
+    first = svc.send_text_idempotent("tok", "5511999990001", "oi", track_id="t1", track_source="s")
+    again = svc.send_text_idempotent("tok", "5511999990001", "oi", track_id="t1", track_source="s")
+    assert first["id"] == again["id"]
+    found = svc.message_find("tok", "5511999990001@s.whatsapp.net")
+    assert found["returnedMessages"] == 1
+    assert found["messages"][0]["track_id"] == "t1"
+
+
+def test_advanced_folder_progresses_and_paginates(server):
+    svc = uz.UazapiService()
+    messages = [{"number": f"55119999{i:05d}", "type": "text", "text": "oi"} for i in range(1200)]
+    res = svc.create_advanced_campaign("tok", 1, 2, messages, info="bench")
+    folder_id = res["folder_id"]
+    assert res["count"] == 1200
+
+    folders = svc.list_folders("tok")
+    assert [f["id"] for f in folders] == [folder_id]
+    assert folders[0]["status"] == "done"
+    assert folders[0]["log_sucess"] == 1200
+    assert svc.list_folders("tok", status="Active") == []
+
+    page = svc.list_messages("tok", folder_id, message_status="Sent", page=3, page_size=500)
+    assert len(page["messages"]) == 200
+    assert page["pagination"] == {"total": 1200, "page": 3, "pageSize": 500, "lastPage": 3}
+    counts = get_uazapi_campaign_counts(svc, "tok", folder_id)
+    assert counts == {"sent": 1200, "failed": 0, "scheduled": 0}
+
+    assert svc.edit_campaign("tok", folder_id, "delete") == {"status": "deleted"}
+    assert svc.list_folders("tok") == []
+
+
+def test_paused_folder_keeps_scheduled_messages(server):
+    server.state.delay_scale = 1000.0
+    svc = uz.UazapiService()
+    res = svc.create_advanced_campaign(
+        "tok", 10, 10, [{"number": "5511", "type": "text", "text": "a"}] * 3
+    )
+    assert svc.edit_campaign("tok", res["folder_id"], "stop") == {"status": "paused"}
+    counts = get_uazapi_campaign_counts(svc, "tok", res["folder_id"])
+    # 1.ª mensagem sai na criação; as restantes ficam agendadas com a pasta pausada.
+    assert counts == {"sent": 1, "failed": 0, "scheduled": 2}
+
+
+def test_instance_state_status_and_revoked_token(server):
+    svc = uz.UazapiService()
+    server.state.set_connected("down", False)
+    assert svc.get_status("down")["instance"]["status"] == "disconnected"
+    assert svc.send_text_idempotent("down", "5511", "oi", track_id="x", track_source="s") is None
+    server.state.revoked.add("gone")
+    assert svc.list_folders("gone") is None
+    server.state.not_on_whatsapp.add("5511000000000")
+    checked = svc.check_phone("tok", ["5511000000000", "5511999990001"])
+    assert [c["isInWhatsapp"] for c in checked] == [False, True]
+
+
+def test_fault_injection_and_validation(server):
+    server.faults.update({"gateway_timeout_rate": 1.0})
+    resp = requests.post(f"{server.url}/send/text", headers={"token": "t"}, json={}, timeout=5)
+    assert resp.status_code == 504
+    server.faults.update({"gateway_timeout_rate": 0.0, "latency_ms": 50})
+    resp = requests.post(
+        f"{server.url}/send/text", headers={"token": "t"}, json={"number": "5511"}, timeout=5
+    )
+    assert resp.status_code == 400
+    assert "text" in resp.json()["error"]
+    assert resp.elapsed.total_seconds() >= 0.05
+    state = requests.get(f"{server.url}/__fake__/state", timeout=5).json()
+    assert state["requests"]["/send/text"] == 2
@@ -0,0 +1,110 @@
+"""campaign_leads: escritas por lead em lote (UPDATE … FROM VALUES) e call sites."""
+
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import utils.lead_bulk_update as lbu
+import worker_cadence as wc
+
+
+def test_groups_by_column_set_and_merges_repeated_leads():
+    cur = MagicMock()
+    with patch.object(lbu, "execute_values", side_effect=[[(1,), (2,)], [(3,)]]) as ev:
+        n = lbu.bulk_update_campaign_leads(
+            cur,
+            [
+                (1, {"send_batch": 1}),
+                (3, {"cadence_status": "stopped"}),
+                (2, {"send_batch": 1}),
+                (3, {"log": "abort"}),
+                (1, {"send_batch": 2}),
+                (4, {}),
+            ],
+        )
+    assert n == 3
+    assert ev.call_count == 2
+    (sql_a, rows_a), (sql_b, rows_b) = [(c.args[1], c.args[2]) for c in ev.call_args_list]
+    assert "SET send_batch = v.send_batch" in sql_a
+    assert "FROM (VALUES %s) AS v (id, send_batch)" in sql_a
+    assert rows_a == [(1, 2), (2, 1)]
+    assert ev.call_args_list[0].kwargs["template"] == "(%s::integer, %s::integer)"
+    assert "SET cadence_status = v.cadence_status, log = v.log" in sql_b
+    assert rows_b == [(3, "stopped", "abort")]
+    assert all(c.kwargs["fetch"] is True for c in ev.call_args_list)
+    cur.execute.assert_not_called()
+
+
+def test_empty_is_noop():
+    with patch.object(lbu, "execute_values") as ev:
+        assert lbu.bulk_update_campaign_leads(MagicMock(), []) == 0
+    ev.assert_not_called()
+
+
+def test_unknown_column_is_rejected():
+    with pytest.raises(ValueError):
+        lbu.bulk_update_campaign_leads(MagicMock(), [(1, {"phone; DROP TABLE x": "1"})])
+
+
+def test_safety_buffer_writes_all_leads_in_one_batch():
+    conn = MagicMock()
+    cur = MagicMock()
+    conn.cursor.return_value.__enter__ = MagicMock(return_value=cur)
+    conn.cursor.return_value.__exit__ = MagicMock(return_value=False)
+    leads = [
+        {"id": 1, "chatwoot_conversation_id": 11, "campaign_id": 5, "current_step": 1,
+         "last_message_sent_at": datetime(2026, 1, 1), "phone": "1", "name": "a"},
+        {"id": 2, "chatwoot_conversation_id": None, "campaign_id": 5, "current_step": 1,
+         "last_message_sent_at": datetime(2026, 1, 1), "phone": "2", "name": "b"},
+        {"id": 3, "chatwoot_conversation_id": 33, "campaign_id": 5, "current_step": 4,
+         "last_message_sent_at": datetime(2026, 1, 1), "phone": "3", "name": "c"},
+    ]
+    cur.fetchall.return_value = leads
+    cur.fetchone.side_effect = [{"delay_days": 2}, None]
+    batches = []
+    events = []
+    conn.commit.side_effect = lambda: events.append("commit")
+
+    with patch.object(wc, "discover_chatwoot_conversation", return_value=22), patch.object(
+        wc, "get_chatwoot_conversation_details",
+        side_effect=lambda cid: {"unread_count": 1 if cid == 22 else 0},
+    ), patch.object(wc, "get_chatwoot_conversation_messages", return_value=[]), patch.object(
+        wc, "toggle_chatwoot_status",
+        side_effect=lambda conv_id, status, snoozed_until=None: events.append((conv_id, status)),
+    ), patch.object(
+        wc, "bulk_update_campaign_leads", side_effect=lambda _cur, ups: batches.append(list(ups))
+    ):
+        wc.check_monitoring_leads(conn)
+
+    assert len(batches) == 1
+    updates = batches[0]
+    assert updates[0][0] == 1 and updates[0][1]["cadence_status"] == "snoozed"
+    assert updates[1] == (2, {"chatwoot_conversation_id": 22})
+    assert updates[2] == (2, {"cadence_status": "stopped", "log": "Safety Buffer Abort: Unread count is 1"})
+    assert updates[3] == (3, {"cadence_status": "completed"})
+    assert conn.commit.call_count == 1
+    # Chatwoot só é alterado depois de o estado dos leads estar gravado.
+    assert events == ["commit", (11, "snoozed"), (33, "resolved")]
+
+
+def test_safety_buffer_skips_chatwoot_when_lead_write_fails():
+    conn = MagicMock()
+    cur = MagicMock()
+    conn.cursor.return_value.__enter__ = MagicMock(return_value=cur)
+    conn.cursor.return_value.__exit__ = MagicMock(return_value=False)
+    cur.fetchall.return_value = [
+        {"id": 1, "chatwoot_conversation_id": 11, "campaign_id": 5, "current_step": 1,
+         "last_message_sent_at": datetime(2026, 1, 1), "phone": "1", "name": "a"},
+    ]
+    cur.fetchone.return_value = None
+
+    with patch.object(wc, "get_chatwoot_conversation_details", return_value={"unread_count": 0}), \
+            patch.object(wc, "get_chatwoot_conversation_messages", return_value=[]), \
+            patch.object(wc, "toggle_chatwoot_status") as toggle, \
+            patch.object(wc, "bulk_update_campaign_leads", side_effect=RuntimeError("db down")):
+        with pytest.raises(RuntimeError):
+            wc.check_monitoring_leads(conn)
+
+    toggle.assert_not_called()
+    conn.commit.assert_not_called()
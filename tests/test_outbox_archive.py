@@ -0,0 +1,75 @@
+"""Outbox hot/cold: arquivo mensal de linhas finalizadas e compactação de tentativas."""
+
+from datetime import date, datetime
+from unittest.mock import MagicMock
+
+from utils.outbox_archive import (
+    archive_finalized_outbox_rows,
+    compact_send_attempt_payloads,
+    ensure_history_partitions,
+    history_partition_name,
+)
+
+
+def _conn(fetchall_results=()):
+    conn = MagicMock()
+    cur = MagicMock()
+    cur.fetchall.side_effect = list(fetchall_results)
+    cur.rowcount = 0
+    conn.cursor.return_value.__enter__ = MagicMock(return_value=cur)
+    conn.cursor.return_value.__exit__ = MagicMock(return_value=False)
+    return conn, cur
+
+
+def test_partition_names_and_december_rollover():
+    conn, cur = _conn()
+    names = ensure_history_partitions(
+        conn,
+        "campaign_message_outbox_history",
+        [date(2025, 12, 30), date(2025, 12, 1), date(2026, 1, 2)],
+    )
+    assert names == [
+        "campaign_message_outbox_history_202512",
+        "campaign_message_outbox_history_202601",
+    ]
+    first_params = cur.execute.call_args_list[0][0][1]
+    assert first_params == (date(2025, 12, 1), date(2026, 1, 1))
+    assert history_partition_name("campaign_send_attempts_history", date(2026, 3, 1)).endswith(
+        "_202603"
+    )
+
+
+def test_archive_disabled_or_nothing_due():
+    conn, cur = _conn()
+    assert archive_finalized_outbox_rows(conn, older_than_days=0) == 0
+    cur.execute.assert_not_called()
+
+    conn, cur = _conn([[]])
+    assert archive_finalized_outbox_rows(conn, older_than_days=30) == 0
+    assert cur.execute.call_count == 1
+
+
+def test_archive_moves_rows_and_attempts_in_one_statement():
+    candidates = [(1, datetime(2026, 1, 5)), (2, datetime(2026, 2, 1))]
+    conn, cur = _conn([candidates, [(date(2026, 1, 1),)], [(1,), (2,)]])
+    assert archive_finalized_outbox_rows(conn, older_than_days=30, batch_size=10) == 2
+    sqls = [c[0][0] for c in cur.execute.call_args_list]
+    partitions = [s for s in sqls if "PARTITION OF" in s]
+    assert len(partitions) == 3
+    move = sqls[-1]
+    assert "DELETE FROM campaign_send_attempts a" in move
+    assert "INSERT INTO campaign_send_attempts_history" in move
+    assert "DELETE FROM campaign_message_outbox o" in move
+    assert "INSERT INTO campaign_message_outbox_history" in move
+    assert "FOR UPDATE SKIP LOCKED" in move
+    assert cur.execute.call_args_list[-1][0][1] == {"ids": [1, 2]}
+
+
+def test_compaction_touches_live_and_history():
+    conn, cur = _conn()
+    cur.rowcount = 3
+    assert compact_send_attempt_payloads(conn, older_than_days=7, keep_chars=100) == 6
+    sqls = [c[0][0] for c in cur.execute.call_args_list]
+    assert "UPDATE campaign_send_attempts\n" in sqls[0]
+    assert "UPDATE campaign_send_attempts_history" in sqls[1]
+    assert cur.execute.call_args_list[0][0][1]["keep"] == 100
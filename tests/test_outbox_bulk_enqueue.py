@@ -0,0 +1,94 @@
+"""Outbox: enfileiramento em lote (execute_values + RETURNING) com contagem exata."""
+
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import worker_message_outbox as wmo
+
+
+def _conn():
+    conn = MagicMock()
+    cur = MagicMock()
+    conn.cursor.return_value.__enter__ = MagicMock(return_value=cur)
+    conn.cursor.return_value.__exit__ = MagicMock(return_value=False)
+    return conn, cur
+
+
+def test_enqueue_for_leads_is_one_batched_insert_with_round_robin():
+    conn, cur = _conn()
+    with patch.object(wmo, "USE_MESSAGE_OUTBOX", True), patch.object(
+        wmo, "execute_values", return_value=[(1,), (2,), (3,)]
+    ) as ev:
+        n = wmo.enqueue_outbox_rows_for_leads(
+            conn,
+            campaign_id=10,
+            stage="follow1",
+            lead_ids=[101, 102, 103, 104],
+            instance_id=0,
+            enqueue_source="test",
+            instance_ids=[7, 8],
+        )
+    # 4 leads, 1 já na fila (ON CONFLICT) → 3 inseridas
+    assert n == 3
+    ev.assert_called_once()
+    sql, rows = ev.call_args[0][1], ev.call_args[0][2]
+    assert "ON CONFLICT (campaign_lead_id, stage) DO NOTHING" in sql
+    assert "RETURNING id" in sql
+    assert ev.call_args.kwargs["fetch"] is True
+    assert [r[2] for r in rows] == [7, 8, 7, 8]
+    assert {r[4] for r in rows} == {1}
+    assert rows[0][7] == "campaign-10-lead-101-follow1"
+    assert [r[5] for r in rows] == sorted(r[5] for r in rows)
+    cur.execute.assert_not_called()
+
+
+def test_insert_outbox_rows_empty_is_noop():
+    cur = MagicMock()
+    with patch.object(wmo, "execute_values") as ev:
+        assert wmo.insert_outbox_rows(cur, []) == 0
+    ev.assert_not_called()
+
+
+def test_outbox_enqueue_row_keeps_order_within_same_base():
+    base = datetime(2026, 1, 1, 12, 0, 0)
+    a = wmo.outbox_enqueue_row(
+        campaign_id=1, lead_id=5, instance_id=2, stage="Initial", position=0,
+        queued_base=base, next_run_at=base, payload_summary="{}",
+    )
+    b = wmo.outbox_enqueue_row(
+        campaign_id=1, lead_id=6, instance_id=2, stage="initial", position=1,
+        queued_base=base, next_run_at=base, payload_summary="{}",
+    )
+    assert a[3] == "initial" and a[4] == 0
+    assert a[5] < b[5]
+
+
+def test_cadence_followups_enqueue_all_campaigns_in_one_statement():
+    conn, cur = _conn()
+    cur.fetchall.return_value = [
+        {"campaign_id": 10, "stage": "follow1"},
+        {"campaign_id": 10, "stage": "follow1"},
+        {"campaign_id": 20, "stage": "breakup"},
+    ]
+    with patch.object(wmo, "USE_MESSAGE_OUTBOX", True):
+        assert wmo.enqueue_missing_cadence_outbox_rows(conn) == 3
+    assert cur.execute.call_count == 1
+    sql = cur.execute.call_args[0][0]
+    assert "INSERT INTO campaign_message_outbox" in sql
+    assert "cl.cadence_status = 'snoozed'" in sql and "cl.snooze_until <= NOW()" in sql
+    assert "('follow1', 2, 1, 2)" in sql and "('breakup', 4, 3, 4)" in sql
+    assert "ON CONFLICT (campaign_lead_id, stage) DO NOTHING" in sql
+    conn.commit.assert_called_once()
+
+
+def test_cadence_followups_skip_stages_already_archived():
+    """Linha ``failed`` arquivada no histórico não volta a enfileirar a mesma etapa."""
+    conn, cur = _conn()
+    cur.fetchall.return_value = []
+    with patch.object(wmo, "USE_MESSAGE_OUTBOX", True):
+        assert wmo.enqueue_missing_cadence_outbox_rows(conn) == 0
+    sql = " ".join(cur.execute.call_args[0][0].split())
+    assert (
+        "NOT EXISTS ( SELECT 1 FROM campaign_message_outbox_history h"
+        " WHERE h.campaign_lead_id = cl.id AND h.stage = s.stage )"
+    ) in sql
@@ -0,0 +1,65 @@
+"""Outbox: cache de templates/mídia por campanha (versão + TTL) e da flag superadmin."""
+
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import worker_message_outbox as wmo
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    wmo._outbox_content_cache.clear()
+    wmo._outbox_superadmin_cache.clear()
+    yield
+    wmo._outbox_content_cache.clear()
+    wmo._outbox_superadmin_cache.clear()
+
+
+def _conn(step_rows, campaign_row, user_row=None):
+    conn = MagicMock()
+    cur = MagicMock()
+    cur.fetchall.return_value = step_rows
+    cur.fetchone.side_effect = lambda: (
+        user_row if "FROM users" in cur.execute.call_args[0][0] else campaign_row
+    )
+    conn.cursor.return_value.__enter__ = MagicMock(return_value=cur)
+    conn.cursor.return_value.__exit__ = MagicMock(return_value=False)
+    return conn, cur
+
+
+def test_warm_cache_skips_template_queries_until_version_changes():
+    steps = [
+        {
+            "step_number": 1,
+            "message_template": json.dumps(["Olá {nome}"]),
+            "media_path": "/m.jpg",
+            "media_type": "image",
+        }
+    ]
+    conn, cur = _conn(steps, {"message_template": "[]"})
+
+    assert wmo._pick_message_text(conn, 10, 1, 3) == "Olá {nome}"
+    assert wmo._load_step_row(conn, 10, 1, 3)["media_path"] == "/m.jpg"
+    assert wmo._pick_message_text(conn, 10, 1, 3) == "Olá {nome}"
+    assert cur.execute.call_count == 2
+
+    wmo._pick_message_text(conn, 10, 1, 4)
+    assert cur.execute.call_count == 4
+
+
+def test_cache_expires_after_ttl():
+    conn, cur = _conn([], {"message_template": json.dumps(["legado"])})
+    with patch.object(wmo, "_OUTBOX_CONTENT_CACHE_TTL_SEC", 0.0):
+        assert wmo._pick_message_text(conn, 10, 1, 1) == "legado"
+        assert wmo._pick_message_text(conn, 10, 1, 1) == "legado"
+    assert cur.execute.call_count == 4
+    assert wmo._pick_message_text(conn, 10, 2, 1) == ""
+
+
+def test_superadmin_flag_is_cached_per_user():
+    conn, cur = _conn([], None, user_row={"email": "nobody@example.com"})
+    assert wmo._user_is_superadmin(conn, 5) is False
+    assert wmo._user_is_superadmin(conn, 5) is False
+    assert cur.execute.call_count == 1
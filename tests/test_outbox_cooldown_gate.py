@@ -0,0 +1,78 @@
+"""Outbox: cooldown por campanha/instância num gate (1 UPDATE por envio)."""
+
+from unittest.mock import MagicMock, patch
+
+import worker_message_outbox as wmo
+
+
+def _conn_collecting_sql():
+    cur = MagicMock()
+    cur.__enter__ = MagicMock(return_value=cur)
+    cur.__exit__ = MagicMock(return_value=False)
+    cur.fetchone.return_value = {"attempt_no": 1}
+    conn = MagicMock()
+    conn.cursor.return_value = cur
+    return conn, cur
+
+
+def _persist_success(conn):
+    with (
+        patch.object(wmo, "append_dispatch_audit_event"),
+        patch.object(wmo, "_try_schedule_next_initial_outbox_after_batch"),
+    ):
+        wmo._persist_outcome(
+            conn,
+            outbox_id=5,
+            campaign_id=7,
+            lead_id=9,
+            chosen={
+                "stage": "initial",
+                "instance_id": 3,
+                "user_id": 1,
+                "outbox_delay_min_seconds": 60,
+                "outbox_delay_max_seconds": 60,
+            },
+            http_status=200,
+            response_body='{"messageId": "m1"}',
+            outcome="sent",
+            latency_ms=10,
+            success=True,
+            track_from_response={"messageId": "m1"},
+        )
+
+
+def test_persist_success_bumps_campaign_gate_not_pending_rows():
+    conn, cur = _conn_collecting_sql()
+    with patch.object(wmo, "_OUTBOX_INSTANCE_MIN_INTERVAL_SEC", 0):
+        _persist_success(conn)
+    sqls = [c[0][0] for c in cur.execute.call_args_list]
+    assert not any(
+        "UPDATE campaign_message_outbox" in s and "status = 'pending'" in s and "campaign_id = %s" in s
+        for s in sqls
+    )
+    gate = [s for s in sqls if "outbox_next_allowed_send_at" in s]
+    assert len(gate) == 1 and "UPDATE campaigns" in gate[0]
+    conn.commit.assert_called_once()
+
+
+def test_persist_success_bumps_instance_gate_when_configured():
+    conn, cur = _conn_collecting_sql()
+    with patch.object(wmo, "_OUTBOX_INSTANCE_MIN_INTERVAL_SEC", 45):
+        _persist_success(conn)
+    calls = [
+        c[0]
+        for c in cur.execute.call_args_list
+        if "UPDATE instances" in c[0][0]
+    ]
+    assert calls and calls[0][1] == (45, 3)
+
+
+def test_persist_records_attempt_without_max_attempt_read():
+    conn, cur = _conn_collecting_sql()
+    _persist_success(conn)
+    sqls = [c[0][0] for c in cur.execute.call_args_list]
+    assert not any("MAX(attempt_no)" in s for s in sqls)
+    attempt_sql = [s for s in sqls if "INSERT INTO campaign_send_attempts" in s]
+    assert len(attempt_sql) == 1
+    assert "attempt_count = attempt_count + 1" in attempt_sql[0]
+    assert "status = 'sent'" in attempt_sql[0]
@@ -0,0 +1,141 @@
+"""Processo dedicado da outbox: espera por NOTIFY ou pelo próximo ``next_run_at``."""
+
+import re
+import socket
+from unittest.mock import MagicMock, patch
+
+import worker_message_outbox as wmo
+
+
+class _FakeListenConn:
+    def __init__(self, sock, notifies):
+        self._sock = sock
+        self._pending = list(notifies)
+        self.notifies = []
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def poll(self):
+        self._sock.recv(64)
+        self.notifies.extend(self._pending)
+        self._pending = []
+
+
+def test_wait_timeout_clamped_between_min_and_max():
+    with patch.object(wmo, "_OUTBOX_WORKER_MAX_SLEEP_SEC", 30):
+        assert wmo._outbox_wait_timeout(None) == 30.0
+        assert wmo._outbox_wait_timeout(120.0) == 30.0
+        assert wmo._outbox_wait_timeout(4.5) == 4.5
+        assert wmo._outbox_wait_timeout(-3.0) == wmo._OUTBOX_WORKER_MIN_WAIT_SEC
+
+
+def test_wait_for_notify_wakes_and_drains():
+    a, b = socket.socketpair()
+    try:
+        conn = _FakeListenConn(a, ["campaign_message_outbox"])
+        b.send(b"x")
+        assert wmo._wait_for_outbox_notify(conn, 5.0) is True
+        assert conn.notifies == []
+    finally:
+        a.close()
+        b.close()
+
+
+def test_wait_for_notify_times_out_without_event():
+    a, b = socket.socketpair()
+    try:
+        conn = _FakeListenConn(a, [])
+        assert wmo._wait_for_outbox_notify(conn, 0.01) is False
+    finally:
+        a.close()
+        b.close()
+
+
+def test_seconds_until_next_due_none_when_queue_empty():
+    cur = MagicMock()
+    cur.__enter__ = MagicMock(return_value=cur)
+    cur.__exit__ = MagicMock(return_value=False)
+    cur.fetchone.return_value = (None,)
+    conn = MagicMock()
+    conn.cursor.return_value = cur
+    assert wmo._seconds_until_next_outbox_due(conn) is None
+    cur.fetchone.return_value = (12.5,)
+    assert wmo._seconds_until_next_outbox_due(conn) == 12.5
+
+
+class _DueRowsCursor:
+    """Avalia token, arco do anel e envio em curso do SQL de espera sobre linhas em memória."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self._result = (None,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        rows = self.rows
+        if "COALESCE(TRIM(i.apikey), '') <> ''" in sql:
+            rows = [r for r in rows if (r["apikey"] or "").strip()]
+        shard = (params or {}).get("shard_instance_ids")
+        if "ANY(%(shard_instance_ids)s::int[])" in sql and shard is not None:
+            rows = [r for r in rows if r.get("instance_id") in shard]
+        dues = []
+        for r in rows:
+            due = r["due_in"]
+            if r.get("inflight") and "s.status = 'sending'" in sql:
+                due = max(due, float(params["inflight_poll_sec"]))
+            dues.append(due)
+        self._result = (min(dues, default=None),)
+
+    def fetchone(self):
+        return self._result
+
+
+def test_wait_is_max_sleep_when_only_rows_without_apikey_are_due():
+    conn = MagicMock()
+    conn.cursor.return_value = _DueRowsCursor([{"apikey": "  ", "due_in": -60.0}])
+    with patch.object(wmo, "_OUTBOX_WORKER_MAX_SLEEP_SEC", 30):
+        assert wmo._outbox_wait_timeout(wmo._seconds_until_next_outbox_due(conn)) == 30.0
+    conn.cursor.return_value = _DueRowsCursor(
+        [{"apikey": None, "due_in": -60.0}, {"apikey": "tok", "due_in": 7.0}]
+    )
+    assert wmo._seconds_until_next_outbox_due(conn) == 7.0
+
+
+def test_wait_ignores_rows_outside_this_workers_shard():
+    conn = MagicMock()
+    conn.cursor.return_value = _DueRowsCursor(
+        [{"apikey": "tok", "instance_id": 2, "due_in": -60.0},
+         {"apikey": "tok", "instance_id": 1, "due_in": 9.0}]
+    )
+    with patch.object(wmo, "_outbox_shard_instance_ids", [1]):
+        assert wmo._seconds_until_next_outbox_due(conn) == 9.0
+    with patch.object(wmo, "_outbox_shard_instance_ids", [3]):
+        assert wmo._seconds_until_next_outbox_due(conn) is None
+    with patch.object(wmo, "_outbox_shard_instance_ids", None):
+        assert wmo._seconds_until_next_outbox_due(conn) == -60.0
+
+
+def test_wait_polls_rows_blocked_by_inflight_send_instead_of_spinning():
+    conn = MagicMock()
+    conn.cursor.return_value = _DueRowsCursor(
+        [{"apikey": "tok", "instance_id": 1, "due_in": -60.0, "inflight": True}]
+    )
+    with patch.object(wmo, "_OUTBOX_WORKER_INFLIGHT_POLL_SEC", 4):
+        assert wmo._outbox_wait_timeout(wmo._seconds_until_next_outbox_due(conn)) == 4.0
+
+
+def test_send_window_deferral_keeps_its_own_positional_query():
+    # Só ``campaigns`` no JOIN: os predicados partilhados do claim (``i.*``, shard) não cabem aqui.
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.fetchall.return_value = []
+    assert wmo._defer_campaigns_outside_send_window(conn, max_campaigns=7) == 0
+    sql, params = cur.execute.call_args[0]
+    assert "%(" not in sql and not re.search(r"\bi\.", sql)
+    assert params == (7,)
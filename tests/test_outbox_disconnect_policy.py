@@ -392,7 +392,9 @@ def test_system_paused_campaign_skipped_by_outbox_tick_select(
 
     import worker_message_outbox as wmo
 
-    with patch.object(wmo, "is_campaign_send_window", return_value=True):
+    with patch.object(wmo, "is_campaign_send_window", return_value=True), patch.object(
+        wmo, "campaign_send_window_sql", return_value="TRUE"
+    ):
         with patch.object(
             wmo.uazapi_service,
             "send_text_idempotent",
@@ -0,0 +1,209 @@
+"""Outbox: lanes paralelas por instância (claim set-based → HTTP em paralelo → persistência)."""
+
+from unittest.mock import MagicMock, patch
+
+import worker_message_outbox as wmo
+
+
+def _conn_with_rows(rows, locked=({"id": 10}, {"id": 30})):
+    conn = MagicMock()
+    cur = MagicMock()
+    cur.fetchall.side_effect = [list(locked), rows]
+    conn.cursor.return_value.__enter__ = MagicMock(return_value=cur)
+    conn.cursor.return_value.__exit__ = MagicMock(return_value=False)
+    return conn, cur
+
+
+def test_claim_outbox_batch_locks_campaigns_then_single_update_returning():
+    rows = [
+        {"id": 1, "campaign_id": 10, "instance_id": 1, "stage": "initial"},
+        {"id": 4, "campaign_id": 30, "instance_id": 2, "stage": "initial"},
+    ]
+    conn, cur = _conn_with_rows(rows)
+    with patch.object(wmo, "_outbox_shard_instance_ids", None):
+        claimed = wmo._claim_outbox_batch(conn, 8)
+
+    assert [r["id"] for r in claimed] == [1, 4]
+    assert cur.execute.call_count == 2
+    lock_sql, lock_params = cur.execute.call_args_list[0][0]
+    # Serializa por campanha entre workers: lock das campanhas candidatas antes do UPDATE.
+    assert "FROM campaigns c" in lock_sql and "FOR UPDATE OF c SKIP LOCKED" in lock_sql
+    assert "s.status = 'sending' AND s.campaign_id = o.campaign_id" in lock_sql
+    assert lock_params == {"shard_instance_ids": None}
+    sql, params = cur.execute.call_args_list[1][0]
+    assert "UPDATE campaign_message_outbox o" in sql
+    assert "SET status = 'sending'" in sql
+    assert "RETURNING" in sql
+    assert "o.campaign_id = ANY(%(campaign_ids)s::int[])" in sql
+    # Melhor linha por (campanha, instância), emparelhamento guloso: uma lane por campanha e instância.
+    assert "PARTITION BY campaign_id, instance_id" in sql and "rn_pair = 1" in sql
+    assert "k.campaign_id = ANY(l.campaign_ids) OR k.instance_id = ANY(l.instance_ids)" in sql
+    assert "FOR UPDATE" not in sql
+    assert "c.outbox_last_instance_id" in sql
+    assert "claimed_by = %(worker_id)s" in sql
+    assert params == {
+        "campaign_ids": [10, 30],
+        "max_lanes": 8,
+        "shard_instance_ids": None,
+        "worker_id": wmo.OUTBOX_WORKER_ID,
+        "lease_sec": wmo._OUTBOX_LEASE_SEC,
+    }
+    conn.commit.assert_called_once()
+
+
+def test_claim_outbox_batch_skips_update_when_every_campaign_is_locked():
+    conn, cur = _conn_with_rows([], locked=())
+    with patch.object(wmo, "_outbox_shard_instance_ids", [1, 2]):
+        assert wmo._claim_outbox_batch(conn, 8) == []
+    assert cur.execute.call_count == 1
+    conn.commit.assert_called_once()
+
+
+def test_dispatch_releases_claimed_initial_over_daily_quota():
+    chosen = {"id": 7, "campaign_id": 10, "instance_id": 1, "stage": "initial"}
+    conn = MagicMock()
+    with patch.object(wmo, "_claim_outbox_batch", return_value=[chosen]), patch.object(
+        wmo, "_passes_throttle_initial", return_value=False
+    ), patch.object(wmo, "_defer_initial_row_daily_quota") as defer, patch.object(
+        wmo, "_send_outbox_http"
+    ) as send:
+        assert wmo.dispatch_message_outbox(conn) == 0
+    defer.assert_called_once_with(conn, chosen)
+    send.assert_not_called()
+
+
+def test_dispatch_without_claim_defers_campaigns_outside_window():
+    conn = MagicMock()
+    with patch.object(wmo, "_claim_outbox_batch", return_value=[]), patch.object(
+        wmo, "_defer_campaigns_outside_send_window"
+    ) as defer:
+        assert wmo.dispatch_message_outbox(conn) == 0
+    defer.assert_called_once_with(conn)
+    conn.commit.assert_called_once()
+
+
+def test_dispatch_defers_campaigns_outside_window_even_when_claim_finds_rows():
+    chosen = {"id": 7, "campaign_id": 10, "instance_id": 1, "stage": "initial"}
+    conn = MagicMock()
+    calls = []
+    with patch.object(
+        wmo, "_defer_campaigns_outside_send_window", side_effect=lambda c: calls.append("defer")
+    ) as defer, patch.object(
+        wmo, "_claim_outbox_batch", side_effect=lambda c, n: calls.append("claim") or [chosen]
+    ), patch.object(wmo, "_passes_throttle_initial", return_value=False), patch.object(
+        wmo, "_defer_initial_row_daily_quota"
+    ):
+        wmo.dispatch_message_outbox(conn)
+    defer.assert_called_once_with(conn)
+    assert calls == ["defer", "claim"]
+
+
+def test_send_outbox_http_missing_phone_skips_http():
+    prep = {
+        "phone_num": None,
+        "message": "oi",
+        "media_path": "",
+        "media_type": "image",
+        "track_id": "t",
+        "track_source": "campaign_message_outbox",
+    }
+    with patch.object(wmo, "uazapi_service") as svc:
+        res = wmo._send_outbox_http(prep)
+    svc.send_text_idempotent.assert_not_called()
+    assert res["success"] is False
+    assert res["response_body"] == "missing_phone"
+
+
+def test_send_outbox_http_open_circuit_skips_http():
+    prep = {
+        "phone_num": "5511999999999",
+        "message": "oi",
+        "media_path": "",
+        "media_type": "image",
+        "track_id": "t",
+        "track_source": "campaign_message_outbox",
+        "token": "dead-token",
+    }
+    with patch.object(wmo.uazapi_circuit_breaker, "state", return_value="open"), patch.object(
+        wmo, "uazapi_service"
+    ) as svc:
+        res = wmo._send_outbox_http(prep)
+    svc.send_text_idempotent.assert_not_called()
+    assert res["success"] is False
+    assert res["response_body"] == "uazapi_circuit_open"
+
+
+def test_run_outbox_lanes_keeps_order_with_parallel_http():
+    preps = [
+        {
+            "phone_num": f"55119999900{i}",
+            "message": f"msg {i}",
+            "media_path": "",
+            "media_type": "image",
+            "is_sa": False,
+            "user_id": 1,
+            "token": f"tok-{i}",
+            "step_number": 1,
+            "track_id": f"campaign-1-lead-{i}-initial",
+            "track_source": "campaign_message_outbox",
+        }
+        for i in range(3)
+    ]
+    with patch.object(wmo, "uazapi_service") as svc:
+        svc.send_text_idempotent.side_effect = lambda token, number, text, **kw: {
+            "messageId": token
+        }
+        results = wmo._run_outbox_lanes(preps)
+    assert [r["track_from_response"]["messageId"] for r in results] == [
+        "tok-0",
+        "tok-1",
+        "tok-2",
+    ]
+    assert all(r["success"] for r in results)
+
+
+def test_run_outbox_lanes_turns_lane_exception_into_failed_result():
+    preps = [{"outbox_id": i, "campaign_id": 10 + i, "token": f"tok-{i}"} for i in range(3)]
+
+    def _send(prep):
+        if prep["outbox_id"] == 1:
+            raise RuntimeError("boom")
+        return {"success": True, "outbox_id": prep["outbox_id"]}
+
+    with patch.object(wmo, "_send_outbox_http", side_effect=_send):
+        results = wmo._run_outbox_lanes(preps)
+
+    assert [r["success"] for r in results] == [True, False, True]
+    failed = results[1]
+    assert failed["outcome"] == "failed"
+    assert failed["response_body"].startswith("outbox_lane_exception: RuntimeError")
+    # Transitório: a linha volta a pending em backoff, não fecha como failed.
+    assert wmo.classify_outbox_send_failure(None, failed["response_body"], None, None) == "retry_backoff"
+
+
+def test_dispatch_releases_row_whose_prepare_fails_and_sends_the_rest():
+    bad = {"id": 7, "campaign_id": 10, "instance_id": 1, "stage": "initial"}
+    good = {"id": 8, "campaign_id": 20, "instance_id": 2, "stage": "initial"}
+    good_prep = {"outbox_id": 8, "campaign_id": 20, "lead_id": 3, "chosen": good}
+    conn = MagicMock()
+
+    def _prepare(_conn, chosen):
+        if chosen["id"] == 7:
+            raise RuntimeError("template lookup failed")
+        return good_prep
+
+    with patch.object(wmo, "_claim_outbox_batch", return_value=[bad, good]), patch.object(
+        wmo, "_passes_throttle_initial", return_value=True
+    ), patch.object(wmo, "_prepare_outbox_send", side_effect=_prepare), patch.object(
+        wmo, "_defer_row_retry_later"
+    ) as release, patch.object(
+        wmo, "_run_outbox_lanes", return_value=[{"success": True}]
+    ) as lanes, patch.object(wmo, "_persist_outcome") as persist, patch.object(
+        wmo, "_defer_campaigns_outside_send_window"
+    ):
+        assert wmo.dispatch_message_outbox(conn) == 1
+
+    conn.rollback.assert_called_once()
+    release.assert_called_once_with(conn, 7, minutes=15)
+    lanes.assert_called_once_with([good_prep])
+    assert persist.call_args.kwargs["outbox_id"] == 8
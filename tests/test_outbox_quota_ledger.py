@@ -0,0 +1,108 @@
+"""Outbox: ledger em memória das cotas diárias de initial (sem consulta por candidato)."""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import worker_message_outbox as wmo
+
+
+def _snapshot(campaign_id, *, user_id=1, sent_campaign=0, sent_user=0, cap=2):
+    return {
+        "user_id": user_id,
+        "policy": "g3",
+        "plan_limit": 100,
+        "campaign_cap": cap,
+        "sent_user_today": sent_user,
+        "sent_campaign_today": sent_campaign,
+        "allows_more": sent_campaign < cap,
+        "remaining_slots": max(0, cap - sent_campaign),
+    }
+
+
+@pytest.fixture(autouse=True)
+def _clear_ledger():
+    wmo._initial_quota_ledger.clear()
+    yield
+    wmo._initial_quota_ledger.clear()
+
+
+def test_ledger_loads_once_and_counts_local_sends():
+    row = {"stage": "initial", "campaign_id": 10}
+    with patch.object(wmo, "initial_chunk_quota_snapshot", side_effect=_snapshot) as snap:
+        assert wmo._passes_throttle_initial(row) is True
+        wmo._record_initial_quota_send(10)
+        assert wmo._passes_throttle_initial(row) is True
+        wmo._record_initial_quota_send(10)
+        assert wmo._passes_throttle_initial(row) is False
+    assert snap.call_count == 1
+
+
+def test_ledger_reloads_after_ttl():
+    row = {"stage": "initial", "campaign_id": 11}
+    with patch.object(wmo, "_OUTBOX_QUOTA_LEDGER_TTL_SEC", 0.0), patch.object(
+        wmo, "initial_chunk_quota_snapshot", side_effect=_snapshot
+    ) as snap:
+        wmo._passes_throttle_initial(row)
+        wmo._passes_throttle_initial(row)
+    assert snap.call_count == 2
+
+
+def test_sharded_worker_reloads_quota_before_each_initial():
+    # Outro worker enviou um initial da mesma campanha entre as duas consultas deste.
+    snaps = iter([_snapshot(14, sent_campaign=1), _snapshot(14, sent_campaign=2)])
+    row = {"stage": "initial", "campaign_id": 14}
+    with patch.object(wmo, "_outbox_shard_instance_ids", [1, 3]), patch.object(
+        wmo, "initial_chunk_quota_snapshot", side_effect=lambda _cid: next(snaps)
+    ) as snap:
+        assert wmo._passes_throttle_initial(row) is True
+        assert wmo._passes_throttle_initial(row) is False
+    assert snap.call_count == 2
+
+
+def test_followups_skip_ledger_and_user_counts_are_shared():
+    with patch.object(wmo, "initial_chunk_quota_snapshot") as snap:
+        assert wmo._passes_throttle_initial({"stage": "follow1", "campaign_id": 12}) is True
+    snap.assert_not_called()
+
+    with patch.object(wmo, "initial_chunk_quota_snapshot", side_effect=_snapshot):
+        wmo._initial_quota_entry(20)
+        wmo._initial_quota_entry(21)
+    wmo._record_initial_quota_send(20)
+    assert wmo._initial_quota_ledger[20]["sent_campaign_today"] == 1
+    assert wmo._initial_quota_ledger[21]["sent_campaign_today"] == 0
+    assert wmo._initial_quota_ledger[21]["sent_user_today"] == 1
+
+
+def test_missing_campaign_blocks_initial():
+    with patch.object(
+        wmo,
+        "initial_chunk_quota_snapshot",
+        return_value={"allows_more": False, "remaining_slots": 0},
+    ):
+        assert wmo._passes_throttle_initial({"stage": "initial", "campaign_id": 13}) is False
+
+
+def test_stale_pending_recovery_reads_quota_from_ledger():
+    conn = MagicMock()
+    cur = MagicMock()
+    cur.rowcount = 1
+    conn.cursor.return_value.__enter__ = MagicMock(return_value=cur)
+    conn.cursor.return_value.__exit__ = MagicMock(return_value=False)
+    past = datetime.utcnow() - timedelta(hours=1)
+    cur.fetchall.return_value = [
+        {"id": oid, "campaign_id": 15, "next_run_at": past, "send_hour_start": 8,
+         "send_hour_end": 20, "send_saturday": True, "send_sunday": True}
+        for oid in (1, 2, 3)
+    ]
+    later = datetime.utcnow() + timedelta(hours=3)
+    with patch.object(
+        wmo, "initial_chunk_quota_snapshot",
+        side_effect=lambda cid: _snapshot(cid, sent_campaign=2),
+    ) as snap, patch.object(wmo, "is_campaign_send_window", return_value=True), patch.object(
+        wmo, "next_valid_send_utc_naive", return_value=later
+    ):
+        assert wmo._recover_stale_pending_initial_outbox(conn) == 3
+    # Cota esgotada: as três linhas são reprogramadas com uma só consulta à cota.
+    assert snap.call_count == 1
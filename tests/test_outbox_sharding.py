@@ -0,0 +1,113 @@
+"""Outbox multi-nó: shard de instâncias por hash consistente, heartbeat e reaper por lease."""
+
+from unittest.mock import MagicMock, patch
+
+import worker_message_outbox as wmo
+from utils.outbox_sharding import build_ring, owned_instance_ids, ring_owner
+
+
+def test_owned_instance_ids_partition_is_complete_and_disjoint():
+    workers = ["a:1", "b:1", "c:1"]
+    instances = list(range(1, 601))
+    shards = [owned_instance_ids(w, workers, instances) for w in workers]
+    assert sorted(i for s in shards for i in s) == instances
+    assert all(len(s) > 100 for s in shards)
+
+
+def test_worker_leaving_only_moves_its_instances():
+    instances = list(range(1, 501))
+    before = build_ring(["a:1", "b:1", "c:1"])
+    after = build_ring(["a:1", "b:1"])
+    for iid in instances:
+        owner = ring_owner(before, iid)
+        if owner != "c:1":
+            assert ring_owner(after, iid) == owner
+
+
+def _conn_with_fetchall(*results):
+    conn = MagicMock()
+    cur = MagicMock()
+    cur.fetchall.side_effect = list(results)
+    conn.cursor.return_value.__enter__ = MagicMock(return_value=cur)
+    conn.cursor.return_value.__exit__ = MagicMock(return_value=False)
+    return conn, cur
+
+
+def test_heartbeat_single_worker_has_no_shard():
+    conn, cur = _conn_with_fetchall([{"worker_id": "me:1"}])
+    with patch.object(wmo, "OUTBOX_WORKER_ID", "me:1"), patch.object(
+        wmo, "_outbox_shard_instance_ids", [1]
+    ):
+        assert wmo._outbox_worker_heartbeat(conn) is None
+        assert wmo._outbox_shard_instance_ids is None
+    sqls = [c[0][0] for c in cur.execute.call_args_list]
+    assert any("INSERT INTO outbox_workers" in s for s in sqls)
+    assert any("SET lease_expires_at" in s and "claimed_by = %s" in s for s in sqls)
+    conn.commit.assert_called_once()
+
+
+def test_heartbeat_with_peers_claims_only_its_arc():
+    live = [{"worker_id": "me:1"}, {"worker_id": "peer:2"}]
+    instances = [{"id": i} for i in range(1, 41)]
+    conn, _ = _conn_with_fetchall(live, instances)
+    with patch.object(wmo, "OUTBOX_WORKER_ID", "me:1"), patch.object(
+        wmo, "_outbox_shard_instance_ids", None
+    ):
+        shard = wmo._outbox_worker_heartbeat(conn)
+        assert shard == owned_instance_ids("me:1", ["me:1", "peer:2"], range(1, 41))
+        assert 0 < len(shard) < 40
+
+
+class _TupleCursorConn:
+    """Conexão do worker: cursor de tuplas por omissão, dicts só com ``RealDictCursor``."""
+
+    def __init__(self, live, instances):
+        self.results = {"outbox_workers": live, "instances": instances}
+        self.committed = False
+
+    def cursor(self, cursor_factory=None):
+        conn = self
+        as_dict = cursor_factory is wmo.RealDictCursor
+
+        class _Cur:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                self._rows = []
+                if sql.strip().startswith("SELECT"):
+                    key = "outbox_workers" if "FROM outbox_workers" in sql else "instances"
+                    self._rows = conn.results[key]
+
+            def fetchall(self):
+                if as_dict:
+                    return [dict(r) for r in self._rows]
+                return [tuple(r.values()) for r in self._rows]
+
+        return _Cur()
+
+    def commit(self):
+        self.committed = True
+
+
+def test_heartbeat_reads_rows_by_name_on_tuple_cursor_connection():
+    conn = _TupleCursorConn(
+        [{"worker_id": "me:1"}, {"worker_id": "peer:2"}], [{"id": i} for i in range(1, 21)]
+    )
+    with patch.object(wmo, "OUTBOX_WORKER_ID", "me:1"), patch.object(
+        wmo, "_outbox_shard_instance_ids", None
+    ):
+        shard = wmo._outbox_worker_heartbeat(conn)
+    assert shard == owned_instance_ids("me:1", ["me:1", "peer:2"], range(1, 21))
+    assert conn.committed is True
+
+
+def test_reaper_releases_expired_leases():
+    conn, cur = _conn_with_fetchall()
+    wmo._reaper_stale_sending(conn)
+    sql = cur.execute.call_args[0][0]
+    assert "lease_expires_at < NOW()" in sql
+    assert "claimed_by = NULL" in sql
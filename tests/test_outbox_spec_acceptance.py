@@ -435,7 +435,9 @@ def test_ac11_sent_today_increments_on_successful_tick(
 
         import worker_message_outbox as wmo
 
-        with patch.object(wmo, "is_campaign_send_window", return_value=True):
+        with patch.object(wmo, "is_campaign_send_window", return_value=True), patch.object(
+            wmo, "campaign_send_window_sql", return_value="TRUE"
+        ):
             with patch.object(
                 wmo.uazapi_service,
                 "send_text_idempotent",
@@ -496,7 +498,9 @@ def test_ac12_paused_campaign_skips_outbox_post(db_conn, ensure_target_user, ens
 
     import worker_message_outbox as wmo
 
-    with patch.object(wmo, "is_campaign_send_window", return_value=True):
+    with patch.object(wmo, "is_campaign_send_window", return_value=True), patch.object(
+        wmo, "campaign_send_window_sql", return_value="TRUE"
+    ):
         with patch.object(
             wmo.uazapi_service,
             "send_text_idempotent",
@@ -522,6 +526,196 @@ def test_ac12_paused_campaign_skips_outbox_post(db_conn, ensure_target_user, ens
     importlib.reload(__import__("worker_message_outbox", fromlist=["wmo"]))
 
 
+def test_cadence_enqueue_skips_stage_with_archived_failed_row(
+    db_conn, ensure_target_user, ensure_uazapi_instance, monkeypatch
+):
+    """FU1 ``failed`` movido para o histórico: lead continua snoozed vencido, mas a etapa não reenfileira."""
+    _reload_outbox_modules(monkeypatch, True)
+    from psycopg2.extras import RealDictCursor
+    from utils.outbox_archive import archive_finalized_outbox_rows
+
+    iid = ensure_uazapi_instance
+    cid, leads = _insert_campaign_with_leads(
+        db_conn, user_id=ensure_target_user, instance_id=iid, n_leads=1, name="FU1 archived failed"
+    )
+    lead_id = leads[0]
+    with db_conn.cursor() as cur:
+        cur.execute("UPDATE campaigns SET enable_cadence = true WHERE id = %s", (cid,))
+        cur.execute(
+            """
+            INSERT INTO campaign_steps (campaign_id, step_number, step_label, message_template)
+            VALUES (%s, 2, 'Follow-up 1', 'Oi de novo')
+            """,
+            (cid,),
+        )
+        cur.execute(
+            """
+            UPDATE campaign_leads
+            SET status = 'sent', current_step = 2, cadence_status = 'snoozed',
+                snooze_until = NOW() - INTERVAL '1 hour'
+            WHERE id = %s
+            """,
+            (lead_id,),
+        )
+        cur.execute(
+            """
+            INSERT INTO campaign_message_outbox (
+                campaign_id, campaign_lead_id, instance_id,
+                stage, step_priority, status, queued_at, next_run_at,
+                idempotency_key, payload_summary, updated_at
+            )
+            VALUES (%s, %s, %s, 'follow1', 1, 'failed', NOW() - INTERVAL '30 days',
+                    NOW() - INTERVAL '30 days', %s, '{}'::jsonb, NOW() - INTERVAL '30 days')
+            """,
+            (cid, lead_id, iid, f"campaign-{cid}-lead-{lead_id}-follow1"),
+        )
+        db_conn.commit()
+
+    assert archive_finalized_outbox_rows(db_conn, older_than_days=1, batch_size=10_000) >= 1
+
+    import worker_message_outbox as wmo
+
+    wmo.enqueue_missing_cadence_outbox_rows(db_conn)
+    with db_conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            SELECT COUNT(*) AS n FROM campaign_message_outbox
+            WHERE campaign_lead_id = %s AND stage = 'follow1'
+            """,
+            (lead_id,),
+        )
+        assert int(cur.fetchone()["n"]) == 0
+
+    monkeypatch.delenv("USE_MESSAGE_OUTBOX", raising=False)
+    importlib.reload(__import__("utils.config", fromlist=["cfg"]))
+    importlib.reload(__import__("worker_message_outbox", fromlist=["wmo"]))
+
+
+def test_claim_pairs_campaign_with_free_instance_when_best_row_loses_its_instance(
+    db_conn, ensure_target_user
+):
+    """Melhor linha de B cai na instância já dada a A: B ainda ocupa a outra instância livre."""
+    from psycopg2.extras import RealDictCursor
+
+    import worker_message_outbox as wmo
+
+    uid = ensure_target_user
+    with db_conn.cursor(cursor_factory=RealDictCursor) as cur:
+        iids = []
+        for n in range(2):
+            cur.execute(
+                """
+                INSERT INTO instances (user_id, name, apikey, status, api_provider)
+                VALUES (%s, %s, %s, 'connected', 'uazapi')
+                RETURNING id
+                """,
+                (uid, f"test-claim-pairs-{n}", f"fake-token-pairs-{n}"),
+            )
+            iids.append(int(cur.fetchone()["id"]))
+        db_conn.commit()
+    i1, i2 = iids
+    cid_a, leads_a = _insert_campaign_with_leads(
+        db_conn, user_id=uid, instance_id=i1, n_leads=1, name="Claim pairs A"
+    )
+    cid_b, leads_b = _insert_campaign_with_leads(
+        db_conn, user_id=uid, instance_id=i1, n_leads=2, name="Claim pairs B"
+    )
+    rows = [(cid_a, leads_a[0], i1, 0), (cid_b, leads_b[0], i1, 1), (cid_b, leads_b[1], i2, 2)]
+    outbox_ids = []
+    try:
+        with db_conn.cursor(cursor_factory=RealDictCursor) as cur:
+            for cid, lead_id, iid, prio in rows:
+                cur.execute(
+                    """
+                    INSERT INTO campaign_message_outbox (
+                        campaign_id, campaign_lead_id, instance_id,
+                        stage, step_priority, status, next_run_at,
+                        idempotency_key, payload_summary
+                    )
+                    VALUES (%s, %s, %s, 'initial', %s, 'pending', NOW() - INTERVAL '1 minute',
+                            %s, '{}'::jsonb)
+                    RETURNING id
+                    """,
+                    (cid, lead_id, iid, prio, f"campaign-{cid}-lead-{lead_id}-initial"),
+                )
+                outbox_ids.append(int(cur.fetchone()["id"]))
+            db_conn.commit()
+
+        with patch.object(wmo, "_outbox_shard_instance_ids", [i1, i2]):
+            claimed = wmo._claim_outbox_batch(db_conn, 4)
+
+        assert {int(r["id"]) for r in claimed} == {outbox_ids[0], outbox_ids[2]}
+    finally:
+        with db_conn.cursor() as cur:
+            cur.execute("DELETE FROM campaigns WHERE id = ANY(%s)", ([cid_a, cid_b],))
+            cur.execute("DELETE FROM instances WHERE id = ANY(%s)", (iids,))
+        db_conn.commit()
+
+
+def test_claim_skips_campaign_locked_by_another_worker(db_conn, ensure_target_user):
+    """Campanha com instâncias em dois arcos: enquanto outro nó a tranca no claim, este salta-a."""
+    from psycopg2.extras import RealDictCursor
+
+    from app import get_db_connection
+    import worker_message_outbox as wmo
+
+    uid = ensure_target_user
+    with db_conn.cursor(cursor_factory=RealDictCursor) as cur:
+        iids = []
+        for n in range(2):
+            cur.execute(
+                """
+                INSERT INTO instances (user_id, name, apikey, status, api_provider)
+                VALUES (%s, %s, %s, 'connected', 'uazapi')
+                RETURNING id
+                """,
+                (uid, f"test-claim-lock-{n}", f"fake-token-lock-{n}"),
+            )
+            iids.append(int(cur.fetchone()["id"]))
+        db_conn.commit()
+    i1, i2 = iids
+    cid_a, leads_a = _insert_campaign_with_leads(
+        db_conn, user_id=uid, instance_id=i1, n_leads=1, name="Claim lock A"
+    )
+    cid_b, leads_b = _insert_campaign_with_leads(
+        db_conn, user_id=uid, instance_id=i2, n_leads=1, name="Claim lock B"
+    )
+    other = get_db_connection()
+    try:
+        with db_conn.cursor(cursor_factory=RealDictCursor) as cur:
+            outbox_ids = []
+            for cid, lead_id, iid in ((cid_a, leads_a[0], i1), (cid_b, leads_b[0], i2)):
+                cur.execute(
+                    """
+                    INSERT INTO campaign_message_outbox (
+                        campaign_id, campaign_lead_id, instance_id,
+                        stage, step_priority, status, next_run_at,
+                        idempotency_key, payload_summary
+                    )
+                    VALUES (%s, %s, %s, 'initial', 0, 'pending', NOW() - INTERVAL '1 minute',
+                            %s, '{}'::jsonb)
+                    RETURNING id
+                    """,
+                    (cid, lead_id, iid, f"campaign-{cid}-lead-{lead_id}-initial"),
+                )
+                outbox_ids.append(int(cur.fetchone()["id"]))
+            db_conn.commit()
+
+        with other.cursor() as cur:
+            cur.execute("SELECT id FROM campaigns WHERE id = %s FOR UPDATE", (cid_a,))
+        with patch.object(wmo, "_outbox_shard_instance_ids", [i1, i2]):
+            claimed = wmo._claim_outbox_batch(db_conn, 4)
+        other.rollback()
+
+        assert [int(r["id"]) for r in claimed] == [outbox_ids[1]]
+    finally:
+        other.close()
+        with db_conn.cursor() as cur:
+            cur.execute("DELETE FROM campaigns WHERE id = ANY(%s)", ([cid_a, cid_b],))
+            cur.execute("DELETE FROM instances WHERE id = ANY(%s)", (iids,))
+        db_conn.commit()
+
+
 def test_ac5_daily_quota_defers_without_post(db_conn, ensure_target_user, ensure_uazapi_instance, monkeypatch):
     """AC5: quota initial esgotada para esta campanha → ``next_run_at`` adiado sem tentativa nesse ``outbox_id``.
 
@@ -557,12 +751,18 @@ def test_ac5_daily_quota_defers_without_post(db_conn, ensure_target_user, ensure
 
     import worker_message_outbox as wmo
 
-    def _quota_only_target_fails(campaign_id: int) -> bool:
-        return int(campaign_id) != int(cid)
+    real_snapshot = wmo.initial_chunk_quota_snapshot
+
+    def _quota_only_target_fails(campaign_id: int) -> dict:
+        if int(campaign_id) != int(cid):
+            return real_snapshot(campaign_id)
+        return {"allows_more": False, "remaining_slots": 0}
 
     new_run = prev_run
     for _ in range(250):
-        with patch.object(wmo, "is_campaign_send_window", return_value=True):
+        with patch.object(wmo, "is_campaign_send_window", return_value=True), patch.object(
+            wmo, "campaign_send_window_sql", return_value="TRUE"
+        ):
             with patch.object(
                 wmo.uazapi_service,
                 "send_text_idempotent",
@@ -570,7 +770,7 @@ def test_ac5_daily_quota_defers_without_post(db_conn, ensure_target_user, ensure
             ):
                 with patch.object(
                     wmo,
-                    "check_initial_chunk_daily_quota_for_campaign",
+                    "initial_chunk_quota_snapshot",
                     side_effect=_quota_only_target_fails,
                 ):
                     wmo.process_message_outbox_tick(db_conn)
@@ -1,19 +1,100 @@
 """Testes para utils/sync_uazapi - match de telefone API ↔ DB."""
 import json
+import threading
+import time
 
 import pytest
 
+import utils.sync_uazapi as sync_uazapi
+
 from utils.sync_uazapi import (
     normalize_phone_for_match,
     _extract_phones_from_message,
     _message_matches_folder,
     _reconcile_send_by_messages,
     _lead_ids_needing_message_find,
+    _counts_cache,
+    fetch_phones_by_status_since,
+    get_uazapi_campaign_counts,
+    match_leads_by_phone_norm,
     reconcile_leads_via_message_find,
     sync_campaign_leads_from_uazapi,
 )
 
 
+class _PagedCountsService:
+    """list_messages paginado em memória; ``with_total`` simula ``pagination.total``."""
+
+    def __init__(self, sizes, with_total=False, delay=0.0):
+        self.sizes = sizes
+        self.with_total = with_total
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def list_messages(self, token, folder_id, message_status=None, page=None, page_size=None,
+                      context=None):
+        with self.lock:
+            self.calls.append((message_status, page))
+        time.sleep(self.delay)
+        total = self.sizes[message_status]
+        last_page = max(1, -(-total // page_size))
+        start = (page - 1) * page_size
+        n = max(0, min(page_size, total - start))
+        pag = {"page": page, "pageSize": page_size, "lastPage": last_page}
+        if self.with_total:
+            pag["total"] = total
+        return {"messages": [{"id": i} for i in range(n)], "pagination": pag}
+
+
+class TestGetUazapiCampaignCounts:
+    @pytest.fixture(autouse=True)
+    def _clear_cache(self):
+        _counts_cache.clear()
+        yield
+        _counts_cache.clear()
+
+    def test_uses_pagination_total_from_first_page(self):
+        svc = _PagedCountsService({"Sent": 1700, "Failed": 3, "Scheduled": 0}, with_total=True)
+        counts = get_uazapi_campaign_counts(svc, "tok", "f1")
+        assert counts == {"sent": 1700, "failed": 3, "scheduled": 0}
+        assert sorted(svc.calls) == [("Failed", 1), ("Scheduled", 1), ("Sent", 1)]
+
+    def test_without_total_fetches_remaining_pages_concurrently(self, monkeypatch):
+        monkeypatch.setenv("UAZAPI_COUNTS_PAGE_CONCURRENCY", "8")
+        svc = _PagedCountsService({"Sent": 2600, "Failed": 501, "Scheduled": 10}, delay=0.1)
+        started = time.monotonic()
+        counts = get_uazapi_campaign_counts(svc, "tok", "f1")
+        elapsed = time.monotonic() - started
+        assert counts == {"sent": 2600, "failed": 501, "scheduled": 10}
+        assert len(svc.calls) == 6 + 2 + 1
+        # 9 páginas em 2 vagas de paralelismo (1.ª páginas + restantes), não 9 round-trips.
+        assert elapsed < 0.1 * 5
+
+    def test_ttl_cache_per_folder_and_status(self, monkeypatch):
+        monkeypatch.setenv("UAZAPI_COUNTS_CACHE_TTL_SEC", "30")
+        svc = _PagedCountsService({"Sent": 5, "Failed": 0, "Scheduled": 2}, with_total=True)
+        assert get_uazapi_campaign_counts(svc, "tok", "f1")["sent"] == 5
+        assert get_uazapi_campaign_counts(svc, "tok", "f1")["scheduled"] == 2
+        assert len(svc.calls) == 3
+        get_uazapi_campaign_counts(svc, "tok", "f2")
+        assert len(svc.calls) == 6
+
+    def test_failed_first_page_counts_zero_and_is_not_cached(self):
+        class _Flaky(_PagedCountsService):
+            def list_messages(self, token, folder_id, message_status=None, **kw):
+                if message_status == "Failed":
+                    self.calls.append((message_status, kw.get("page")))
+                    return None
+                return super().list_messages(token, folder_id, message_status, **kw)
+
+        svc = _Flaky({"Sent": 1, "Failed": 9, "Scheduled": 0}, with_total=True)
+        assert get_uazapi_campaign_counts(svc, "tok", "f1") == {"sent": 1, "failed": 0, "scheduled": 0}
+        svc.calls.clear()
+        get_uazapi_campaign_counts(svc, "tok", "f1")
+        assert svc.calls == [("Failed", 1)]
+
+
 class TestNormalizePhoneForMatch:
     def test_remotejid_remove_suffix(self):
         assert "554137984966" in normalize_phone_for_match("554137984966@s.whatsapp.net")
@@ -127,6 +208,93 @@ class TestReconcileSendByMessages:
         assert failed_ids == {202}
 
 
+class TestMatchLeadsByPhoneNorm:
+    class _Conn:
+        def __init__(self, rows):
+            self.rows = rows
+            self.executed = []
+
+        def cursor(self, cursor_factory=None):
+            conn = self
+
+            class _Cur:
+                def __enter__(self):
+                    return self
+
+                def __exit__(self, *exc):
+                    return False
+
+                def execute(self, query, params=None):
+                    conn.executed.append((" ".join(query.split()), params))
+
+                def fetchall(self):
+                    return conn.rows
+
+            return _Cur()
+
+    def test_single_indexed_lookup_with_all_variants(self):
+        conn = self._Conn([
+            {"id": 1, "phone": "x", "whatsapp_link": None,
+             "phone_norm": ["41999998888", "5541999998888"]},
+            {"id": 2, "phone": "x", "whatsapp_link": None,
+             "phone_norm": ["41911112222", "5541911112222"]},
+            {"id": 3, "phone": "x", "whatsapp_link": None,
+             "phone_norm": ["41900000000", "5541900000000"]},
+        ])
+        sent, failed = match_leads_by_phone_norm(
+            conn,
+            "campaign_id = %s AND id = ANY(%s)",
+            (77, [1, 2, 3]),
+            {"5541999998888@s.whatsapp.net"},
+            {"41 91111-2222"},
+        )
+        assert [r["id"] for r in sent] == [1]
+        assert [r["id"] for r in failed] == [2]
+        (query, params), = conn.executed
+        assert "phone_norm && %s::text[]" in query
+        assert params == (
+            77, [1, 2, 3], ["41911112222", "41999998888", "5541911112222", "5541999998888"]
+        )
+
+    def test_local_number_with_ddd_55_matches_api_prefixed_form(self):
+        # DDD 55 (RS): 11 dígitos a começar por 55, a API devolve 55 + número.
+        conn = self._Conn([
+            {"id": 1, "phone": "55999998888", "whatsapp_link": None,
+             "phone_norm": ["55999998888"]},
+        ])
+        sent, _ = match_leads_by_phone_norm(
+            conn, "campaign_id = %s", (77,), ["5555999998888@s.whatsapp.net"], []
+        )
+        assert [r["id"] for r in sent] == [1]
+
+    def test_whatsapp_link_different_from_phone_still_matches(self):
+        conn = self._Conn([
+            {"id": 1, "phone": "41999998888", "whatsapp_link": "https://wa.me/5541911112222",
+             "phone_norm": ["41999998888", "5541999998888", "5541911112222", "41911112222"]},
+        ])
+        sent, _ = match_leads_by_phone_norm(conn, "campaign_id = %s", (77,), ["5541911112222"], [])
+        assert [r["id"] for r in sent] == [1]
+
+    def test_rows_without_backfill_fall_back_to_phone_and_link(self):
+        conn = self._Conn([
+            {"id": 1, "phone": "41999998888", "whatsapp_link": None, "phone_norm": None},
+            {"id": 2, "phone": "41900000000", "whatsapp_link": "https://wa.me/5541911112222",
+             "phone_norm": None},
+            {"id": 3, "phone": "123", "whatsapp_link": None, "phone_norm": None},
+            {"id": 4, "phone": "41911112222", "whatsapp_link": None, "phone_norm": []},
+        ])
+        sent, failed = match_leads_by_phone_norm(
+            conn, "campaign_id = %s", (77,), ["5541999998888", "5541911112222"], ["5541911112222"]
+        )
+        assert [r["id"] for r in sent] == [1, 2]
+        assert failed == []
+
+    def test_no_valid_api_phones_skips_query(self):
+        conn = self._Conn([])
+        assert match_leads_by_phone_norm(conn, "campaign_id = %s", (1,), ["123"], []) == ([], [])
+        assert conn.executed == []
+
+
 class TestSyncCampaignLeadsFromUazapi:
     def test_sync_listfolders_updates_leads_when_folder_present(self, monkeypatch):
         """Com UAZAPI_LISTFOLDERS_PREFIX_SENT=1: listfolders + prefixo marca sent (legado)."""
@@ -1117,3 +1285,270 @@ class TestTask8SpecMessageFindSync:
 
         assert len(mf_calls) >= 2
         assert conn.committed is True
+
+
+class _WatermarkCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self._fetchall = []
+        self._fetchone = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, query, params=None):
+        compact = " ".join(query.split())
+        self.conn.executed.append((compact, params))
+        self.rowcount = 0
+        self._fetchall = []
+        self._fetchone = {}
+        if "SELECT uazapi_folder_id, uazapi_last_send_lead_ids" in compact:
+            self._fetchone = {"enable_cadence": True, "use_uazapi_sender": True}
+        elif "FROM campaign_stage_sends css" in compact:
+            self._fetchall = [dict(self.conn.send_row)]
+        elif "FROM campaign_leads cl" in compact and "SELECT cl.id" in compact:
+            self._fetchall = [{"id": i} for i in self.conn.find_scope]
+        elif "SELECT id, phone, whatsapp_link" in compact and "FROM campaign_leads" in compact:
+            self._fetchall = [{"id": 55, "phone": "11999999999", "whatsapp_link": None}]
+
+    def fetchall(self):
+        return self._fetchall
+
+    def fetchone(self):
+        return self._fetchone
+
+
+class _WatermarkConn:
+    def __init__(self, send_row, find_scope=(55,)):
+        self.send_row = send_row
+        self.find_scope = list(find_scope)
+        self.executed = []
+        self.committed = False
+
+    def cursor(self, cursor_factory=None):
+        return _WatermarkCursor(self)
+
+    def commit(self):
+        self.committed = True
+
+    def stage_send_updates(self):
+        return [(q, p) for q, p in self.executed if q.startswith("UPDATE campaign_stage_sends")]
+
+
+class _WatermarkService:
+    def __init__(self, log_sucess=1, log_failed=0, status="done", updated=1000):
+        self.folder = {
+            "id": "folder-fu1",
+            "status": status,
+            "log_sucess": log_sucess,
+            "log_failed": log_failed,
+            "updated": updated,
+        }
+        self.find_calls = []
+        self.list_messages_calls = []
+
+    def list_folders(self, _token, context=None):
+        return [dict(self.folder)]
+
+    def list_messages(self, *args, **kwargs):
+        self.list_messages_calls.append(kwargs.get("message_status"))
+        return {"messages": [], "pagination": {"lastPage": 1}}
+
+    def message_find(self, _token, chatid, limit=50, offset=0, context=None):
+        self.find_calls.append(chatid)
+        return {"messages": []}
+
+
+def _watermark_send_row(watermark=None, rescan_due=False, status="done"):
+    return {
+        "id": 7,
+        "stage": "follow1",
+        "instance_id": 12,
+        "instance_remote_jid": "5511999999999@s.whatsapp.net",
+        "uazapi_folder_id": "folder-fu1",
+        "lead_ids": [55],
+        "planned_count": 1,
+        "status": status,
+        "sync_watermark": watermark,
+        "sync_rescan_due": rescan_due,
+        "apikey": "token-1",
+    }
+
+
+_SYNCED_WATERMARK = {
+    "log_success": 1,
+    "log_failed": 0,
+    "status": "done",
+    "updated": 1000,
+    "db_status": "done",
+    "message_ts": {},
+}
+
+
+class TestIncrementalStageSync:
+    def _sync(self, conn, svc, **kwargs):
+        return sync_campaign_leads_from_uazapi(
+            conn=conn,
+            campaign_id=901,
+            token="t",
+            folder_id="folder-fu1",
+            uazapi_service=svc,
+            **kwargs,
+        )
+
+    def test_first_sync_runs_full_and_stores_watermark(self, monkeypatch):
+        monkeypatch.setenv("UAZAPI_SYNC_RECONCILE_LISTMESSAGES", "0")
+        conn = _WatermarkConn(_watermark_send_row())
+        svc = _WatermarkService()
+        self._sync(conn, svc)
+
+        assert svc.find_calls
+        (query, params), = conn.stage_send_updates()
+        assert "sync_watermark = %s::jsonb" in query and "sync_full_at = NOW()" in query
+        stored = json.loads(params[3])
+        assert stored["log_success"] == 1 and stored["log_failed"] == 0
+        assert stored["status"] == "done" and stored["updated"] == 1000
+        assert stored["db_status"] == params[2] == "done"
+
+    def test_unchanged_folder_is_skipped(self, monkeypatch, capsys):
+        monkeypatch.setenv("UAZAPI_SYNC_RECONCILE_LISTMESSAGES", "0")
+        conn = _WatermarkConn(_watermark_send_row(json.dumps(_SYNCED_WATERMARK)), find_scope=())
+        svc = _WatermarkService()
+        self._sync(conn, svc)
+
+        assert svc.find_calls == []
+        assert svc.list_messages_calls == []
+        assert not any("campaign_leads" in q for q, _p in conn.executed if q.startswith("UPDATE"))
+        (query, _params), = conn.stage_send_updates()
+        assert "SET last_sync_at = NOW()" in query and "success_count" not in query
+        assert conn.committed is True
+        assert '"skipped_unchanged": 1' in capsys.readouterr().out
+
+    @pytest.mark.parametrize(
+        "folder_kwargs, send_kwargs, sync_kwargs, env",
+        [
+            ({"log_sucess": 2}, {}, {}, {}),
+            ({"log_failed": 1}, {}, {}, {}),
+            ({"updated": 2000}, {}, {}, {}),
+            ({}, {"status": "partial"}, {}, {}),
+            ({}, {"rescan_due": True}, {}, {}),
+            ({}, {}, {"force_full": True}, {}),
+            ({}, {}, {}, {"UAZAPI_SYNC_INCREMENTAL": "0"}),
+        ],
+    )
+    def test_changes_or_rescan_run_full_sync(
+        self, monkeypatch, folder_kwargs, send_kwargs, sync_kwargs, env
+    ):
+        monkeypatch.setenv("UAZAPI_SYNC_RECONCILE_LISTMESSAGES", "0")
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        conn = _WatermarkConn(_watermark_send_row(dict(_SYNCED_WATERMARK), **send_kwargs))
+        svc = _WatermarkService(**folder_kwargs)
+        self._sync(conn, svc, **sync_kwargs)
+
+        assert svc.find_calls
+        (query, _params), = conn.stage_send_updates()
+        assert "success_count = %s" in query
+
+    def test_unchanged_folder_with_unresolved_find_scope_is_not_skipped(self, monkeypatch, capsys):
+        monkeypatch.setenv("UAZAPI_SYNC_RECONCILE_LISTMESSAGES", "0")
+        conn = _WatermarkConn(_watermark_send_row(dict(_SYNCED_WATERMARK)), find_scope=(55,))
+        svc = _WatermarkService()
+        self._sync(conn, svc)
+
+        assert svc.find_calls
+        (query, _params), = conn.stage_send_updates()
+        assert "success_count = %s" in query
+        assert '"skipped_unchanged": 1' not in capsys.readouterr().out
+
+    def test_listmessages_reconcile_reads_only_after_watermark(self, monkeypatch):
+        monkeypatch.setenv("UAZAPI_MESSAGE_FIND", "0")
+        monkeypatch.setenv("UAZAPI_SYNC_RECONCILE_LISTMESSAGES", "1")
+        prev = dict(_SYNCED_WATERMARK, log_success=0, message_ts={"Sent": 500, "Failed": 0})
+        conn = _WatermarkConn(_watermark_send_row(prev, status="running"))
+
+        class _Svc(_WatermarkService):
+            def list_messages(self, token, folder_id, message_status=None, **kw):
+                self.list_messages_calls.append(message_status)
+                msgs = []
+                if message_status == "Sent":
+                    msgs = [_msg(600, "5511999999999"), _msg(400, "5511988887777")]
+                return {"messages": msgs, "pagination": {"lastPage": 1}}
+
+        svc = _Svc(log_sucess=0)
+        self._sync(conn, svc)
+
+        assert svc.list_messages_calls == ["Sent", "Failed"]
+        lead_updates = [
+            p for q, p in conn.executed if q.startswith("UPDATE campaign_leads") and "'sent'" in q
+        ]
+        assert len(lead_updates) == 1 and list(lead_updates[0][5]) == [55]
+        (_query, params), = conn.stage_send_updates()
+        assert json.loads(params[3])["message_ts"] == {"Sent": 600, "Failed": 0}
+
+    def test_periodic_rescan_rereads_listmessages_from_the_start(self, monkeypatch):
+        monkeypatch.setenv("UAZAPI_MESSAGE_FIND", "0")
+        monkeypatch.setenv("UAZAPI_SYNC_RECONCILE_LISTMESSAGES", "1")
+        prev = dict(_SYNCED_WATERMARK, log_success=0, message_ts={"Sent": 500, "Failed": 0})
+        conn = _WatermarkConn(_watermark_send_row(prev, rescan_due=True, status="running"))
+        since_seen = []
+        real_fetch = sync_uazapi.fetch_phones_by_status_since
+
+        def _spy(*args, since_ts=None, **kwargs):
+            since_seen.append(since_ts)
+            return real_fetch(*args, since_ts=since_ts, **kwargs)
+
+        monkeypatch.setattr(sync_uazapi, "fetch_phones_by_status_since", _spy)
+        self._sync(conn, _WatermarkService(log_sucess=0))
+
+        assert since_seen == [None, None]
+
+
+class _TimestampedPages:
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def list_messages(self, token, folder_id, message_status=None, page=None, page_size=None,
+                      context=None):
+        self.calls.append(page)
+        msgs = self.pages[page - 1]
+        return {"messages": msgs, "pagination": {"lastPage": len(self.pages)}}
+
+
+def _msg(ts, phone):
+    return {"messageTimestamp": ts, "chatid": f"{phone}@s.whatsapp.net"}
+
+
+class TestFetchPhonesBySince:
+    def _pages(self, order):
+        stamps = list(range(1, 1501))
+        if order == "desc":
+            stamps.reverse()
+        msgs = [_msg(ts, f"55119{ts:08d}") for ts in stamps]
+        return [msgs[i:i + 500] for i in range(0, 1500, 500)]
+
+    def test_newest_first_pages_stop_at_watermark(self):
+        svc = _TimestampedPages(self._pages("desc"))
+        phones, max_ts = fetch_phones_by_status_since(svc, "t", "f", "Sent", since_ts=1400)
+        assert svc.calls == [1]
+        assert len(phones) == 100
+        assert max_ts == 1500
+
+    def test_unknown_order_reads_every_page(self):
+        svc = _TimestampedPages(self._pages("asc"))
+        phones, max_ts = fetch_phones_by_status_since(svc, "t", "f", "Sent", since_ts=1400)
+        assert svc.calls == [1, 2, 3]
+        assert len(phones) == 100
+        assert max_ts == 1500
+
+    def test_without_watermark_reads_everything(self):
+        svc = _TimestampedPages(self._pages("desc"))
+        phones, max_ts = fetch_phones_by_status_since(svc, "t", "f", "Sent")
+        assert svc.calls == [1, 2, 3]
+        assert len(phones) == 1500
+        assert max_ts == 1500
@@ -0,0 +1,113 @@
+"""Uazapi: cliente asyncio em leque (limites global / por token) e prefetch de status."""
+
+import threading
+import time
+
+import pytest
+
+from services.uazapi_async import run_uazapi_batch
+import utils.uazapi_support_notify as notify
+
+
+class _SlowService:
+    """Fake de ``UazapiService``: cada chamada dorme ``delay`` e regista a concorrência."""
+
+    def __init__(self, delay=0.1, fail_tokens=()):
+        self.delay = delay
+        self.fail_tokens = set(fail_tokens)
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.peak = {}
+        self.peak_total = 0
+        self.calls = []
+
+    def _run(self, method, token, result):
+        with self.lock:
+            self.calls.append((method, token))
+            self.in_flight[token] = self.in_flight.get(token, 0) + 1
+            self.peak[token] = max(self.peak.get(token, 0), self.in_flight[token])
+            self.peak_total = max(self.peak_total, sum(self.in_flight.values()))
+        try:
+            time.sleep(self.delay)
+            if token in self.fail_tokens:
+                raise RuntimeError("boom")
+            return result
+        finally:
+            with self.lock:
+                self.in_flight[token] -= 1
+
+    def get_status(self, token):
+        return self._run("get_status", token, {"instance": {"status": "connected"}, "t": token})
+
+    def list_folders(self, token, status=None, context=None):
+        return self._run("list_folders", token, [{"id": f"f-{token}", "status": status}])
+
+    def list_messages(self, token, folder_id, message_status=None, page=None, page_size=None,
+                      context=None):
+        return self._run("list_messages", token, {"folder": folder_id, "page": page})
+
+    def message_find(self, token, chatid, limit=30, offset=0, context=None):
+        return self._run("message_find", token, {"chatid": chatid, "limit": limit})
+
+
+def test_batch_runs_in_about_one_round_trip():
+    svc = _SlowService(delay=0.2)
+    calls = [("get_status", f"tok{i}", {}) for i in range(10)]
+    started = time.monotonic()
+    results = run_uazapi_batch(calls, service=svc, max_concurrency=16)
+    elapsed = time.monotonic() - started
+    assert elapsed < 0.2 * 3
+    assert [r["t"] for r in results] == [f"tok{i}" for i in range(10)]
+
+
+def test_global_and_per_token_caps():
+    svc = _SlowService(delay=0.05)
+    calls = [("list_messages", "same", {"folder_id": "f", "page": p}) for p in range(6)]
+    calls += [("get_status", f"tok{i}", {}) for i in range(6)]
+    results = run_uazapi_batch(calls, service=svc, max_concurrency=4, per_token_concurrency=2)
+    assert svc.peak["same"] <= 2
+    assert svc.peak_total <= 4
+    assert [r["page"] for r in results[:6]] == list(range(6))
+
+
+def test_exceptions_are_returned_in_place():
+    svc = _SlowService(delay=0.01, fail_tokens={"bad"})
+    results = run_uazapi_batch(
+        [
+            ("list_folders", "ok", {"status": "Active"}),
+            ("list_folders", "bad", {}),
+            ("message_find", "ok", {"chatid": "5511@s.whatsapp.net", "limit": 5}),
+        ],
+        service=svc,
+    )
+    assert results[0] == [{"id": "f-ok", "status": "Active"}]
+    assert isinstance(results[1], RuntimeError)
+    assert results[2] == {"chatid": "5511@s.whatsapp.net", "limit": 5}
+
+
+def test_unknown_method_is_rejected():
+    results = run_uazapi_batch([("send_text", "tok", {})], service=_SlowService(delay=0))
+    assert isinstance(results[0], ValueError)
+
+
+@pytest.fixture
+def clean_status_cache():
+    notify._status_cache.clear()
+    yield
+    notify._status_cache.clear()
+
+
+def test_prefetch_fills_status_cache_and_skips_fresh(clean_status_cache):
+    svc = _SlowService(delay=0.01, fail_tokens={"tok3"})
+    notify._status_cache[1] = ({"cached": True}, time.monotonic())
+    filled = notify.prefetch_instance_statuses(
+        svc, [(1, "tok1"), (2, "tok2"), (3, "tok3"), (4, "tok4"), (5, "")]
+    )
+    assert filled == 2
+    assert sorted(t for _, t in svc.calls) == ["tok2", "tok3", "tok4"]
+    assert notify._status_cache[1][0] == {"cached": True}
+    assert 3 not in notify._status_cache
+    svc.calls.clear()
+    st = notify.get_instance_status_cached(svc, 2, "tok2")
+    assert st["t"] == "tok2"
+    assert svc.calls == []
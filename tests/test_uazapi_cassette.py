@@ -0,0 +1,81 @@
+"""Uazapi: gravação sanitizada e reprodução de tráfego (cassetes) pela sessão partilhada."""
+
+import json
+import time
+
+import services.uazapi as uz
+from utils.uazapi_cassette import use_cassette
+
+_TOKEN = "secret-token-A"
+
+
+def _record(server, path):
+    """Pasta com 2 mensagens no fake; grava listfolders, 2 páginas de listmessages e o status
+    (cujo ``instance.token`` devolve o segredo no corpo)."""
+    svc = uz.UazapiService()
+    messages = [{"number": f"551199999000{i}", "type": "text", "text": "oi"} for i in range(2)]
+    folder_id = svc.create_advanced_campaign(_TOKEN, 1, 2, messages, info="cassette")["folder_id"]
+    server.faults.update({"latency_ms": 50})
+    with use_cassette(str(path), "record") as cassette:
+        folders = svc.list_folders(_TOKEN)
+        p1 = svc.list_messages(_TOKEN, folder_id, message_status="Sent", page=1, page_size=1)
+        p2 = svc.list_messages(_TOKEN, folder_id, message_status="Sent", page=2, page_size=1)
+        status = svc.get_status(_TOKEN)
+    server.faults.update({"latency_ms": 0})
+    return cassette, folder_id, folders, p1, p2, status
+
+
+def _requests_served(server):
+    return sum(server.state.requests.values())
+
+
+def test_record_is_sanitized(fake_uazapi, tmp_path):
+    path = tmp_path / "c.jsonl"
+    cassette, folder_id, folders, p1, _, status = _record(fake_uazapi, path)
+    assert cassette.stats()["recorded"] == 4
+    assert status["instance"]["token"] == _TOKEN
+    raw = path.read_text(encoding="utf-8")
+    assert _TOKEN not in raw
+    entries = [json.loads(line) for line in raw.splitlines()]
+    assert [e["path"] for e in entries] == [
+        "/sender/listfolders", "/sender/listmessages", "/sender/listmessages", "/instance/status"
+    ]
+    assert entries[1]["request"] == {
+        "folder_id": folder_id, "messageStatus": "Sent", "page": 1, "pageSize": 1
+    }
+    assert entries[1]["elapsed_ms"] >= 50
+    assert len({e["auth_fp"] for e in entries}) == 1
+
+
+def test_replay_serves_recorded_responses_without_network(fake_uazapi, tmp_path):
+    path = tmp_path / "c.jsonl"
+    _, folder_id, folders, p1, p2, _ = _record(fake_uazapi, path)
+    served = _requests_served(fake_uazapi)
+    svc = uz.UazapiService()
+    with use_cassette(str(path), "replay") as cassette:
+        started = time.monotonic()
+        # Ordem trocada: o corpo do pedido escolhe a resposta certa.
+        page2 = svc.list_messages(_TOKEN, folder_id, message_status="Sent", page=2, page_size=1)
+        page1 = svc.list_messages(_TOKEN, folder_id, message_status="Sent", page=1, page_size=1)
+        elapsed = time.monotonic() - started
+        assert page2 == p2 and page2["pagination"]["page"] == 2
+        assert page1 == p1 and page1["pagination"]["page"] == 1
+        assert svc.list_folders(_TOKEN) == folders
+        # Outro token não tem gravação → falha de transporte (None), contada como miss.
+        assert svc.list_folders("other-token") is None
+    assert _requests_served(fake_uazapi) == served
+    assert elapsed >= 0.1
+    assert cassette.stats()["served"] == 3
+    assert cassette.stats()["misses"] == 1
+    assert uz.uazapi_circuit_breaker.state("other-token") == "closed"
+
+
+def test_replay_without_timing_is_immediate(fake_uazapi, tmp_path):
+    path = tmp_path / "c.jsonl"
+    _, folder_id, *_ = _record(fake_uazapi, path)
+    svc = uz.UazapiService()
+    with use_cassette(str(path), "replay", replay_timing=False):
+        started = time.monotonic()
+        svc.list_messages(_TOKEN, folder_id, message_status="Sent", page=1, page_size=1)
+        svc.list_messages(_TOKEN, folder_id, message_status="Sent", page=2, page_size=1)
+        assert time.monotonic() - started < 0.05
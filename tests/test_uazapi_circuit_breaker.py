@@ -0,0 +1,129 @@
+"""Uazapi: circuit breaker por token (closed → open → half-open) sobre a sessão partilhada."""
+
+import pytest
+import requests
+
+import services.uazapi as uz
+from utils.uazapi_cassette import use_cassette
+from utils.uazapi_outbox_errors import classify_outbox_send_failure, trips_instance_circuit
+
+
+@pytest.fixture
+def service(fake_uazapi, monkeypatch):
+    monkeypatch.setattr(uz.uazapi_circuit_breaker, "failure_threshold", 3)
+    monkeypatch.setattr(uz.uazapi_circuit_breaker, "cooldown_sec", 60.0)
+    return uz.UazapiService()
+
+
+def _send_hits(server, token):
+    return server.state.hits("/send/text", token)
+
+
+def test_revoked_token_opens_circuit_and_fails_fast(service, fake_uazapi):
+    fake_uazapi.state.revoked.add("dead")
+    for _ in range(3):
+        assert service.send_text_idempotent("dead", "55", "oi", track_id="t", track_source="s") is None
+    assert uz.uazapi_circuit_breaker.state("dead") == "open"
+    assert service.send_text_idempotent("dead", "55", "oi", track_id="t", track_source="s") is None
+    assert _send_hits(fake_uazapi, "dead") == 3
+    # Outros tokens não são afetados.
+    assert service.send_text_idempotent("alive", "55", "oi", track_id="t", track_source="s")
+    assert uz.uazapi_circuit_breaker.state("alive") == "closed"
+
+
+def test_half_open_probe_closes_or_reopens(service, fake_uazapi, monkeypatch):
+    fake_uazapi.state.set_connected("tok", False)
+    for _ in range(3):
+        service.send_text_idempotent("tok", "55", "oi", track_id="t", track_source="s")
+    assert uz.uazapi_circuit_breaker.state("tok") == "open"
+
+    monkeypatch.setattr(uz.uazapi_circuit_breaker, "cooldown_sec", 0.0)
+    assert uz.uazapi_circuit_breaker.state("tok") == "half_open"
+    service.send_text_idempotent("tok", "55", "oi", track_id="t", track_source="s")
+    assert _send_hits(fake_uazapi, "tok") == 4
+    monkeypatch.setattr(uz.uazapi_circuit_breaker, "cooldown_sec", 60.0)
+    assert uz.uazapi_circuit_breaker.state("tok") == "open"
+
+    monkeypatch.setattr(uz.uazapi_circuit_breaker, "cooldown_sec", 0.0)
+    fake_uazapi.state.set_connected("tok", True)
+    assert service.send_text_idempotent("tok", "55", "oi", track_id="t", track_source="s")
+    assert uz.uazapi_circuit_breaker.state("tok") == "closed"
+
+
+def test_half_open_lets_a_single_probe_through():
+    breaker = uz.TokenCircuitBreaker(failure_threshold=1, cooldown_sec=0.0)
+    breaker.record_failure("tok")
+    assert breaker.allow("tok") is True
+    assert breaker.allow("tok") is False
+    breaker.record_success("tok")
+    assert breaker.allow("tok") is True
+
+
+def test_half_open_probe_without_verdict_is_released(service, fake_uazapi, monkeypatch, tmp_path):
+    fake_uazapi.state.set_connected("tok", False)
+    for _ in range(3):
+        service.send_text_idempotent("tok", "55", "oi", track_id="t", track_source="s")
+    monkeypatch.setattr(uz.uazapi_circuit_breaker, "cooldown_sec", 0.0)
+    fake_uazapi.state.set_connected("tok", True)
+
+    # Prova em half-open que sai por CassetteMissError: nem sucesso nem falha registados.
+    cassette = tmp_path / "empty.jsonl"
+    cassette.write_text("")
+    with use_cassette(str(cassette), "replay"):
+        service.send_text_idempotent("tok", "55", "oi", track_id="t", track_source="s")
+    assert uz.uazapi_circuit_breaker.state("tok") == "half_open"
+
+    assert service.send_text_idempotent("tok", "55", "oi", track_id="t", track_source="s")
+    assert uz.uazapi_circuit_breaker.state("tok") == "closed"
+    assert _send_hits(fake_uazapi, "tok") == 4
+
+
+def test_non_instance_errors_do_not_open(service, fake_uazapi):
+    # Corpo sem ``text`` obrigatório: 400 de validação, não de sessão/token.
+    for _ in range(5):
+        service.send_text_idempotent("tok", "55", "", track_id="t", track_source="s")
+    assert uz.uazapi_circuit_breaker.state("tok") == "closed"
+    assert _send_hits(fake_uazapi, "tok") == 5
+
+
+def test_non_instance_errors_do_not_reset_failure_streak(service, fake_uazapi):
+    # 400 de validação entre falhas de sessão: não zera o contador, a 3.ª falha abre.
+    fake_uazapi.state.set_connected("tok", False)
+    for _ in range(2):
+        service.send_text_idempotent("tok", "55", "oi", track_id="t", track_source="s")
+    service.send_text_idempotent("tok", "55", "", track_id="t", track_source="s")
+    assert uz.uazapi_circuit_breaker.state("tok") == "closed"
+    service.send_text_idempotent("tok", "55", "oi", track_id="t", track_source="s")
+    assert uz.uazapi_circuit_breaker.state("tok") == "open"
+
+
+def test_injected_gateway_errors_do_not_open(service, fake_uazapi):
+    # 500/504 genéricos do gateway não provam instância morta: o circuito fica fechado.
+    fake_uazapi.faults.update({"gateway_timeout_rate": 0.5, "error_rate": 0.5})
+    for _ in range(4):
+        service.send_text_idempotent("tok", "55", "oi", track_id="t", track_source="s")
+    assert uz.uazapi_circuit_breaker.state("tok") == "closed"
+    assert _send_hits(fake_uazapi, "tok") == 4
+
+
+def test_instance_status_is_exempt(service, fake_uazapi):
+    fake_uazapi.state.revoked.add("dead")
+    for _ in range(4):
+        service.get_status("dead")
+    assert uz.uazapi_circuit_breaker.state("dead") == "closed"
+    for _ in range(3):
+        service.send_text_idempotent("dead", "55", "oi", track_id="t", track_source="s")
+    assert uz.uazapi_circuit_breaker.state("dead") == "open"
+    service.get_status("dead")
+    assert fake_uazapi.state.hits("/instance/status", "dead") == 5
+
+
+def test_trips_instance_circuit_taxonomy():
+    assert trips_instance_circuit(401, "Invalid token")
+    assert trips_instance_circuit(500, '{"error": "No session"}')
+    assert trips_instance_circuit(None, None, requests.exceptions.ReadTimeout)
+    assert trips_instance_circuit(None, None, requests.exceptions.ConnectionError)
+    assert not trips_instance_circuit(400, '{"error": "invalid number"}')
+    assert not trips_instance_circuit(503, "unavailable")
+    assert not trips_instance_circuit(200, None)
+    assert classify_outbox_send_failure(None, "uazapi_circuit_open", None) == "instance_unreachable"
@@ -0,0 +1,36 @@
+"""Uazapi: sessão HTTP partilhada (keep-alive), retries só em GET e métricas de reutilização."""
+
+import services.uazapi as uz
+
+
+def test_service_instances_share_one_session():
+    assert uz.UazapiService()._http is uz.UazapiService()._http
+    assert uz.UazapiService()._http is uz.shared_http_session()
+
+
+def test_retries_only_for_idempotent_methods():
+    adapter = uz.shared_http_session().get_adapter("https://uazapi.example")
+    retry = adapter.max_retries
+    assert "GET" in retry.allowed_methods
+    assert "POST" not in retry.allowed_methods
+    assert adapter._pool_maxsize == uz._HTTP_POOL_MAXSIZE
+
+
+def test_keep_alive_reuses_connection_and_is_metered(fake_uazapi):
+    before = uz.http_connection_stats()
+    session = uz.shared_http_session()
+    headers = {"token": "tok"}
+    for i in range(5):
+        resp = session.post(
+            f"{fake_uazapi.url}/send/text",
+            json={"number": f"551199999000{i}", "text": "oi"},
+            headers=headers,
+            timeout=5,
+        )
+        assert resp.status_code == 200
+    resp = session.get(f"{fake_uazapi.url}/instance/status", headers=headers, timeout=5)
+    assert resp.status_code == 200
+    after = uz.http_connection_stats()
+    assert after["requests"] - before["requests"] == 6
+    assert after["connections_opened"] - before["connections_opened"] == 1
+    assert after["reuse_ratio"] is not None
@@ -0,0 +1,92 @@
+"""Uazapi: cache de list_folders por token (TTL, coalescência e invalidação)."""
+
+import threading
+import time
+
+import services.uazapi as uz
+
+
+class _FoldersService:
+    base_url = "http://uazapi.test"
+
+    def __init__(self, delay=0.0, result=None):
+        self.delay = delay
+        self.result = result
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def list_folders(self, token, context=None, status=None):
+        with self.lock:
+            self.calls.append((token, status))
+        time.sleep(self.delay)
+        if self.result is not None:
+            return self.result
+        return [{"id": f"f-{token}-{len(self.calls)}"}]
+
+
+def test_cache_hit_within_ttl_per_token():
+    svc = _FoldersService()
+    first = uz.list_folders_cached(svc, "t1")
+    assert uz.list_folders_cached(svc, "t1") == first
+    uz.list_folders_cached(svc, "t2")
+    uz.list_folders_cached(svc, "t1", status="Active")
+    assert svc.calls == [("t1", None), ("t2", None), ("t1", "Active")]
+
+
+def test_concurrent_callers_share_one_request():
+    svc = _FoldersService(delay=0.1)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(uz.list_folders_cached(svc, "tok")))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(svc.calls) == 1
+    assert len(results) == 8 and all(r == results[0] for r in results)
+
+
+def test_failure_is_not_cached():
+    svc = _FoldersService()
+    svc.list_folders = lambda token, context=None: svc.calls.append(token)  # devolve None
+    assert uz.list_folders_cached(svc, "tok") is None
+    assert uz.list_folders_cached(svc, "tok") is None
+    assert svc.calls == ["tok", "tok"]
+
+
+def test_create_and_edit_campaign_invalidate_token(monkeypatch):
+    class _Resp:
+        status_code = 200
+        text = "{}"
+
+        def json(self):
+            return {"folder_id": "new"}
+
+        def raise_for_status(self):
+            pass
+
+    class _Session:
+        def post(self, *a, **kw):
+            return _Resp()
+
+    monkeypatch.setattr(uz, "shared_http_session", lambda: _Session())
+    service = uz.UazapiService()
+    calls = []
+    monkeypatch.setattr(
+        service, "list_folders", lambda token, context=None: calls.append(token) or [{"id": "x"}]
+    )
+    service.list_folders_cached("tok")
+    service.list_folders_cached("other")
+    service.list_folders_cached("tok")
+    assert calls == ["tok", "other"]
+
+    service.create_advanced_campaign("tok", 1, 2, [{"number": "55", "type": "text", "text": "oi"}])
+    service.list_folders_cached("tok")
+    service.list_folders_cached("other")
+    assert calls == ["tok", "other", "tok"]
+
+    service.edit_campaign("tok", "new", "stop")
+    service.list_folders_cached("tok")
+    assert calls == ["tok", "other", "tok", "tok"]
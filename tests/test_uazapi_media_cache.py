@@ -0,0 +1,111 @@
+"""Uazapi: cache LRU de mídia base64 e link público assinado (reference-by-URL)."""
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+import services.uazapi as uz
+from utils.media_public_url import resolve_media_token, sign_media_token
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache(monkeypatch):
+    monkeypatch.delenv("UAZAPI_MEDIA_PUBLIC_BASE_URL", raising=False)
+    uz._media_cache.clear()
+    monkeypatch.setattr(uz, "_media_cache_bytes", 0)
+    yield
+    uz._media_cache.clear()
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_media_encoded_once_until_file_changes(tmp_path):
+    f = _write(tmp_path / "a.png", b"x" * 100)
+    real_b64 = uz.base64.b64encode
+    with patch.object(uz.base64, "b64encode", side_effect=real_b64) as enc:
+        first = uz._resolve_media_file_value(f)
+        assert uz._resolve_media_file_value(f) == first
+        assert enc.call_count == 1
+        assert first.startswith("data:image/png;base64,")
+
+        st = os.stat(f)
+        _write(tmp_path / "a.png", b"y" * 120)
+        os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+        assert uz._resolve_media_file_value(f) != first
+        assert enc.call_count == 2
+    # versão antiga do mesmo arquivo sai do cache
+    assert len(uz._media_cache) == 1
+
+
+def test_media_cache_evicts_lru_by_bytes(tmp_path, monkeypatch):
+    files = [_write(tmp_path / f"{i}.jpg", bytes([i]) * 300) for i in range(3)]
+    one = len(uz._resolve_media_file_value(files[0]))
+    monkeypatch.setattr(uz, "_MEDIA_CACHE_MAX_BYTES", one * 2)
+    uz._resolve_media_file_value(files[1])
+    uz._resolve_media_file_value(files[0])  # 0 fica mais recente que 1
+    uz._resolve_media_file_value(files[2])
+    cached_paths = {k[0] for k in uz._media_cache}
+    assert cached_paths == {os.path.abspath(files[0]), os.path.abspath(files[2])}
+    assert uz._media_cache_bytes <= one * 2
+
+
+def test_public_url_mode_skips_encoding(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path))
+    monkeypatch.setenv("UAZAPI_MEDIA_PUBLIC_BASE_URL", "https://app.example.com/")
+    f = _write(tmp_path / "m.mp4", b"video")
+    url = uz._resolve_media_file_value(f)
+    assert url.startswith("https://app.example.com/media/public/")
+    assert not uz._media_cache
+    token = url.rsplit("/", 1)[1]
+    assert resolve_media_token(token) == os.path.abspath(f)
+    assert resolve_media_token(token[:-2] + "xx") is None
+
+
+def test_signed_token_rejects_outside_storage_and_changed_file(tmp_path, monkeypatch):
+    storage = tmp_path / "storage"
+    storage.mkdir()
+    monkeypatch.setenv("STORAGE_DIR", str(storage))
+    outside = _write(tmp_path / "secret.png", b"s")
+    assert sign_media_token(outside, 1, 1) is None
+
+    f = _write(storage / "a.png", b"abc")
+    st = os.stat(f)
+    token = sign_media_token(f, st.st_mtime_ns, st.st_size)
+    assert resolve_media_token(token) == os.path.abspath(f)
+    _write(storage / "a.png", b"abcd")
+    assert resolve_media_token(token) is None
+
+
+def test_large_media_streams_base64_json_body(tmp_path, monkeypatch):
+    monkeypatch.setattr(uz, "_MEDIA_STREAM_MIN_BYTES", 1000)
+    monkeypatch.setattr(uz, "_MEDIA_STREAM_CHUNK", 300)
+    raw = bytes(range(256)) * 20 + b"tail"
+    f = _write(tmp_path / "v.mp4", raw)
+    payload = {"number": "5511999999999", "type": "video", "text": "olá \"x\"", "track_id": "t1"}
+
+    kw = uz._media_request_kwargs(payload, f)
+    body = kw["data"]
+    chunks = []
+    while True:
+        part = body.read(512)
+        if not part:
+            break
+        assert len(part) <= 512
+        chunks.append(part)
+    data = b"".join(chunks)
+    assert len(data) == len(body)
+    expected = dict(payload, file="data:video/mp4;base64," + uz.base64.b64encode(raw).decode())
+    assert uz.json.loads(data) == expected
+    assert not uz._media_cache
+
+
+def test_small_media_keeps_json_payload(tmp_path, monkeypatch):
+    monkeypatch.setattr(uz, "_MEDIA_STREAM_MIN_BYTES", 1000)
+    f = _write(tmp_path / "i.png", b"p" * 10)
+    kw = uz._media_request_kwargs({"number": "1"}, f)
+    assert kw["json"]["file"].startswith("data:image/png;base64,")
+    assert uz._media_request_kwargs({"number": "1"}, str(tmp_path / "missing.png")) is None
@@ -2,15 +2,40 @@
 Auditoria append-only de disparos Uazapi (outbox) por campanha — JSON Lines.
 
 Um arquivo ``dispatch_audit.jsonl`` por campanha sob ``storage/{user_id}/campaigns/{campaign_id}/``.
+
+Segmentos: ao passar de ``DISPATCH_AUDIT_SEGMENT_MAX_BYTES`` o arquivo ativo é renomeado para
+``dispatch_audit.{seq:06d}.jsonl`` e um novo começa. Cada segmento tem um índice lateral
+``<segmento>.idx`` com registos binários de tamanho fixo (offset, tamanho, ``lead_id``,
+``outbox_id``, código de ``outcome``): ``read_dispatch_audit_tail`` percorre os índices de trás
+para a frente e só lê do JSONL os bytes que devolve. O índice é derivado — a parte do
+segmento ainda não indexada (arquivo legado, crash entre os dois writes) é lida com um
+leitor reverso por blocos e indexada no próximo append.
+
+Modo de escrita (``DISPATCH_AUDIT_WRITE_MODE``):
+
+- ``durable`` (default): cada evento faz lock + write + ``fsync`` no próprio append.
+- ``buffered``: eventos ficam em memória e são gravados em lote (um ``fsync`` por arquivo e
+  lote) ao atingir ``DISPATCH_AUDIT_FLUSH_MAX_EVENTS`` ou a cada
+  ``DISPATCH_AUDIT_FLUSH_INTERVAL_SECONDS``; ``flush_dispatch_audit`` / ``atexit`` drenam o
+  buffer no encerramento.
 """
 
 from __future__ import annotations
 
+import atexit
 import json
+import logging
 import os
+import re
+import struct
 import sys
+import threading
+import time
 from datetime import datetime, timezone
-from typing import Any, Mapping
+from contextlib import contextmanager
+from typing import Any, Iterator, Mapping, Optional
+
+logger = logging.getLogger(__name__)
 
 # Sanitização de segredos (UAZAPI / HTTP); telefone pode permanecer (política interna).
 _SENSITIVE_KEY_FRAGMENTS = (
@@ -35,6 +60,35 @@ def _max_response_chars() -> int:
         return 4000
 
 
+def _segment_max_bytes() -> int:
+    raw = (os.environ.get("DISPATCH_AUDIT_SEGMENT_MAX_BYTES") or str(64 * 1024 * 1024)).strip()
+    try:
+        return max(4096, int(raw))
+    except ValueError:
+        return 64 * 1024 * 1024
+
+
+def _write_mode() -> str:
+    raw = (os.environ.get("DISPATCH_AUDIT_WRITE_MODE") or "durable").strip().lower()
+    return "buffered" if raw == "buffered" else "durable"
+
+
+def _flush_max_events() -> int:
+    raw = (os.environ.get("DISPATCH_AUDIT_FLUSH_MAX_EVENTS") or "200").strip()
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        return 200
+
+
+def _flush_interval_seconds() -> float:
+    raw = (os.environ.get("DISPATCH_AUDIT_FLUSH_INTERVAL_SECONDS") or "2").strip()
+    try:
+        return max(0.05, float(raw))
+    except ValueError:
+        return 2.0
+
+
 def _is_sensitive_key(key: str) -> bool:
     k = str(key).lower().replace("-", "_")
     return any(fragment in k for fragment in _SENSITIVE_KEY_FRAGMENTS)
@@ -94,38 +148,355 @@ def dispatch_audit_jsonl_path(
     return os.path.join(base, "dispatch_audit.jsonl")
 
 
-def _append_line_with_lock(path: str, line_utf8: bytes) -> None:
-    parent = os.path.dirname(path)
-    if parent:
-        os.makedirs(parent, exist_ok=True)
+_SEGMENT_NAME_RE = re.compile(r"^dispatch_audit\.(\d+)\.jsonl$")
+# offset (u64), tamanho da linha com ``\n`` (u32), lead_id, outbox_id (i64, -1 = ausente), outcome
+_INDEX_RECORD = struct.Struct("<QIqqB")
+_OUTCOME_CODES = {
+    "sent": 1,
+    "retry_scheduled": 2,
+    "failed_terminal": 3,
+    "failed": 4,
+    "persist_failed": 5,
+}
+_REVERSE_READ_BLOCK = 64 * 1024
+_INDEX_READ_RECORDS = 4096
+
+# (linha JSONL em bytes, lead_id, outbox_id, código de outcome)
+_AuditRecord = tuple[bytes, int, int, int]
+
 
+def _index_path(segment_path: str) -> str:
+    return segment_path + ".idx"
+
+
+def _int_or_missing(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def _record_meta(row: Mapping[str, Any]) -> tuple[int, int, int]:
+    return (
+        _int_or_missing(row.get("lead_id")),
+        _int_or_missing(row.get("outbox_id")),
+        _OUTCOME_CODES.get(str(row.get("outcome") or ""), 0),
+    )
+
+
+def _record_from_line(line: bytes) -> _AuditRecord:
+    try:
+        row = json.loads(line)
+    except (ValueError, UnicodeDecodeError):
+        row = None
+    if not isinstance(row, Mapping):
+        return (line, -1, -1, 0)
+    return (line, *_record_meta(row))
+
+
+@contextmanager
+def _campaign_audit_lock(segment_path: str) -> Iterator[None]:
+    """Lock exclusivo por campanha (arquivo ``.lock`` à parte: sobrevive à rotação)."""
+    lock_path = os.path.join(os.path.dirname(segment_path), "dispatch_audit.lock")
     if sys.platform == "win32":
         import msvcrt
 
-        with open(path, "ab") as f:
+        with open(lock_path, "ab") as f:
             f.seek(0)
             msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
             try:
-                f.seek(0, os.SEEK_END)
-                f.write(line_utf8)
-                f.flush()
-                os.fsync(f.fileno())
+                yield
             finally:
                 f.seek(0)
                 msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
     else:
         import fcntl
 
-        with open(path, "ab") as f:
+        with open(lock_path, "ab") as f:
             fcntl.flock(f.fileno(), fcntl.LOCK_EX)
             try:
-                f.write(line_utf8)
-                f.flush()
-                os.fsync(f.fileno())
+                yield
             finally:
                 fcntl.flock(f.fileno(), fcntl.LOCK_UN)
 
 
+def _indexed_end(idx_path: str) -> int:
+    """Offset no segmento logo após a última linha indexada (0 sem índice)."""
+    try:
+        size = os.path.getsize(idx_path)
+    except OSError:
+        return 0
+    n = size // _INDEX_RECORD.size
+    if n == 0:
+        return 0
+    with open(idx_path, "rb") as f:
+        f.seek((n - 1) * _INDEX_RECORD.size)
+        offset, length, *_ = _INDEX_RECORD.unpack(f.read(_INDEX_RECORD.size))
+    return offset + length
+
+
+def _iter_lines_forward(f, start: int, end: int) -> Iterator[tuple[int, bytes]]:
+    f.seek(start)
+    offset = start
+    while offset < end:
+        line = f.readline()
+        if not line:
+            break
+        if not line.endswith(b"\n"):
+            # linha incompleta (write em curso ou crash): fica para o próximo catch-up
+            break
+        yield offset, line
+        offset += len(line)
+
+
+def _iter_lines_reverse(f, start: int, end: int) -> Iterator[tuple[int, bytes]]:
+    """
+    Linhas completas de ``[start, end)`` do fim para o início, lendo blocos de trás para a
+    frente (memória limitada a um bloco + a linha corrente). Linha final sem ``\n`` é ignorada.
+    """
+    pos = end
+    line_stop = end
+    buf = b""
+    while pos > start:
+        step = min(_REVERSE_READ_BLOCK, pos - start)
+        pos -= step
+        f.seek(pos)
+        buf = f.read(step) + buf
+        while True:
+            nl = buf.rfind(b"\n", 0, max(0, line_stop - pos - 1))
+            if nl < 0:
+                break
+            line = buf[nl + 1 : line_stop - pos]
+            if line.endswith(b"\n"):
+                yield pos + nl + 1, line
+            line_stop = pos + nl + 1
+        buf = buf[: line_stop - pos]
+    if line_stop > start and buf.endswith(b"\n"):
+        yield start, buf
+
+
+def _index_catch_up(segment_path: str) -> None:
+    """Indexa a parte final do segmento que ainda não tem registos no ``.idx``."""
+    idx_path = _index_path(segment_path)
+    try:
+        size = os.path.getsize(segment_path)
+    except OSError:
+        return
+    start = _indexed_end(idx_path)
+    if start >= size:
+        return
+    out = bytearray()
+    with open(segment_path, "rb") as f:
+        for offset, line in _iter_lines_forward(f, start, size):
+            out += _INDEX_RECORD.pack(offset, len(line), *_record_from_line(line)[1:])
+    if out:
+        with open(idx_path, "ab") as fi:
+            fi.write(out)
+
+
+def _rotate_segment(segment_path: str) -> None:
+    base = os.path.dirname(segment_path)
+    seqs = [
+        int(m.group(1))
+        for m in (_SEGMENT_NAME_RE.match(n) for n in os.listdir(base))
+        if m
+    ]
+    target = os.path.join(base, f"dispatch_audit.{max(seqs, default=0) + 1:06d}.jsonl")
+    os.replace(segment_path, target)
+    if os.path.exists(_index_path(segment_path)):
+        os.replace(_index_path(segment_path), _index_path(target))
+
+
+def _append_records_with_lock(path: str, records: list[_AuditRecord]) -> None:
+    """
+    Append de um lote: rotação se o segmento ativo passar do limite, um write + ``fsync`` no
+    JSONL e os registos correspondentes no ``.idx`` (sem fsync — derivado, refeito no catch-up).
+    """
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    data = b"".join(r[0] for r in records)
+
+    with _campaign_audit_lock(path):
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size and size + len(data) > _segment_max_bytes():
+            _index_catch_up(path)
+            _rotate_segment(path)
+        else:
+            _index_catch_up(path)
+
+        with open(path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        idx = bytearray()
+        for line, lead_id, outbox_id, outcome_code in records:
+            idx += _INDEX_RECORD.pack(offset, len(line), lead_id, outbox_id, outcome_code)
+            offset += len(line)
+        with open(_index_path(path), "ab") as fi:
+            fi.write(idx)
+
+
+def dispatch_audit_segment_paths(user_id: int, campaign_id: int) -> list[str]:
+    """Segmentos existentes da campanha, do mais antigo ao ativo (``dispatch_audit.jsonl``)."""
+    active = dispatch_audit_jsonl_path(user_id, campaign_id, ensure_parent=False)
+    base = os.path.dirname(active)
+    try:
+        names = os.listdir(base)
+    except OSError:
+        return []
+    rotated = sorted(
+        (int(m.group(1)), m.group(0))
+        for m in (_SEGMENT_NAME_RE.match(n) for n in names)
+        if m
+    )
+    paths = [os.path.join(base, n) for _, n in rotated]
+    if os.path.isfile(active):
+        paths.append(active)
+    return paths
+
+
+def _iter_segment_records_reverse(segment_path: str) -> Iterator[tuple[int, int, int, int, int]]:
+    """(offset, tamanho, lead_id, outbox_id, outcome) do fim para o início do segmento."""
+    size = os.path.getsize(segment_path)
+    idx_path = _index_path(segment_path)
+    indexed_end = min(_indexed_end(idx_path), size)
+
+    if indexed_end < size:
+        with open(segment_path, "rb") as f:
+            for offset, line in _iter_lines_reverse(f, indexed_end, size):
+                if not line.rstrip(b"\n"):
+                    continue
+                yield (offset, len(line), *_record_from_line(line)[1:])
+
+    if indexed_end == 0:
+        return
+    rec = _INDEX_RECORD.size
+    with open(idx_path, "rb") as fi:
+        n = os.path.getsize(idx_path) // rec
+        while n > 0:
+            take = min(_INDEX_READ_RECORDS, n)
+            n -= take
+            fi.seek(n * rec)
+            chunk = fi.read(take * rec)
+            for i in range(take - 1, -1, -1):
+                fields = _INDEX_RECORD.unpack_from(chunk, i * rec)
+                if fields[0] + fields[1] <= indexed_end:
+                    yield fields
+
+
+def read_dispatch_audit_tail(
+    user_id: int,
+    campaign_id: int,
+    limit: int,
+    *,
+    lead_id: Optional[int] = None,
+    outbox_id: Optional[int] = None,
+    outcome: Optional[str] = None,
+) -> tuple[list[bytes], bool]:
+    """
+    Últimas ``limit`` linhas (ordem cronológica) que batem com os filtros, lendo segmentos do
+    mais novo ao mais antigo pelos índices. Devolve ``(linhas, truncated)`` — ``truncated``
+    quando existem mais linhas elegíveis antes da primeira devolvida.
+    """
+    outcome_code = _OUTCOME_CODES.get(outcome, 0) if outcome else None
+    # outcome fora do mapa fica com código 0 no índice: confirma no JSON da linha
+    verify_outcome = bool(outcome) and outcome_code == 0
+    picked: list[bytes] = []
+    limit = max(1, int(limit))
+    for segment_path in reversed(dispatch_audit_segment_paths(user_id, campaign_id)):
+        try:
+            records = _iter_segment_records_reverse(segment_path)
+            with open(segment_path, "rb") as f:
+                for offset, length, r_lead, r_outbox, r_outcome in records:
+                    if lead_id is not None and r_lead != int(lead_id):
+                        continue
+                    if outbox_id is not None and r_outbox != int(outbox_id):
+                        continue
+                    if outcome_code is not None and r_outcome != outcome_code:
+                        continue
+                    f.seek(offset)
+                    line = f.read(length)
+                    if verify_outcome:
+                        try:
+                            if json.loads(line).get("outcome") != outcome:
+                                continue
+                        except (ValueError, AttributeError):
+                            continue
+                    if len(picked) == limit:
+                        picked.reverse()
+                        return picked, True
+                    picked.append(line)
+        except FileNotFoundError:
+            # segmento rodado entre o listdir e a leitura
+            continue
+    picked.reverse()
+    return picked, False
+
+
+class _BufferedAuditWriter:
+    """
+    Group commit dos eventos de auditoria: acumula linhas por arquivo e grava cada lote com
+    um único lock + write + ``fsync`` (``_append_records_with_lock``). Thread daemon faz o flush
+    por tempo; o flush por tamanho corre na thread que fez o append.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: dict[str, list[_AuditRecord]] = {}
+        self._count = 0
+        self._flusher: threading.Thread | None = None
+
+    def append(self, path: str, record: _AuditRecord) -> None:
+        with self._lock:
+            self._pending.setdefault(path, []).append(record)
+            self._count += 1
+            full = self._count >= _flush_max_events()
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(
+                    target=self._run, name="dispatch-audit-flush", daemon=True
+                )
+                self._flusher.start()
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Grava tudo o que está em buffer; devolve o número de eventos gravados."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._count = 0
+            written = 0
+            for path, records in batch.items():
+                try:
+                    _append_records_with_lock(path, records)
+                    written += len(records)
+                except OSError:
+                    logger.exception(
+                        "dispatch audit flush failed path=%s events=%s", path, len(records)
+                    )
+            return written
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(_flush_interval_seconds())
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("dispatch audit background flush failed")
+
+
+_buffered_writer = _BufferedAuditWriter()
+atexit.register(_buffered_writer.flush)
+
+
+def flush_dispatch_audit() -> int:
+    """Drena o buffer do modo ``buffered`` (no-op em ``durable``); chamar no shutdown."""
+    return _buffered_writer.flush()
+
+
 def _normalize_event_row(event_dict: Mapping[str, Any]) -> dict[str, Any]:
     row = dict(event_dict)
     row.setdefault("ts", datetime.now(timezone.utc).isoformat())
@@ -147,7 +518,8 @@ def append_dispatch_event(
     event_dict: Mapping[str, Any],
 ) -> None:
     """
-    Append uma linha JSONL com sanitização de segredos, truncagem de resposta e lock leve no arquivo.
+    Append uma linha JSONL com sanitização de segredos, truncagem de resposta e lock leve no arquivo
+    (ou no buffer de group commit, em ``DISPATCH_AUDIT_WRITE_MODE=buffered``).
 
     Campos esperados pelos chamadores incluem ``attempt_no``, ``outbox_id``, ``request`` (UAZAPI),
     ``response`` (dict ou string), e tipo derivado em ``request.kind`` → ``message_type`` (text|media).
@@ -155,7 +527,11 @@ def append_dispatch_event(
     path = dispatch_audit_jsonl_path(user_id, campaign_id)
     row = _normalize_event_row(event_dict)
     line = json.dumps(row, ensure_ascii=False, default=str) + "\n"
-    _append_line_with_lock(path, line.encode("utf-8"))
+    record: _AuditRecord = (line.encode("utf-8"), *_record_meta(row))
+    if _write_mode() == "buffered":
+        _buffered_writer.append(path, record)
+    else:
+        _append_records_with_lock(path, [record])
 
 
 def append_dispatch_audit_event(
@@ -29,6 +29,10 @@ def _env_bool(name: str, default: bool = False) -> bool:
 # só para rollback de emergência).
 USE_MESSAGE_OUTBOX = _env_bool("USE_MESSAGE_OUTBOX", True)
 
+# Processo dedicado ``python worker_message_outbox.py`` (LISTEN/NOTIFY): quando ligado, o
+# ``worker_cadence`` deixa de despachar a outbox no seu loop (continua a agendar lotes initial).
+OUTBOX_DEDICATED_WORKER = _env_bool("UAZAPI_OUTBOX_DEDICATED_WORKER", False)
+
 # Criação de campanha: com ``USE_MESSAGE_OUTBOX`` activo, todos os utilizadores entram na fila
 # ``campaign_message_outbox`` (envio unitário). APIs admin de polling/pausa outbox (fase 1)
 # continuam restritas a ``SUPER_ADMIN_EMAILS``. ``campaigns.created_by_admin_id`` é só auditoria
@@ -0,0 +1,74 @@
+"""
+Escritas de estado por lead em lote: ``UPDATE campaign_leads … FROM (VALUES …)``.
+
+Para loops que davam um ``UPDATE … WHERE id = %s`` por lead (atribuição de ``send_batch`` na
+criação da campanha, buffer de segurança da cadência). Cada lead traz o seu próprio conjunto de
+colunas/valores; leads com as mesmas colunas vão na mesma instrução (``execute_values``, uma ida
+à BD por página). Só colunas em ``LEAD_COLUMN_TYPES`` são aceites — o nome entra no SQL.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterable, Mapping
+
+from psycopg2.extras import execute_values
+
+# Coluna -> tipo SQL do cast no VALUES (sem cast, NULL / datas chegam como text e falham).
+LEAD_COLUMN_TYPES = {
+    "send_batch": "integer",
+    "current_step": "integer",
+    "status": "text",
+    "cadence_status": "text",
+    "snooze_until": "timestamp",
+    "log": "text",
+    "chatwoot_conversation_id": "integer",
+}
+
+# Linhas por página do ``execute_values``.
+LEAD_BULK_UPDATE_PAGE_SIZE = 1000
+
+
+def bulk_update_campaign_leads(
+    cur,
+    updates: Iterable[tuple[int, Mapping[str, Any]]],
+    *,
+    page_size: int = LEAD_BULK_UPDATE_PAGE_SIZE,
+) -> int:
+    """
+    Aplica ``(lead_id, {coluna: valor})`` em lote. Várias entradas para o mesmo lead fundem-se
+    (a última ganha por coluna). Devolve o número de linhas atualizadas.
+    """
+    merged: dict[int, dict[str, Any]] = {}
+    for lead_id, fields in updates:
+        if not fields:
+            continue
+        unknown = set(fields) - set(LEAD_COLUMN_TYPES)
+        if unknown:
+            raise ValueError(f"coluna(s) de campaign_leads não suportada(s): {sorted(unknown)}")
+        merged.setdefault(int(lead_id), {}).update(fields)
+
+    groups: dict[tuple[str, ...], list[tuple]] = {}
+    for lead_id, fields in merged.items():
+        cols = tuple(sorted(fields))
+        groups.setdefault(cols, []).append((lead_id,) + tuple(fields[c] for c in cols))
+
+    updated = 0
+    for cols, rows in groups.items():
+        set_sql = ", ".join(f"{c} = v.{c}" for c in cols)
+        template = "(%s::integer" + "".join(f", %s::{LEAD_COLUMN_TYPES[c]}" for c in cols) + ")"
+        returned = execute_values(
+            cur,
+            f"""
+            UPDATE campaign_leads AS cl
+            SET {set_sql}
+            FROM (VALUES %s) AS v (id, {", ".join(cols)})
+            WHERE cl.id = v.id
+            RETURNING cl.id
+            """,
+            rows,
+            template=template,
+            page_size=page_size,
+            fetch=True,
+        )
+        updated += len(returned or [])
+    return updated
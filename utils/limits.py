@@ -274,7 +274,7 @@ def get_sent_today_campaign_initial_count(campaign_id: int) -> int:
         lead_count = int(row["count"] if row else 0)
         with conn.cursor() as cur:
             cur.execute(
-                "SELECT 1 FROM campaign_message_outbox WHERE campaign_id = %s LIMIT 1",
+                "SELECT 1 FROM campaign_message_outbox_all WHERE campaign_id = %s LIMIT 1",
                 (campaign_id,),
             )
             if not cur.fetchone():
@@ -343,6 +343,7 @@ def initial_chunk_quota_snapshot(campaign_id: int) -> dict:
         policy=INITIAL_CHUNK_DAILY_QUOTA_POLICY,
     )
     return {
+        "user_id": owner_id,
         "policy": pol,
         "plan_limit": plan_limit,
         "campaign_cap": campaign_cap,
@@ -0,0 +1,97 @@
+"""
+URL pública assinada para mídia de campanha (upload-once / reference-by-URL na Uazapi).
+
+Com ``UAZAPI_MEDIA_PUBLIC_BASE_URL`` definido (URL externa da app web, ex.
+``https://app.exemplo.com``), o envio de mídia manda à Uazapi um link para
+``/media/public/<token>`` em vez do arquivo em base64: a Uazapi baixa o arquivo uma vez por
+envio e o worker não lê nem codifica nada. O token é HMAC-SHA256 (``FLASK_SECRET_KEY``) sobre
+caminho + ``mtime_ns`` + tamanho — trocar o arquivo gera outro link e invalida o anterior.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+from typing import Optional
+
+
+def _storage_root() -> str:
+    return os.path.abspath(os.environ.get("STORAGE_DIR", "storage"))
+
+
+def media_public_base_url() -> str:
+    return (os.environ.get("UAZAPI_MEDIA_PUBLIC_BASE_URL") or "").strip().rstrip("/")
+
+
+def _secret() -> bytes:
+    return os.environ.get("FLASK_SECRET_KEY", "dev-secret").encode("utf-8")
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def _unb64(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _storage_relpath(path: str) -> Optional[str]:
+    root = _storage_root()
+    abs_path = os.path.abspath(path)
+    if os.path.commonpath([root, abs_path]) != root:
+        return None
+    return os.path.relpath(abs_path, root)
+
+
+def sign_media_token(path: str, mtime_ns: int, size: int) -> Optional[str]:
+    """Token ``<payload>.<assinatura>``; None se ``path`` está fora de ``STORAGE_DIR``."""
+    rel = _storage_relpath(path)
+    if rel is None:
+        return None
+    payload = _b64(
+        json.dumps({"p": rel, "m": int(mtime_ns), "s": int(size)}, separators=(",", ":")).encode(
+            "utf-8"
+        )
+    )
+    sig = _b64(hmac.new(_secret(), payload.encode("ascii"), hashlib.sha256).digest())
+    return f"{payload}.{sig}"
+
+
+def media_public_url(path: str, mtime_ns: int, size: int) -> Optional[str]:
+    """URL pública do arquivo, ou None quando o modo URL está desligado / path inválido."""
+    base = media_public_base_url()
+    if not base:
+        return None
+    token = sign_media_token(path, mtime_ns, size)
+    if token is None:
+        return None
+    return f"{base}/media/public/{token}"
+
+
+def resolve_media_token(token: str) -> Optional[str]:
+    """
+    Caminho absoluto do arquivo se a assinatura confere e o arquivo ainda tem o mesmo
+    ``mtime_ns``/tamanho; None caso contrário.
+    """
+    try:
+        payload, sig = (token or "").split(".", 1)
+        expected = _b64(hmac.new(_secret(), payload.encode("ascii"), hashlib.sha256).digest())
+        if not hmac.compare_digest(sig, expected):
+            return None
+        data = json.loads(_unb64(payload))
+        rel = str(data["p"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    abs_path = os.path.abspath(os.path.join(_storage_root(), rel))
+    if _storage_relpath(abs_path) is None:
+        return None
+    try:
+        st = os.stat(abs_path)
+    except OSError:
+        return None
+    if st.st_mtime_ns != int(data.get("m", -1)) or st.st_size != int(data.get("s", -1)):
+        return None
+    return abs_path
@@ -50,6 +50,23 @@ def is_campaign_send_window(campaign: dict, now_brazil=None) -> bool:
     return sh <= h < eh
 
 
+def campaign_send_window_sql(alias: str = "c") -> str:
+    """
+    Fragmento SQL equivalente a ``is_campaign_send_window`` sobre as colunas ``send_*`` de
+    ``alias`` (hora / dia da semana de ``NOW()`` em BRT). Usado no claim da outbox para
+    filtrar a janela no Postgres em vez de trazer linhas fora dela para o Python.
+    """
+    now_br = "(NOW() AT TIME ZONE 'America/Sao_Paulo')"
+    return (
+        f"((EXTRACT(ISODOW FROM {now_br}) <> 6 OR COALESCE({alias}.send_saturday, FALSE))"
+        f" AND (EXTRACT(ISODOW FROM {now_br}) <> 7 OR COALESCE({alias}.send_sunday, FALSE))"
+        f" AND EXTRACT(HOUR FROM {now_br})"
+        f" >= COALESCE({alias}.send_hour_start, {BUSINESS_HOUR_START})"
+        f" AND EXTRACT(HOUR FROM {now_br})"
+        f" < COALESCE({alias}.send_hour_end, {BUSINESS_HOUR_END}))"
+    )
+
+
 def _as_utc_naive(dt: datetime) -> datetime:
     if dt.tzinfo is None:
         return dt
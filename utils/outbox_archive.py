@@ -0,0 +1,232 @@
+"""
+Hot/cold da fila outbox: arquivo de linhas finalizadas e compactação de tentativas.
+
+``campaign_message_outbox`` deve conter só trabalho vivo (pending/sending + finalizadas
+recentes). Linhas ``sent``/``failed`` com ``updated_at`` mais antigo que
+``UAZAPI_OUTBOX_ARCHIVE_AFTER_DAYS`` e as suas tentativas passam, no mesmo statement, para
+``campaign_message_outbox_history`` / ``campaign_send_attempts_history`` (particionadas por mês;
+as partições são criadas aqui sob demanda). Os ids são preservados, por isso os cursores do
+polling admin continuam válidos sobre as views ``*_all``.
+
+A compactação corta ``uazapi_response`` das tentativas antigas (viva e histórico) para
+``UAZAPI_OUTBOX_ATTEMPT_COMPACT_KEEP_CHARS`` caracteres.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from datetime import date
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Idade (dias) a partir da qual linhas sent/failed saem da fila viva; 0 = não arquiva.
+OUTBOX_ARCHIVE_AFTER_DAYS = int(os.environ.get("UAZAPI_OUTBOX_ARCHIVE_AFTER_DAYS", "30"))
+# Linhas outbox movidas por transação (tentativas acompanham).
+OUTBOX_ARCHIVE_BATCH_SIZE = max(1, int(os.environ.get("UAZAPI_OUTBOX_ARCHIVE_BATCH_SIZE", "5000")))
+# Idade (dias) a partir da qual ``uazapi_response`` é truncado; 0 = não compacta.
+OUTBOX_ATTEMPT_COMPACT_AFTER_DAYS = int(
+    os.environ.get("UAZAPI_OUTBOX_ATTEMPT_COMPACT_AFTER_DAYS", "7")
+)
+OUTBOX_ATTEMPT_COMPACT_KEEP_CHARS = max(
+    0, int(os.environ.get("UAZAPI_OUTBOX_ATTEMPT_COMPACT_KEEP_CHARS", "200"))
+)
+
+_HISTORY_PARENTS = ("campaign_message_outbox_history", "campaign_send_attempts_history")
+
+
+def _month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + (d.month // 12), d.month % 12 + 1, 1)
+
+
+def history_partition_name(parent: str, month: date) -> str:
+    """Ex.: ``campaign_message_outbox_history_202601``."""
+    return f"{parent}_{month.year:04d}{month.month:02d}"
+
+
+def ensure_history_partitions(conn, parent: str, months) -> list[str]:
+    """Cria (idempotente) as partições mensais de ``parent``; devolve os nomes garantidos."""
+    if parent not in _HISTORY_PARENTS:
+        raise ValueError(f"tabela de histórico desconhecida: {parent}")
+    names = []
+    with conn.cursor() as cur:
+        for m in sorted({_month_start(x) for x in months}):
+            name = history_partition_name(parent, m)
+            cur.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {name}
+                PARTITION OF {parent}
+                FOR VALUES FROM (%s) TO (%s)
+                """,
+                (m, _next_month(m)),
+            )
+            names.append(name)
+    return names
+
+
+def archive_finalized_outbox_rows(
+    conn,
+    *,
+    older_than_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+) -> int:
+    """
+    Move um lote de linhas ``sent``/``failed`` antigas (e tentativas) para o histórico.
+    Partições são garantidas numa transação curta antes do move; o move relê o estado com
+    ``FOR UPDATE SKIP LOCKED``. Devolve o número de linhas outbox arquivadas.
+    """
+    days = OUTBOX_ARCHIVE_AFTER_DAYS if older_than_days is None else int(older_than_days)
+    if days <= 0:
+        return 0
+    limit = OUTBOX_ARCHIVE_BATCH_SIZE if batch_size is None else max(1, int(batch_size))
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT id, updated_at FROM campaign_message_outbox
+            WHERE status IN ('sent', 'failed')
+              AND updated_at < NOW() - (%s * INTERVAL '1 day')
+            ORDER BY id ASC
+            LIMIT %s
+            """,
+            (days, limit),
+        )
+        candidates = cur.fetchall() or []
+        if not candidates:
+            conn.commit()
+            return 0
+        ids = [int(r[0]) for r in candidates]
+        cur.execute(
+            """
+            SELECT DISTINCT DATE_TRUNC('month', started_at)::date
+            FROM campaign_send_attempts
+            WHERE outbox_id = ANY(%s)
+            """,
+            (ids,),
+        )
+        attempt_months = [r[0] for r in (cur.fetchall() or [])]
+    ensure_history_partitions(
+        conn, "campaign_message_outbox_history", [r[1].date() for r in candidates]
+    )
+    ensure_history_partitions(conn, "campaign_send_attempts_history", attempt_months)
+    conn.commit()
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                WITH picked AS (
+                    SELECT id, campaign_id FROM campaign_message_outbox
+                    WHERE id = ANY(%(ids)s) AND status IN ('sent', 'failed')
+                    FOR UPDATE SKIP LOCKED
+                ),
+                moved_attempts AS (
+                    DELETE FROM campaign_send_attempts a
+                    USING picked p
+                    WHERE a.outbox_id = p.id
+                    RETURNING a.id, a.outbox_id, p.campaign_id, a.attempt_no, a.http_status,
+                              a.uazapi_response, a.outcome, a.latency_ms, a.started_at,
+                              a.finished_at
+                ),
+                archived_attempts AS (
+                    INSERT INTO campaign_send_attempts_history (
+                        id, outbox_id, campaign_id, attempt_no, http_status, uazapi_response,
+                        outcome, latency_ms, started_at, finished_at
+                    )
+                    SELECT id, outbox_id, campaign_id, attempt_no, http_status, uazapi_response,
+                           outcome, latency_ms, started_at, finished_at
+                    FROM moved_attempts
+                    RETURNING 1
+                ),
+                moved AS (
+                    DELETE FROM campaign_message_outbox o
+                    USING picked p
+                    WHERE o.id = p.id
+                    RETURNING o.*
+                )
+                INSERT INTO campaign_message_outbox_history (
+                    id, campaign_id, campaign_lead_id, instance_id, stage, step_priority, status,
+                    queued_at, next_run_at, idempotency_key, uazapi_track_id, payload_summary,
+                    attempt_count, created_at, updated_at, archived_at
+                )
+                SELECT id, campaign_id, campaign_lead_id, instance_id, stage, step_priority,
+                       status, queued_at, next_run_at, idempotency_key, uazapi_track_id,
+                       payload_summary, attempt_count, created_at, updated_at, NOW()
+                FROM moved
+                RETURNING id
+                """,
+                {"ids": ids},
+            )
+            archived = len(cur.fetchall() or [])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        logger.exception("outbox_archive_failed")
+        return 0
+
+    if archived:
+        logger.info(
+            json.dumps(
+                {
+                    "event": "outbox_rows_archived",
+                    "rows": archived,
+                    "older_than_days": days,
+                },
+                ensure_ascii=False,
+            )
+        )
+    return archived
+
+
+def compact_send_attempt_payloads(
+    conn,
+    *,
+    older_than_days: Optional[int] = None,
+    keep_chars: Optional[int] = None,
+    batch_size: Optional[int] = None,
+) -> int:
+    """
+    Trunca ``uazapi_response`` de tentativas com ``started_at`` anterior ao corte, na tabela
+    viva e no histórico (idempotente: só toca respostas maiores que ``keep_chars``).
+    """
+    days = OUTBOX_ATTEMPT_COMPACT_AFTER_DAYS if older_than_days is None else int(older_than_days)
+    if days <= 0:
+        return 0
+    keep = OUTBOX_ATTEMPT_COMPACT_KEEP_CHARS if keep_chars is None else max(0, int(keep_chars))
+    limit = OUTBOX_ARCHIVE_BATCH_SIZE if batch_size is None else max(1, int(batch_size))
+    compacted = 0
+    with conn.cursor() as cur:
+        for table in ("campaign_send_attempts", "campaign_send_attempts_history"):
+            cur.execute(
+                f"""
+                UPDATE {table}
+                SET uazapi_response = LEFT(uazapi_response, %(keep)s)
+                WHERE (id, started_at) IN (
+                    SELECT id, started_at FROM {table}
+                    WHERE started_at < NOW() - (%(days)s * INTERVAL '1 day')
+                      AND LENGTH(uazapi_response) > %(keep)s
+                    LIMIT %(limit)s
+                )
+                """,
+                {"keep": keep, "days": days, "limit": limit},
+            )
+            compacted += max(0, cur.rowcount or 0)
+    conn.commit()
+    if compacted:
+        logger.info(
+            json.dumps(
+                {
+                    "event": "outbox_attempts_compacted",
+                    "rows": compacted,
+                    "keep_chars": keep,
+                },
+                ensure_ascii=False,
+            )
+        )
+    return compacted
@@ -0,0 +1,50 @@
+"""
+Partição de ``instance_id`` entre workers outbox vivos (hash consistente).
+
+Cada worker entra no anel com ``vnodes`` pontos (``sha1(worker_id#i)``); uma instância pertence
+ao primeiro ponto do anel >= ``sha1(instance:<id>)``. Ao entrar/sair um worker só as instâncias
+dos seus arcos mudam de dono — o resto continua no mesmo processo (sem rebalanceamento total).
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+from typing import Iterable, Optional
+
+DEFAULT_VNODES = 64
+
+
+def _ring_point(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+def build_ring(worker_ids: Iterable[str], vnodes: int = DEFAULT_VNODES) -> list[tuple[int, str]]:
+    """Pontos ordenados ``(hash, worker_id)``; ids repetidos contam uma vez."""
+    ring = [
+        (_ring_point(f"{wid}#{i}"), wid)
+        for wid in sorted(set(worker_ids))
+        for i in range(max(1, int(vnodes)))
+    ]
+    ring.sort()
+    return ring
+
+
+def ring_owner(ring: list[tuple[int, str]], instance_id: int) -> Optional[str]:
+    """Worker dono de ``instance_id`` no anel (None com anel vazio)."""
+    if not ring:
+        return None
+    point = _ring_point(f"instance:{int(instance_id)}")
+    idx = bisect.bisect_left(ring, (point, ""))
+    return ring[idx % len(ring)][1]
+
+
+def owned_instance_ids(
+    worker_id: str,
+    live_worker_ids: Iterable[str],
+    instance_ids: Iterable[int],
+    vnodes: int = DEFAULT_VNODES,
+) -> list[int]:
+    """Subconjunto de ``instance_ids`` que cabe a ``worker_id`` entre os workers vivos."""
+    ring = build_ring(list(live_worker_ids) + [worker_id], vnodes)
+    return sorted(int(i) for i in instance_ids if ring_owner(ring, int(i)) == worker_id)
@@ -28,10 +28,13 @@ Usado por app.py (rota sync-uazapi) e worker_cadence (antes do rollover / Task 6
 import json
 import os
 import re
+import threading
 import time
 
 from psycopg2.extras import RealDictCursor
 
+from services.uazapi import list_folders_cached
+
 
 def _normalize_folder_id(value):
     if value is None:
@@ -193,45 +196,74 @@ def _repair_leads_sent_without_folder_on_active_folder(
         return int(cur.rowcount or 0)
 
 
-def _reconcile_send_by_messages(conn, campaign_id, lead_ids, sent_phones, failed_phones):
-    """
-    DEPRECATED (Task 4 / D3): reconciliação por enumeração ``list_messages`` Sent/Failed.
+def _phone_norm_keys(phones):
+    """Variantes (com/sem 55) dos telefones da API, como guardadas em ``campaign_leads.phone_norm``."""
+    keys = set()
+    for ph in phones or []:
+        keys |= normalize_phone_for_match(ph)
+    return keys
 
-    Mantido apenas com ``UAZAPI_SYNC_RECONCILE_LISTMESSAGES=1`` (suporte emergencial). O caminho
-    suportado é ``message_find`` no escopo do send (F10). Evita confiar só no agregado quando
-    a flag legacy está ligada.
+
+def _lead_phone_variants(row):
+    """``phone_norm`` da linha; lead ainda sem backfill (NULL) é calculado como no trigger da BD."""
+    if row.get("phone_norm") is not None:
+        return set(row["phone_norm"])
+    return normalize_phone_for_match(row.get("phone")) | normalize_phone_for_match(
+        row.get("whatsapp_link")
+    )
+
+
+def match_leads_by_phone_norm(conn, where_sql, params, sent_phones, failed_phones, extra_columns=""):
     """
-    if not lead_ids:
-        return set(), set()
+    Casa telefones Sent/Failed da API com leads por ``phone_norm`` (variantes com/sem 55 de
+    phone e whatsapp_link; índice GIN): um ``&&`` por lote em vez de carregar todos os
+    candidatos e normalizar em Python. ``where_sql`` filtra ``campaign_leads`` (deve incluir
+    ``campaign_id``). Retorna ``(sent_rows, failed_rows)``; Sent ganha a um número em ambos.
+    """
+    sent_keys = _phone_norm_keys(sent_phones)
+    failed_keys = _phone_norm_keys(failed_phones)
+    if not sent_keys and not failed_keys:
+        return [], []
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute(
-            """SELECT id, phone, whatsapp_link
-               FROM campaign_leads
-               WHERE campaign_id = %s
-                 AND id = ANY(%s)""",
-            (campaign_id, lead_ids),
+            "SELECT id, phone, whatsapp_link, phone_norm" + extra_columns + " FROM campaign_leads WHERE "
+            + where_sql
+            + " AND (phone_norm && %s::text[] OR phone_norm IS NULL)",
+            tuple(params) + (sorted(sent_keys | failed_keys),),
         )
         rows = cur.fetchall() or []
 
-    sent_normalized = set()
-    for ph in sent_phones or []:
-        sent_normalized |= normalize_phone_for_match(ph)
-    failed_normalized = set()
-    for ph in failed_phones or []:
-        failed_normalized |= normalize_phone_for_match(ph)
-
-    sent_ids = set()
-    failed_ids = set()
+    sent_rows = []
+    failed_rows = []
     for row in rows:
-        variants = normalize_phone_for_match(row.get("phone")) | normalize_phone_for_match(row.get("whatsapp_link"))
+        variants = _lead_phone_variants(row)
         if not variants:
             continue
-        if variants & sent_normalized:
-            sent_ids.add(row["id"])
-            continue
-        if variants & failed_normalized:
-            failed_ids.add(row["id"])
-    return sent_ids, failed_ids
+        if variants & sent_keys:
+            sent_rows.append(row)
+        elif variants & failed_keys:
+            failed_rows.append(row)
+    return sent_rows, failed_rows
+
+
+def _reconcile_send_by_messages(conn, campaign_id, lead_ids, sent_phones, failed_phones):
+    """
+    DEPRECATED (Task 4 / D3): reconciliação por enumeração ``list_messages`` Sent/Failed.
+
+    Mantido apenas com ``UAZAPI_SYNC_RECONCILE_LISTMESSAGES=1`` (suporte emergencial). O caminho
+    suportado é ``message_find`` no escopo do send (F10). Evita confiar só no agregado quando
+    a flag legacy está ligada.
+    """
+    if not lead_ids:
+        return set(), set()
+    sent_rows, failed_rows = match_leads_by_phone_norm(
+        conn,
+        "campaign_id = %s AND id = ANY(%s)",
+        (campaign_id, lead_ids),
+        sent_phones,
+        failed_phones,
+    )
+    return {r["id"] for r in sent_rows}, {r["id"] for r in failed_rows}
 
 
 def _reconcile_stage_by_messages(conn, campaign_id, stage, sent_phones, failed_phones):
@@ -244,37 +276,17 @@ def _reconcile_stage_by_messages(conn, campaign_id, stage, sent_phones, failed_p
     if not current_step:
         return set(), set()
 
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            """SELECT id, phone, whatsapp_link
-               FROM campaign_leads
-               WHERE campaign_id = %s
-                 AND current_step = %s
-                 AND COALESCE(removed_from_funnel, FALSE) = FALSE
-                 AND COALESCE(cadence_status, 'active') NOT IN ('converted', 'lost')""",
-            (campaign_id, current_step),
-        )
-        rows = cur.fetchall() or []
-
-    sent_normalized = set()
-    for ph in sent_phones or []:
-        sent_normalized |= normalize_phone_for_match(ph)
-    failed_normalized = set()
-    for ph in failed_phones or []:
-        failed_normalized |= normalize_phone_for_match(ph)
-
-    sent_ids = set()
-    failed_ids = set()
-    for row in rows:
-        variants = normalize_phone_for_match(row.get("phone")) | normalize_phone_for_match(row.get("whatsapp_link"))
-        if not variants:
-            continue
-        if variants & sent_normalized:
-            sent_ids.add(row["id"])
-            continue
-        if variants & failed_normalized:
-            failed_ids.add(row["id"])
-    return sent_ids, failed_ids
+    sent_rows, failed_rows = match_leads_by_phone_norm(
+        conn,
+        """campaign_id = %s
+           AND current_step = %s
+           AND COALESCE(removed_from_funnel, FALSE) = FALSE
+           AND COALESCE(cadence_status, 'active') NOT IN ('converted', 'lost')""",
+        (campaign_id, current_step),
+        sent_phones,
+        failed_phones,
+    )
+    return {r["id"] for r in sent_rows}, {r["id"] for r in failed_rows}
 
 
 def _normalize_phone_for_api(phone: str):
@@ -297,7 +309,8 @@ def normalize_phone_for_match(raw):
     """
     Normaliza número para match bidirecional (API ↔ DB).
     Extrai dígitos; retorna set de variantes (com/sem 55) para números válidos.
-    Usado por sync e rollover.
+    Usado por sync e rollover; ``campaign_lead_phone_variants`` (SQL) aplica a mesma regra a
+    ``campaign_leads.phone_norm``.
     """
     if not raw:
         return set()
@@ -354,43 +367,134 @@ def _extract_phones_from_message(m):
     return None
 
 
+_COUNTS_PAGE_SIZE = 500
+_COUNTS_STATUSES = (("sent", "Sent"), ("failed", "Failed"), ("scheduled", "Scheduled"))
+# (token, folder_id, message_status) -> (contagem, monotonic)
+_counts_cache: dict[tuple[str, str, str], tuple[int, float]] = {}
+_counts_cache_lock = threading.Lock()
+
+
+def _counts_cache_ttl_sec() -> float:
+    """TTL (s) das contagens por pasta+status (default 15s; 0 desliga)."""
+    try:
+        return max(0.0, min(float((os.environ.get("UAZAPI_COUNTS_CACHE_TTL_SEC") or "15").strip()), 600.0))
+    except (TypeError, ValueError):
+        return 15.0
+
+
+def _counts_page_concurrency() -> int:
+    """Páginas list_messages em voo por contagem (default 4)."""
+    try:
+        return max(1, min(int((os.environ.get("UAZAPI_COUNTS_PAGE_CONCURRENCY") or "4").strip()), 16))
+    except (TypeError, ValueError):
+        return 4
+
+
+def _list_messages_page_len(resp) -> int:
+    msgs = resp.get("messages") or resp.get("data")
+    if isinstance(msgs, dict):
+        msgs = msgs.get("messages") or msgs.get("data") or []
+    return len(msgs) if isinstance(msgs, list) else 0
+
+
 def get_uazapi_campaign_counts(uazapi_service, token, folder_id, context=None):
     """
     Retorna contagens reais da Uazapi (Sent, Failed, Scheduled) com paginação completa.
     Usado por stats API e worker para saber quando campanha inicial terminou.
     context: dict opcional (campaign_id, instance_id) para logs de erro.
+
+    As 1.ª páginas dos três status vão em paralelo; se ``pagination.total`` vier, é a contagem.
+    Senão, as páginas 2..``lastPage`` de todos os status são buscadas de uma vez em paralelo e
+    só o tamanho de cada lista é somado. Contagens completas ficam em cache por
+    ``UAZAPI_COUNTS_CACHE_TTL_SEC`` (pasta+status); falhas parciais não entram no cache.
     """
     if not uazapi_service or not token or not folder_id:
         return {"sent": 0, "failed": 0, "scheduled": 0}
+    from services.uazapi_async import run_uazapi_batch
 
-    def _count_all_pages(message_status):
-        total = 0
-        page = 1
-        page_size = 500
-        while True:
-            resp = uazapi_service.list_messages(
-                token, folder_id, message_status=message_status, page=page, page_size=page_size, context=context
-            )
-            if not resp:
-                break
-            msgs = resp.get("messages") or resp.get("data")
-            if isinstance(msgs, dict):
-                msgs = msgs.get("messages") or msgs.get("data") or []
-            if not isinstance(msgs, list):
-                msgs = []
-            total += len(msgs)
-            pag = resp.get("pagination") or {}
-            last_page = pag.get("lastPage") or pag.get("last_page") or 1
-            if page >= last_page or len(msgs) < page_size:
-                break
-            page += 1
-        return total
+    fid = str(folder_id)
+    ttl = _counts_cache_ttl_sec()
+    now = time.monotonic()
+    counts = {}
+    with _counts_cache_lock:
+        for key, status in _COUNTS_STATUSES:
+            hit = _counts_cache.get((token, fid, status))
+            if hit and ttl > 0 and now - hit[1] < ttl:
+                counts[key] = hit[0]
+    pending = [(key, status) for key, status in _COUNTS_STATUSES if key not in counts]
+    if not pending:
+        return counts
+
+    conc = _counts_page_concurrency()
+
+    def _page_call(status, page):
+        return (
+            "list_messages",
+            token,
+            {
+                "folder_id": folder_id,
+                "message_status": status,
+                "page": page,
+                "page_size": _COUNTS_PAGE_SIZE,
+                "context": context,
+            },
+        )
 
-    return {
-        "sent": _count_all_pages("Sent"),
-        "failed": _count_all_pages("Failed"),
-        "scheduled": _count_all_pages("Scheduled"),
-    }
+    first = run_uazapi_batch(
+        [_page_call(status, 1) for _, status in pending],
+        service=uazapi_service,
+        max_concurrency=conc,
+        per_token_concurrency=conc,
+    )
+    complete = {}
+    rest = []
+    for (key, status), resp in zip(pending, first):
+        if not resp or isinstance(resp, Exception):
+            counts[key] = 0
+            continue
+        pag = resp.get("pagination") or {}
+        total = pag.get("total")
+        if isinstance(total, int) and total >= 0:
+            counts[key] = total
+            complete[key] = status
+            continue
+        n = _list_messages_page_len(resp)
+        counts[key] = n
+        last_page = pag.get("lastPage") or pag.get("last_page") or 1
+        try:
+            last_page = int(last_page)
+        except (TypeError, ValueError):
+            last_page = 1
+        if last_page <= 1 or n < _COUNTS_PAGE_SIZE:
+            complete[key] = status
+            continue
+        rest.extend((key, status, page) for page in range(2, last_page + 1))
+
+    if rest:
+        pages = run_uazapi_batch(
+            [_page_call(status, page) for _, status, page in rest],
+            service=uazapi_service,
+            max_concurrency=conc,
+            per_token_concurrency=conc,
+        )
+        failed = set()
+        for (key, status, _page), resp in zip(rest, pages):
+            if not resp or isinstance(resp, Exception):
+                failed.add(key)
+                continue
+            counts[key] += _list_messages_page_len(resp)
+        for key, status, _page in rest:
+            if key not in failed:
+                complete[key] = status
+
+    if ttl > 0 and complete:
+        now = time.monotonic()
+        with _counts_cache_lock:
+            for key, status in complete.items():
+                _counts_cache[(token, fid, status)] = (counts[key], now)
+            if len(_counts_cache) > 2000:
+                _counts_cache.clear()
+    return {key: counts[key] for key, _ in _COUNTS_STATUSES}
 
 
 def is_initial_campaign_finished(counts):
@@ -401,7 +505,32 @@ def is_initial_campaign_finished(counts):
 def fetch_all_phones_by_status(uazapi_service, token, folder_id, message_status, context=None):
     """Busca todos os telefones de um status, iterando paginação.
     context: dict opcional (campaign_id, instance_id) para logs de erro."""
+    phones, _max_ts = fetch_phones_by_status_since(
+        uazapi_service, token, folder_id, message_status, context=context
+    )
+    return phones
+
+
+def _message_timestamp(m):
+    try:
+        return int(m.get("messageTimestamp") or m.get("message_timestamp") or 0)
+    except (AttributeError, TypeError, ValueError):
+        return 0
+
+
+def fetch_phones_by_status_since(
+    uazapi_service, token, folder_id, message_status, since_ts=None, context=None
+):
+    """
+    Como ``fetch_all_phones_by_status``, mas só devolve telefones de mensagens com
+    ``messageTimestamp > since_ts`` (marca d'água do sync anterior). Retorna ``(phones, max_ts)``.
+
+    A ordem de ``listmessages`` não é documentada: a paginação só para mais cedo quando a página
+    vem da mais recente para a mais antiga e a última mensagem já é anterior à marca d'água. Em
+    qualquer outra ordem percorre tudo (resultado igual, sem ganho).
+    """
     phones = set()
+    max_ts = int(since_ts or 0)
     page = 1
     page_size = 500
     while True:
@@ -415,7 +544,13 @@ def fetch_all_phones_by_status(uazapi_service, token, folder_id, message_status,
             msgs = msgs.get("messages") or msgs.get("data") or []
         if not isinstance(msgs, list):
             msgs = []
+        stamps = []
         for m in msgs:
+            ts = _message_timestamp(m)
+            stamps.append(ts)
+            if since_ts and ts and ts <= since_ts:
+                continue
+            max_ts = max(max_ts, ts)
             ph = _extract_phones_from_message(m)
             if ph:
                 phones.add(ph)
@@ -423,8 +558,16 @@ def fetch_all_phones_by_status(uazapi_service, token, folder_id, message_status,
         last_page = pag.get("lastPage") or pag.get("last_page") or 1
         if page >= last_page or len(msgs) < page_size:
             break
+        if (
+            since_ts
+            and stamps
+            and all(stamps)
+            and stamps == sorted(stamps, reverse=True)
+            and stamps[-1] <= since_ts
+        ):
+            break
         page += 1
-    return phones
+    return phones, max_ts
 
 
 # Alias para compatibilidade (código antigo importava _fetch_all_phones_by_status)
@@ -839,6 +982,8 @@ def sync_campaign_stage_sends_before_new_chunk(conn, campaign_id, uazapi_service
     etapa (evita chamadas HTTP desnecessárias na primeira criação). ``stage=None`` exige qualquer
     send com ``uazapi_folder_id`` na campanha.
 
+    Corre sempre completo (``force_full``): a decisão do chunk não depende da marca d'água.
+
     Rollout: ``UAZAPI_RECONCILE_FIND_BEFORE_CHUNK=0`` desliga.
     """
     if not uazapi_service or not campaign_id:
@@ -890,6 +1035,7 @@ def sync_campaign_stage_sends_before_new_chunk(conn, campaign_id, uazapi_service
             (row.get("apikey") or "").strip(),
             row.get("uazapi_folder_id"),
             uazapi_service,
+            force_full=True,
         )
     except Exception as e:
         try:
@@ -910,7 +1056,68 @@ def sync_campaign_stage_sends_before_new_chunk(conn, campaign_id, uazapi_service
         )
 
 
-def sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi_service, debug=False):
+def _incremental_sync_enabled():
+    """``UAZAPI_SYNC_INCREMENTAL=0`` volta ao sync completo em todos os ciclos."""
+    return (os.environ.get("UAZAPI_SYNC_INCREMENTAL") or "1").strip().lower() not in (
+        "0",
+        "false",
+        "no",
+        "off",
+    )
+
+
+def _sync_full_rescan_minutes():
+    """Minutos até um send sem mudança em listfolders voltar a um sync completo (default 60; 0 = nunca)."""
+    try:
+        return max(0, min(int((os.environ.get("UAZAPI_SYNC_FULL_RESCAN_MINUTES") or "60").strip()), 1440))
+    except (TypeError, ValueError):
+        return 60
+
+
+def _folder_watermark(folder_info, log_success, log_failed, status):
+    """Contadores de listfolders que marcam "houve eventos novos nesta pasta"."""
+    updated = folder_info.get("updated") or folder_info.get("updated_at")
+    try:
+        updated = int(updated) if updated is not None else None
+    except (TypeError, ValueError):
+        updated = None
+    return {
+        "log_success": int(log_success),
+        "log_failed": int(log_failed),
+        "status": status,
+        "updated": updated,
+    }
+
+
+def _load_sync_watermark(raw):
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except Exception:
+            return None
+    return raw if isinstance(raw, dict) else None
+
+
+def _folder_unchanged_since_watermark(prev, current, db_status):
+    """
+    True quando listfolders repete os contadores gravados no último sync completo deste send e o
+    status na BD é o que esse sync escreveu (nada mexeu no send por fora entretanto).
+    ``updated`` só entra na comparação quando a API o devolve nas duas leituras.
+    """
+    if not prev:
+        return False
+    for key in ("log_success", "log_failed", "status"):
+        if prev.get(key) != current.get(key):
+            return False
+    if prev.get("updated") is not None and current.get("updated") is not None:
+        if prev["updated"] != current["updated"]:
+            return False
+    return (db_status or "") == (prev.get("db_status") or "")
+
+
+def sync_campaign_leads_from_uazapi(
+    conn, campaign_id, token, folder_id, uazapi_service, debug=False, force_full=False
+):
     """
     Sincroniza status de campaign_leads com Uazapi.
     Primeiro tenta list_folders (sem status) e usa log_sucess + lead_ids armazenados (F8, F9).
@@ -923,6 +1130,14 @@ def sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi_
     O ``token`` da assinatura é obrigatório **só** para esse legado; no fluxo por ``campaign_stage_sends``
     cada send usa ``i.apikey`` (evita sync vazio em ``process_rollover_fu_next`` quando a primeira
     instância da campanha não tem chave mas outra instância com send ativo tem).
+
+    **Incremental** (``UAZAPI_SYNC_INCREMENTAL``, defeito ligado): cada send guarda em
+    ``sync_watermark`` os contadores de listfolders (``log_sucess``/``log_failed``/status/``updated``)
+    e o ``messageTimestamp`` mais recente já lido por status. Send cujos contadores não mudaram
+    desde o último sync completo e sem leads do escopo message_find por resolver só toca
+    ``last_sync_at`` (sem repair, list_messages nem message_find); o ramo list_messages só lê
+    mensagens posteriores à marca d'água. A cada ``UAZAPI_SYNC_FULL_RESCAN_MINUTES`` (ou com
+    ``force_full=True``) o send volta ao sync completo, list_messages incluído desde o início.
     """
     if not uazapi_service:
         return {"sent": 0, "failed": 0, "updated_sent": 0, "updated_failed": 0}
@@ -930,6 +1145,9 @@ def sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi_
     debug = os.environ.get("DEBUG_SYNC_UAZAPI") == "1"
     updated_sent = 0
     updated_failed = 0
+    incremental = _incremental_sync_enabled() and not force_full
+    rescan_minutes = _sync_full_rescan_minutes()
+    skipped_unchanged = 0
 
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute(
@@ -945,13 +1163,16 @@ def sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi_
         cur.execute(
             """SELECT css.id, css.stage, css.instance_id, css.instance_remote_jid, css.uazapi_folder_id,
                       css.lead_ids, css.planned_count, css.status,
+                      css.sync_watermark,
+                      COALESCE(css.sync_full_at < NOW() - make_interval(mins => %s), TRUE)
+                          AS sync_rescan_due,
                       i.apikey
                FROM campaign_stage_sends css
                JOIN instances i ON i.id = css.instance_id
                WHERE css.campaign_id = %s
                  AND css.uazapi_folder_id IS NOT NULL
                  AND css.status IN ('scheduled', 'running', 'partial', 'waiting_reconnect', 'done')""",
-            (campaign_id,),
+            (rescan_minutes, campaign_id),
         )
         stage_sends = cur.fetchall() or []
 
@@ -972,7 +1193,7 @@ def sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi_
         stage_guard = _cadence_stage_sql_guard(send.get("stage") or "")
 
         ctx = {"campaign_id": campaign_id, "instance_id": send.get("instance_id")}
-        folders_raw = uazapi_service.list_folders(send_token, context=ctx)
+        folders_raw = list_folders_cached(uazapi_service, send_token, context=ctx)
         # None = falha de transporte/HTTP (ver UazapiService.list_folders). Não tratar como
         # "pasta ausente" nem correr probe→failed (Task 7 / AC5 — evita falso órfão).
         if folders_raw is None:
@@ -1076,6 +1297,42 @@ def sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi_
         if planned_count <= 0 and lead_ids:
             planned_count = len(lead_ids)
 
+        watermark = _folder_watermark(folder_info, log_success, log_failed, status)
+        prev_watermark = _load_sync_watermark(send.get("sync_watermark"))
+        rescan_due = bool(rescan_minutes > 0 and send.get("sync_rescan_due"))
+        unchanged = (
+            incremental
+            and not rescan_due
+            and _folder_unchanged_since_watermark(prev_watermark, watermark, send.get("status"))
+        )
+        find_scope_ids = None
+        if (
+            unchanged
+            and lead_ids
+            and planned_count > 0
+            and _should_run_scope_message_find(status, log_success)
+        ):
+            # Contadores iguais não bastam: leads do escopo message_find ainda por resolver
+            # (ex. find que falhou a meio) têm de voltar ao find neste ciclo.
+            find_scope_ids = _lead_ids_needing_message_find(conn, campaign_id, send, fid)
+        if unchanged and not find_scope_ids:
+            # Nada de novo na pasta desde o último sync completo: o reconcile daria o mesmo.
+            with conn.cursor() as cur:
+                cur.execute(
+                    """UPDATE campaign_stage_sends
+                       SET last_sync_at = NOW(), updated_at = NOW()
+                       WHERE id = %s""",
+                    (send["id"],),
+                )
+            skipped_unchanged += 1
+            continue
+        # Rescan periódico relê list_messages desde o início (marca d'água de mensagens zerada).
+        message_ts = (
+            dict((prev_watermark or {}).get("message_ts") or {})
+            if incremental and not rescan_due
+            else {}
+        )
+
         # Evita poluir logs: status=done sem falhas repete a cada sync (~10 min) por send.
         # DEBUG_SYNC_UAZAPI=1: linha completa sempre. Caso contrário: só estados problemáticos ou done com failed>0.
         _show_sync_line = (
@@ -1171,9 +1428,9 @@ def sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi_
 
         find_scope_count = 0
         if lead_ids and planned_count > 0 and folder_info and fid:
-            find_scope_count = len(
-                _lead_ids_needing_message_find(conn, campaign_id, send, fid)
-            )
+            if find_scope_ids is None:
+                find_scope_ids = _lead_ids_needing_message_find(conn, campaign_id, send, fid)
+            find_scope_count = len(find_scope_ids)
         # Evita list_messages Sent/Failed + message_find no mesmo send (F10 / conflito Task 3).
         skip_listmessages_reconcile = (
             _ua_message_find_enabled()
@@ -1187,8 +1444,13 @@ def sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi_
             and _sync_reconcile_listmessages_enabled()
             and not skip_listmessages_reconcile
         ):
-            sent_phones_done = fetch_all_phones_by_status(uazapi_service, send_token, fid, "Sent", context=ctx)
-            failed_phones_done = fetch_all_phones_by_status(uazapi_service, send_token, fid, "Failed", context=ctx)
+            # Só mensagens após a marca d'água: as anteriores já foram reconciliadas em ciclos passados.
+            sent_phones_done, message_ts["Sent"] = fetch_phones_by_status_since(
+                uazapi_service, send_token, fid, "Sent", since_ts=message_ts.get("Sent"), context=ctx
+            )
+            failed_phones_done, message_ts["Failed"] = fetch_phones_by_status_since(
+                uazapi_service, send_token, fid, "Failed", since_ts=message_ts.get("Failed"), context=ctx
+            )
             if lead_ids:
                 sent_ids_done, failed_ids_done = _reconcile_send_by_messages(
                     conn=conn,
@@ -1345,12 +1607,37 @@ def sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi_
                    SET success_count = %s,
                        failed_count = %s,
                        status = %s,
+                       sync_watermark = %s::jsonb,
+                       sync_full_at = NOW(),
                        last_sync_at = NOW(),
                        updated_at = NOW()
                    WHERE id = %s""",
-                (effective_success, effective_failed, normalized_status, send["id"]),
+                (
+                    effective_success,
+                    effective_failed,
+                    normalized_status,
+                    json.dumps(
+                        dict(watermark, db_status=normalized_status, message_ts=message_ts),
+                        ensure_ascii=False,
+                    ),
+                    send["id"],
+                ),
             )
 
+    if skipped_unchanged:
+        print(
+            json.dumps(
+                {
+                    "event": "uazapi_sync_incremental_skip",
+                    "campaign_id": campaign_id,
+                    "stage_sends": len(stage_sends),
+                    "skipped_unchanged": skipped_unchanged,
+                },
+                ensure_ascii=False,
+            ),
+            flush=True,
+        )
+
     # Campanhas com cadência, Uazapi sender ou qualquer campaign_stage_sends: só sync por stage_sends.
     # Não usar folder único + uazapi_last_send_lead_ids (incompatível com multi-instância / next_step=2 forçado).
     if (
@@ -1382,7 +1669,9 @@ def sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi_
             lead_ids_by_step[i + 1] = ids if isinstance(ids, list) else []
 
     ctx_legacy = {"campaign_id": campaign_id}
-    folders_list = uazapi_service.list_folders(token, context=ctx_legacy) if folder_id else None
+    folders_list = (
+        list_folders_cached(uazapi_service, token, context=ctx_legacy) if folder_id else None
+    )
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         if _listfolders_prefix_sent_enabled() and folders_list and folder_id and lead_ids_by_step.get(1):
             print(
@@ -1447,37 +1736,18 @@ def sync_campaign_leads_from_uazapi(conn, campaign_id, token, folder_id, uazapi_
         sent_phones = fetch_all_phones_by_status(uazapi_service, token, folder_id, "Sent", context=ctx_legacy)
         failed_phones = fetch_all_phones_by_status(uazapi_service, token, folder_id, "Failed", context=ctx_legacy)
 
-        sent_normalized = set()
-        for ph in sent_phones:
-            sent_normalized |= normalize_phone_for_match(ph)
-        failed_normalized = set()
-        for ph in failed_phones:
-            failed_normalized |= normalize_phone_for_match(ph)
-
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """SELECT id, phone, whatsapp_link, status, cadence_status, removed_from_funnel
-                   FROM campaign_leads WHERE campaign_id = %s""",
-                (campaign_id,),
-            )
-            leads = cur.fetchall()
-
-        sent_ids = []
-        failed_ids = []
-        for lead in leads:
-            if lead.get("removed_from_funnel"):
-                continue
-            if (lead.get("cadence_status") or "") in ("converted", "lost"):
-                continue
-            lead_variants = normalize_phone_for_match(lead.get("phone")) | normalize_phone_for_match(
-                lead.get("whatsapp_link")
-            )
-            if not lead_variants:
-                continue
-            if lead.get("status") != "sent" and (lead_variants & sent_normalized):
-                sent_ids.append(lead["id"])
-            elif lead.get("status") not in ("sent", "failed") and (lead_variants & failed_normalized):
-                failed_ids.append(lead["id"])
+        sent_rows, failed_rows = match_leads_by_phone_norm(
+            conn,
+            """campaign_id = %s
+               AND COALESCE(removed_from_funnel, FALSE) = FALSE
+               AND COALESCE(cadence_status, '') NOT IN ('converted', 'lost')""",
+            (campaign_id,),
+            sent_phones,
+            failed_phones,
+            extra_columns=", status",
+        )
+        sent_ids = [r["id"] for r in sent_rows if r.get("status") != "sent"]
+        failed_ids = [r["id"] for r in failed_rows if r.get("status") not in ("sent", "failed")]
 
         with conn.cursor() as cur:
             if sent_ids and updated_sent == 0:
@@ -0,0 +1,229 @@
+"""
+Gravação / reprodução (cassetes) do tráfego HTTP Uazapi.
+
+``UAZAPI_CASSETTE_MODE=record`` grava cada requisição da sessão partilhada de
+``UazapiService`` num JSONL (``UAZAPI_CASSETTE_PATH``): método, caminho, impressão digital do
+token, corpo JSON do pedido e da resposta (ambos passados por
+``sanitize_dispatch_audit_payload``), status e latência. ``replay`` serve essas respostas sem
+rede, na ordem gravada, esperando a latência original (``UAZAPI_CASSETTE_REPLAY_TIMING=none``
+responde na hora). Pedido sem correspondência levanta ``CassetteMissError`` (uma
+``ConnectionError``: os métodos do serviço tratam-na como falha de transporte) e é contado.
+
+O token nunca vai para o ficheiro: só ``auth_fp`` (sha256 truncado), que distingue instâncias.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Callable, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from utils.campaign_dispatch_audit import sanitize_dispatch_audit_payload
+
+CASSETTE_MODES = ("record", "replay")
+
+
+class CassetteMissError(requests.exceptions.ConnectionError):
+    """Replay sem resposta gravada para o pedido."""
+
+
+def _auth_fp(request) -> str:
+    token = (request.headers.get("token") or request.headers.get("admintoken") or "").strip()
+    if not token:
+        return ""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:12]
+
+
+def _path(request) -> str:
+    parts = urlsplit(request.url or "")
+    return parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+def _request_body(request) -> Any:
+    body = request.body
+    if body is None:
+        return None
+    if not isinstance(body, (bytes, str)):
+        # Corpo em streaming (mídia grande): não é relido, só o tamanho fica na cassete.
+        return {"streamed": True, "length": len(body) if hasattr(body, "__len__") else None}
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    try:
+        return sanitize_dispatch_audit_payload(json.loads(body))
+    except ValueError:
+        return body
+
+
+def _canonical(obj: Any) -> str:
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class UazapiCassette:
+    """Uma cassete aberta em ``record`` ou ``replay`` (thread-safe)."""
+
+    def __init__(self, path: str, mode: str, *, replay_timing: bool = True):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"modo de cassete inválido: {mode}")
+        self.path = path
+        self.mode = mode
+        self.replay_timing = replay_timing
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.misses = 0
+        self.served = 0
+        # (método, caminho, auth_fp, corpo canónico) e (método, caminho, auth_fp) -> entradas
+        self._exact: dict[tuple, deque] = {}
+        self._loose: dict[tuple, deque] = {}
+        if mode == "replay":
+            self._load()
+        else:
+            parent = os.path.dirname(os.path.abspath(path))
+            os.makedirs(parent, exist_ok=True)
+
+    def _load(self) -> None:
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                entry["_used"] = False
+                base = (entry["method"], entry["path"], entry.get("auth_fp") or "")
+                self._exact.setdefault(base + (_canonical(entry.get("request")),), deque()).append(
+                    entry
+                )
+                self._loose.setdefault(base, deque()).append(entry)
+
+    def send(self, request, real_send: Callable[[], requests.Response]) -> requests.Response:
+        if self.mode == "replay":
+            return self._replay(request)
+        started = time.monotonic()
+        response = real_send()
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        self._record(request, response, elapsed_ms)
+        return response
+
+    def _record(self, request, response: requests.Response, elapsed_ms: int) -> None:
+        text = response.content.decode(response.encoding or "utf-8", errors="replace")
+        try:
+            body: Any = sanitize_dispatch_audit_payload(json.loads(text))
+        except ValueError:
+            body = text
+        with self._lock:
+            self._seq += 1
+            entry = {
+                "seq": self._seq,
+                "method": request.method,
+                "path": _path(request),
+                "auth_fp": _auth_fp(request),
+                "request": _request_body(request),
+                "status": response.status_code,
+                "content_type": response.headers.get("Content-Type") or "",
+                "response": body,
+                "elapsed_ms": elapsed_ms,
+                "recorded_at": time.time(),
+            }
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def _take(self, queue: Optional[deque]) -> Optional[dict]:
+        while queue:
+            entry = queue.popleft()
+            if not entry["_used"]:
+                entry["_used"] = True
+                return entry
+        return None
+
+    def _replay(self, request) -> requests.Response:
+        base = (request.method, _path(request), _auth_fp(request))
+        with self._lock:
+            entry = self._take(self._exact.get(base + (_canonical(_request_body(request)),)))
+            if entry is None:
+                entry = self._take(self._loose.get(base))
+            if entry is None:
+                self.misses += 1
+            else:
+                self.served += 1
+        if entry is None:
+            print(
+                json.dumps(
+                    {"event": "uazapi_cassette_miss", "method": base[0], "path": base[1]},
+                    ensure_ascii=False,
+                ),
+                flush=True,
+            )
+            raise CassetteMissError(
+                f"sem resposta gravada para {base[0]} {base[1]}", request=request
+            )
+        if self.replay_timing and entry.get("elapsed_ms"):
+            time.sleep(entry["elapsed_ms"] / 1000.0)
+        body = entry.get("response")
+        raw = body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)
+        response = requests.Response()
+        response.status_code = int(entry["status"])
+        response._content = raw.encode("utf-8")
+        response.encoding = "utf-8"
+        response.headers = CaseInsensitiveDict(
+            {"Content-Type": entry.get("content_type") or "application/json"}
+        )
+        response.url = request.url
+        response.request = request
+        response.reason = "replayed"
+        response.elapsed = timedelta(milliseconds=int(entry.get("elapsed_ms") or 0))
+        return response
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "path": self.path,
+                "recorded": self._seq,
+                "served": self.served,
+                "misses": self.misses,
+            }
+
+
+_active: Optional[UazapiCassette] = None
+_active_loaded = False
+_active_lock = threading.Lock()
+
+
+def active_cassette() -> Optional[UazapiCassette]:
+    """Cassete do processo (env lida na primeira chamada) ou a definida por ``use_cassette``."""
+    global _active, _active_loaded
+    if _active_loaded:
+        return _active
+    with _active_lock:
+        if not _active_loaded:
+            mode = (os.environ.get("UAZAPI_CASSETTE_MODE") or "").strip().lower()
+            path = (os.environ.get("UAZAPI_CASSETTE_PATH") or "").strip()
+            if mode in CASSETTE_MODES and path:
+                timing = (os.environ.get("UAZAPI_CASSETTE_REPLAY_TIMING") or "original").strip()
+                _active = UazapiCassette(path, mode, replay_timing=timing.lower() != "none")
+            _active_loaded = True
+    return _active
+
+
+@contextmanager
+def use_cassette(path: str, mode: str, *, replay_timing: bool = True):
+    """Ativa uma cassete no bloco (harness de benchmark / testes); restaura a anterior."""
+    global _active, _active_loaded
+    cassette = UazapiCassette(path, mode, replay_timing=replay_timing)
+    with _active_lock:
+        previous = (_active, _active_loaded)
+        _active, _active_loaded = cassette, True
+    try:
+        yield cassette
+    finally:
+        with _active_lock:
+            _active, _active_loaded = previous
@@ -6,6 +6,7 @@ Matriz (resumo — primeira regra que aplicar ganha após texto unificado):
 |-------|----------------|
 | Marcadores internos ``missing_phone``, ``missing_message_template`` | terminal |
 | Corpo/JSON com ``no session``, ``no_session``, ``desconect``, ``disconnected``, ``sessão`` (whatsapp), ``not logged`` | instance_unreachable |
+| Marcador ``uazapi_circuit_open`` (circuit breaker do token aberto) | instance_unreachable |
 | HTTP 502, 503, 504 | retry_backoff |
 | HTTP 408, 429 | retry_backoff |
 | HTTP 5xx restantes (sem palavras de sessão acima) | retry_backoff |
@@ -15,6 +16,10 @@ Matriz (resumo — primeira regra que aplicar ganha após texto unificado):
 | Excepção: ``ConnectionError``, ``BrokenPipeError``, ``requests.exceptions.ConnectionError`` | instance_unreachable |
 | HTTP ``None`` sem texto útil | instance_unreachable |
 | HTTP ``None`` com texto sem código 4xx/5xx | retry_backoff |
+
+Circuit breaker por token (``trips_instance_circuit``): conta como falha da instância o que
+classifica como ``instance_unreachable``, timeouts de transporte e HTTP 401 (token revogado).
+Restantes 4xx/5xx não abrem o circuito (a instância respondeu).
 """
 
 from __future__ import annotations
@@ -39,6 +44,7 @@ _INSTANCE_UNREACHABLE_SUBSTRINGS = (
     "instance not connected",
     "whatsapp not connected",
     "closed session",
+    "circuit_open",
 )
 
 
@@ -196,3 +202,21 @@ def classify_outbox_send_failure(
         return "instance_unreachable"
 
     return "retry_backoff"
+
+
+def trips_instance_circuit(
+    http_status: Optional[int],
+    response_body: Any,
+    exception_class: Optional[type] = None,
+) -> bool:
+    """True quando a falha indica instância morta/token inválido (alimenta o circuit breaker)."""
+    if http_status == 401:
+        return True
+    if _exception_suggests_timeout(exception_class):
+        return True
+    if http_status is not None and http_status < 400:
+        return False
+    return (
+        classify_outbox_send_failure(http_status, response_body, None, exception_class)
+        == "instance_unreachable"
+    )
@@ -41,6 +41,41 @@ def get_instance_status_cached(
     return st
 
 
+def prefetch_instance_statuses(uazapi_service, instances) -> int:
+    """
+    Aquece ``_status_cache`` em paralelo para ``(instance_id, token)`` sem entrada válida,
+    antes de um loop que chama ``get_instance_status_cached`` instância a instância.
+    Falhas não entram no cache (o loop tenta de novo de forma síncrona). Devolve quantas
+    entradas foram preenchidas.
+    """
+    if not uazapi_service:
+        return 0
+    now = time.monotonic()
+    missing: dict[int, str] = {}
+    for instance_id, token in instances:
+        tok = (token or "").strip()
+        if not tok or instance_id in missing:
+            continue
+        cached = _status_cache.get(instance_id)
+        if cached and now - cached[1] < _STATUS_CACHE_TTL_SEC:
+            continue
+        missing[instance_id] = tok
+    if len(missing) < 2:
+        return 0
+    from services.uazapi_async import run_uazapi_batch
+
+    results = run_uazapi_batch(
+        [("get_status", tok, {}) for tok in missing.values()], service=uazapi_service
+    )
+    filled = 0
+    for instance_id, st in zip(missing, results):
+        if isinstance(st, BaseException):
+            continue
+        _status_cache[instance_id] = (st, time.monotonic())
+        filled += 1
+    return filled
+
+
 def _parse_disconnected_cooldown_hours() -> int:
     raw = os.environ.get("SUPPORT_NOTIFY_DISCONNECT_COOLDOWN_HOURS", "24")
     try:
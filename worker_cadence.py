@@ -18,6 +18,8 @@ import random
 import requests
 import base64
 import re
+import signal
+import sys
 from datetime import datetime, date, timedelta
 import psycopg2
 from psycopg2 import errors as psycopg2_errors
@@ -39,6 +41,8 @@ try:
 except ImportError:
     uazapi_service = None
 
+from utils.lead_bulk_update import bulk_update_campaign_leads
+
 # Limites compartilhados
 from utils.limits import (
     can_create_campaign_today,
@@ -62,7 +66,7 @@ from utils.uazapi_pacing import (
 )
 from utils.cadence_uazapi import merge_fu1_into_campaign_db
 
-from utils.config import SUPER_ADMIN_EMAILS, USE_MESSAGE_OUTBOX
+from utils.config import OUTBOX_DEDICATED_WORKER, SUPER_ADMIN_EMAILS, USE_MESSAGE_OUTBOX
 from utils.next_valid_uazapi_send import is_campaign_send_window, next_valid_send_utc_naive
 from utils.campaign_send_policy import uazapi_initial_chunk_distribution_limits
 from utils.initial_chunk_schedule_target import (
@@ -78,6 +82,7 @@ from utils.uazapi_error_taxonomy import (
 )
 from utils.uazapi_support_notify import (
     get_instance_status_cached,
+    prefetch_instance_statuses,
     is_instance_disconnected_status,
     maybe_send_disconnect_support_whatsapp,
     enqueue_reconnect_inapp_alert,
@@ -102,7 +107,7 @@ def _campaign_has_message_outbox(conn, campaign_id: int) -> bool:
         return False
     with conn.cursor() as cur:
         cur.execute(
-            "SELECT 1 FROM campaign_message_outbox WHERE campaign_id = %s LIMIT 1",
+            "SELECT 1 FROM campaign_message_outbox_all WHERE campaign_id = %s LIMIT 1",
             (campaign_id,),
         )
         return cur.fetchone() is not None
@@ -114,6 +119,8 @@ CHATWOOT_ACCOUNT_ID = os.environ.get('CHATWOOT_ACCOUNT_ID', '2')
 
 CADENCE_POLL_INTERVAL = 30  # seconds (mais frequente para pegar scheduled_start e Continuar)
 SAFETY_BUFFER_MINUTES = 5
+# Leads do buffer de segurança por escrita em lote (UPDATE … FROM VALUES) + commit.
+SAFETY_BUFFER_FLUSH_EVERY = 200
 
 
 def _parse_uazapi_disconnect_pause_check_interval_sec() -> int:
@@ -1706,6 +1713,9 @@ def _resume_waiting_reconnect_stage_sends(conn):
             """
         )
         rows = cur.fetchall() or []
+    prefetch_instance_statuses(
+        uazapi_service, [(int(r.get("instance_id") or 0), r.get("apikey")) for r in rows]
+    )
     for r in rows:
         sid = r.get("id")
         iid = r.get("instance_id")
@@ -1758,7 +1768,7 @@ def _process_verify_folder_queue():
         if not fid or not token:
             continue
         try:
-            folders = uazapi_service.list_folders(token) or []
+            folders = uazapi_service.list_folders_cached(token) or []
             found = None
             for f in folders:
                 cf = str(f.get("id") or f.get("folder_id") or f.get("folderId") or "").strip()
@@ -1818,6 +1828,10 @@ def _uazapi_instance_health_tick(conn) -> dict:
 
     disconnected_for_pause: list[int] = []
     reconnect_notified = 0
+    # get_status de todas as instâncias em paralelo (~1 RTT); o loop abaixo lê do cache.
+    prefetch_instance_statuses(
+        uazapi_service, [(int(r["id"]), r.get("apikey")) for r in rows if r.get("id") is not None]
+    )
 
     for r in rows:
         iid = r.get("id")
@@ -2063,9 +2077,11 @@ def process_cadence():
             # T7: recovery de ``scheduled`` initial sem pasta (TTL) antes do materialize — F1
             _recover_stale_scheduled_initial_uazapi_sends(conn)
 
-            # Outbox Uazapi (ADR-5): claim → HTTP → persistência; só com flag (utils.config)
+            # Outbox Uazapi (ADR-5): claim → HTTP → persistência; só com flag (utils.config).
+            # Com ``OUTBOX_DEDICATED_WORKER`` o envio corre em ``worker_message_outbox.py``.
             if USE_MESSAGE_OUTBOX:
-                process_message_outbox_tick(conn)
+                if not OUTBOX_DEDICATED_WORKER:
+                    process_message_outbox_tick(conn)
                 maybe_schedule_outbox_initial_batches(conn)
 
             # Pré-disparo determinístico para agendamentos de etapa (2-5 min antes)
@@ -2192,6 +2208,10 @@ def check_monitoring_leads(conn):
       - Check Chatwoot for replies/unread.
       - If reply: ABORT SNOOZE (Set 'stopped').
       - If safe: SNOOZE in Chatwoot + Schedule Next Step.
+    Estado por lead vai para a BD em lote (``bulk_update_campaign_leads``) a cada
+    ``SAFETY_BUFFER_FLUSH_EVERY`` leads e no fim; o snooze/resolve no Chatwoot só corre depois
+    do commit do lote, para um lote perdido não deixar conversas alteradas com o lead ainda em
+    'monitoring'.
     """
     buffer_time = datetime.now(BRAZIL_TZ) - timedelta(minutes=SAFETY_BUFFER_MINUTES)
     
@@ -2210,82 +2230,96 @@ def check_monitoring_leads(conn):
 
     print(f"🛡️ [Safety Buffer] Checking {len(monitoring_leads)} monitored leads...")
 
-    for lead in monitoring_leads:
-        lead_id = lead['id']
-        conv_id = lead['chatwoot_conversation_id']
-        
-        # If no Chatwoot conversation, try to discover it
-        if not conv_id:
-            conv_id = discover_chatwoot_conversation(lead['phone'], lead.get('name'))
-            if conv_id:
-                with conn.cursor() as cur:
-                    cur.execute("UPDATE campaign_leads SET chatwoot_conversation_id = %s WHERE id = %s", (conv_id, lead_id))
-                conn.commit()
-        
-        # 1. Check Chatwoot Context
-        cw_data = get_chatwoot_conversation_details(conv_id)
-        
-        abort_snooze = False
-        abort_reason = ""
+    lead_updates = []
+    chatwoot_toggles = []
+    next_step_delays = {}
 
-        if cw_data:
-            unread = cw_data.get('unread_count', 0)
-            status = cw_data.get('status')
-            if unread > 0:
-                abort_snooze = True
-                abort_reason = f"Unread count is {unread}"
+    def _flush():
+        if lead_updates:
+            with conn.cursor() as cur:
+                bulk_update_campaign_leads(cur, lead_updates)
+            conn.commit()
+            lead_updates.clear()
+        for conv_id, status, snoozed_until in chatwoot_toggles:
+            toggle_chatwoot_status(conv_id, status, snoozed_until=snoozed_until)
+        chatwoot_toggles.clear()
+
+    try:
+        for lead in monitoring_leads:
+            lead_id = lead['id']
+            conv_id = lead['chatwoot_conversation_id']
+
+            # If no Chatwoot conversation, try to discover it
+            if not conv_id:
+                conv_id = discover_chatwoot_conversation(lead['phone'], lead.get('name'))
+                if conv_id:
+                    lead_updates.append((lead_id, {'chatwoot_conversation_id': conv_id}))
+
+            # 1. Check Chatwoot Context
+            cw_data = get_chatwoot_conversation_details(conv_id)
+
+            abort_snooze = False
+            abort_reason = ""
+
+            if cw_data:
+                unread = cw_data.get('unread_count', 0)
+                status = cw_data.get('status')
+                if unread > 0:
+                    abort_snooze = True
+                    abort_reason = f"Unread count is {unread}"
+                else:
+                    messages = get_chatwoot_conversation_messages(conv_id)
+                    if messages:
+                        # Check last actual message (0=incoming, 1=outgoing)
+                        for msg in reversed(messages):
+                            mtype = msg.get('message_type')
+                            if mtype in [0, 1]:
+                                if mtype == 0:
+                                    abort_snooze = True
+                                    abort_reason = "Last message is from Contact"
+                                break
             else:
-                messages = get_chatwoot_conversation_messages(conv_id)
-                if messages:
-                    # Check last actual message (0=incoming, 1=outgoing)
-                    for msg in reversed(messages):
-                        mtype = msg.get('message_type')
-                        if mtype in [0, 1]:
-                            if mtype == 0:
-                                abort_snooze = True
-                                abort_reason = "Last message is from Contact"
-                            break
-        else:
-            if conv_id:
-                print(f"  ⚠️ Lead #{lead_id}: Could not fetch Chatwoot details. Proceeding with snooze.")
+                if conv_id:
+                    print(f"  ⚠️ Lead #{lead_id}: Could not fetch Chatwoot details. Proceeding with snooze.")
 
-        with conn.cursor() as cur:
             if abort_snooze:
-                cur.execute("""
-                    UPDATE campaign_leads SET cadence_status = 'stopped', log = %s WHERE id = %s
-                """, (f"Safety Buffer Abort: {abort_reason}", lead_id))
-                conn.commit()
+                lead_updates.append((lead_id, {
+                    'cadence_status': 'stopped',
+                    'log': f"Safety Buffer Abort: {abort_reason}",
+                }))
                 print(f"  🛑 Lead #{lead_id}: Snooze ABORTED. {abort_reason}")
             else:
                 # SAFE: Execute Snooze + Schedule Next Step
-                cur.execute("""
-                    SELECT delay_days FROM campaign_steps 
-                    WHERE campaign_id = %s AND step_number = %s
-                """, (lead['campaign_id'], lead['current_step'] + 1))
-                next_step_row = cur.fetchone()
-                
-                if next_step_row:
-                    delay = next_step_row['delay_days']
+                step_key = (lead['campaign_id'], lead['current_step'] + 1)
+                if step_key not in next_step_delays:
+                    with conn.cursor() as cur:
+                        cur.execute("""
+                            SELECT delay_days FROM campaign_steps 
+                            WHERE campaign_id = %s AND step_number = %s
+                        """, step_key)
+                        next_step_row = cur.fetchone()
+                    next_step_delays[step_key] = next_step_row['delay_days'] if next_step_row else False
+                delay = next_step_delays[step_key]
+
+                if delay is not False:
                     delay = 1 if delay is None else int(delay)
                     now_br = datetime.now(BRAZIL_TZ)
                     snooze_until = now_br + timedelta(minutes=2) if delay <= 0 else now_br + timedelta(days=delay)
-                    new_status = 'snoozed'
-                    
-                    cur.execute("""
-                        UPDATE campaign_leads 
-                        SET cadence_status = %s, snooze_until = %s 
-                        WHERE id = %s
-                    """, (new_status, snooze_until, lead_id))
-                    
-                    # Execute Chatwoot Snooze with timestamp
-                    toggle_chatwoot_status(conv_id, 'snoozed', snoozed_until=snooze_until)
-                    
+                    lead_updates.append((lead_id, {'cadence_status': 'snoozed', 'snooze_until': snooze_until}))
+
+                    # Chatwoot Snooze with timestamp (após o commit do lote)
+                    chatwoot_toggles.append((conv_id, 'snoozed', snooze_until))
+
                     print(f"  💤 Lead #{lead_id}: Safety Check passed. Snoozed until {snooze_until.strftime('%d/%m %H:%M')}.")
                 else:
-                    cur.execute("UPDATE campaign_leads SET cadence_status = 'completed' WHERE id = %s", (lead_id,))
-                    toggle_chatwoot_status(conv_id, 'resolved')
+                    lead_updates.append((lead_id, {'cadence_status': 'completed'}))
+                    chatwoot_toggles.append((conv_id, 'resolved', None))
                     print(f"  🏁 Lead #{lead_id}: Cadence completed.")
-            conn.commit()
+
+            if len(lead_updates) >= SAFETY_BUFFER_FLUSH_EVERY:
+                _flush()
+    finally:
+        _flush()
 
 
 def _parse_rollover_time(rollover_str):
@@ -2571,7 +2605,9 @@ def process_uazapi_initial_stage_rollovers(conn, campaigns_synced_this_tick=None
         ):
             if cid not in already_synced:
                 try:
-                    sync_campaign_leads_from_uazapi(conn, cid, token, folder_for_sync, uazapi_service)
+                    sync_campaign_leads_from_uazapi(
+                        conn, cid, token, folder_for_sync, uazapi_service, force_full=True
+                    )
                 except Exception as e:
                     print(
                         f"  ⚠️ [Uazapi Rollover] '{row['campaign_name']}' send_id={send_id}: "
@@ -3096,7 +3132,8 @@ def process_rollover_fu_next(
         try:
             sync_token = (instance.get('apikey') or '').strip() if instance else ''
             sync_campaign_leads_from_uazapi(
-                conn, cid, sync_token, campaign.get('uazapi_folder_id'), uazapi_service
+                conn, cid, sync_token, campaign.get('uazapi_folder_id'), uazapi_service,
+                force_full=True,
             )
         except Exception as e:
             print(f"  ⚠️ [Rollover {step_label}] Sync pré-decisão falhou: {e}")
@@ -3583,4 +3620,6 @@ def process_campaign_sends(campaign, conn):
         time.sleep(random.randint(20, 40))
 
 if __name__ == "__main__":
+    # SIGTERM (docker stop) → SystemExit, para o atexit drenar o buffer da auditoria JSONL.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     process_cadence()
@@ -12,24 +12,45 @@ import logging
 import os
 import random
 import re
+import select
+import signal
+import socket
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Any, Optional
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 
-from services.uazapi import UazapiService
+from services.uazapi import UazapiService, uazapi_circuit_breaker
 from utils.campaign_dispatch_audit import append_dispatch_audit_event
-from utils.config import SUPER_ADMIN_EMAILS, USE_MESSAGE_OUTBOX
-from utils.campaign_send_policy import uazapi_initial_chunk_distribution_limits
+from utils.config import OUTBOX_DEDICATED_WORKER, SUPER_ADMIN_EMAILS, USE_MESSAGE_OUTBOX
+from utils.campaign_send_policy import (
+    initial_chunk_daily_quota_allows,
+    uazapi_initial_chunk_distribution_limits,
+)
 from utils.limits import (
-    check_initial_chunk_daily_quota_for_campaign,
     get_user_daily_limit,
     initial_chunk_quota_snapshot,
 )
-from utils.next_valid_uazapi_send import is_campaign_send_window, next_valid_send_utc_naive
-from utils.outbox_prometheus import observe_campaign_outbox_send_attempt
+from utils.next_valid_uazapi_send import (
+    BRAZIL_TZ,
+    campaign_send_window_sql,
+    is_campaign_send_window,
+    next_valid_send_utc_naive,
+)
+from utils.outbox_archive import (
+    archive_finalized_outbox_rows,
+    compact_send_attempt_payloads,
+)
+from utils.outbox_prometheus import (
+    maybe_start_outbox_metrics_http_server,
+    observe_campaign_outbox_send_attempt,
+)
+from utils.outbox_sharding import owned_instance_ids
 from utils.uazapi_outbox_errors import classify_outbox_send_failure
 
 try:
@@ -53,8 +74,6 @@ def get_db_connection():
     return conn
 
 
-# Última instância servida no tick outbox (round-robin entre instâncias quando ``rotation_mode == round_robin``).
-_last_outbox_instance_id: Optional[int] = None
 # Throttle de logs de skip do agendamento automático (campaign_id, reason) → monotonic.
 _outbox_schedule_skip_logged_at: dict[tuple[int, str], float] = {}
 
@@ -73,6 +92,60 @@ _OUTBOX_STALE_PENDING_TTL_MINUTES = int(
 )
 _OUTBOX_RETRY_BASE_SEC = int(os.environ.get("UAZAPI_OUTBOX_RETRY_BASE_SECONDS", "30"))
 _OUTBOX_RETRY_MAX_SEC = int(os.environ.get("UAZAPI_OUTBOX_RETRY_MAX_SECONDS", "3600"))
+# Processo dedicado (``run_message_outbox_worker``): canal NOTIFY, espera máx./mín. e housekeeping.
+OUTBOX_NOTIFY_CHANNEL = "campaign_message_outbox"
+_OUTBOX_WORKER_MAX_SLEEP_SEC = max(
+    1, int(os.environ.get("UAZAPI_OUTBOX_WORKER_MAX_SLEEP_SECONDS", "30"))
+)
+_OUTBOX_WORKER_MIN_WAIT_SEC = 0.5
+# Reavaliação (s) de linhas vencidas mas bloqueadas por um envio ``sending`` de outro worker.
+_OUTBOX_WORKER_INFLIGHT_POLL_SEC = max(
+    1, int(os.environ.get("UAZAPI_OUTBOX_WORKER_INFLIGHT_POLL_SECONDS", "2"))
+)
+_OUTBOX_HOUSEKEEPING_SEC = max(
+    5, int(os.environ.get("UAZAPI_OUTBOX_HOUSEKEEPING_SECONDS", "30"))
+)
+# Intervalo mínimo (s) entre envios outbox na mesma instância, somado ao cooldown por campanha
+# (``campaigns.outbox_next_allowed_send_at``); 0 = sem gate por instância.
+_OUTBOX_INSTANCE_MIN_INTERVAL_SEC = max(
+    0, int(os.environ.get("UAZAPI_OUTBOX_INSTANCE_MIN_INTERVAL_SECONDS", "0"))
+)
+# Lanes de envio por tick (no máximo uma por ``instance_id``); 1 = um envio global por tick.
+_OUTBOX_MAX_PARALLEL_LANES = max(
+    1, int(os.environ.get("UAZAPI_OUTBOX_MAX_PARALLEL_LANES", "1"))
+)
+# Cache em processo de templates/mídia por campanha (chave ``outbox_content_version``) e da
+# flag superadmin por utilizador. O TTL cobre escritas que não incrementam a versão.
+_OUTBOX_CONTENT_CACHE_TTL_SEC = max(
+    0.0, float(os.environ.get("UAZAPI_OUTBOX_CONTENT_CACHE_TTL_SECONDS", "300"))
+)
+_OUTBOX_CONTENT_CACHE_MAX_ENTRIES = 1024
+_outbox_content_cache: dict[int, tuple[Any, float, dict]] = {}
+_outbox_superadmin_cache: dict[int, tuple[bool, float]] = {}
+# Ledger das cotas diárias de initial (TD-12) por campanha: snapshot de
+# ``initial_chunk_quota_snapshot`` recarregado após o TTL ou na virada do dia BRT e, entre
+# recargas, incrementado localmente a cada initial enviado com sucesso. Com shard ativo (outros
+# workers vivos) as contagens locais não veem os envios dos pares: recarrega a cada consulta.
+_OUTBOX_QUOTA_LEDGER_TTL_SEC = max(
+    0.0, float(os.environ.get("UAZAPI_OUTBOX_QUOTA_LEDGER_TTL_SECONDS", "60"))
+)
+_initial_quota_ledger: dict[int, dict] = {}
+# Identidade deste processo nos claims (``claimed_by``) e em ``outbox_workers``.
+OUTBOX_WORKER_ID = (os.environ.get("UAZAPI_OUTBOX_WORKER_ID") or "").strip() or (
+    f"{socket.gethostname()}:{os.getpid()}"
+)
+# Lease (s) de uma linha ``sending``: renovado pelo heartbeat do dono; expirado, o reaper
+# devolve a linha a ``pending`` (takeover rápido quando um nó morre).
+_OUTBOX_LEASE_SEC = max(15, int(os.environ.get("UAZAPI_OUTBOX_LEASE_SECONDS", "120")))
+# Intervalo (s) entre passagens de arquivo hot/cold + compactação de tentativas (housekeeping).
+_OUTBOX_ARCHIVE_INTERVAL_SEC = max(
+    60, int(os.environ.get("UAZAPI_OUTBOX_ARCHIVE_INTERVAL_SECONDS", "3600"))
+)
+# Lotes de arquivo por passagem (limita o tempo do housekeeping).
+_OUTBOX_ARCHIVE_MAX_BATCHES = 10
+_last_outbox_archive_mono: Optional[float] = None
+# Instâncias que cabem a este worker no anel (None = todas: único worker vivo).
+_outbox_shard_instance_ids: Optional[list[int]] = None
 
 
 def _outbox_retry_backoff_seconds(attempt_no: int) -> int:
@@ -174,84 +247,18 @@ def _campaign_dict_from_row(c: dict) -> dict:
 
 
 def _user_is_superadmin(conn, user_id: int) -> bool:
+    """Flag por utilizador (mídia só para superadmin); cacheada com o mesmo TTL dos templates."""
+    now = time.monotonic()
+    hit = _outbox_superadmin_cache.get(user_id)
+    if hit and now - hit[1] < _OUTBOX_CONTENT_CACHE_TTL_SEC:
+        return hit[0]
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("SELECT email FROM users WHERE id = %s", (user_id,))
         row = cur.fetchone()
-    return bool(row and row.get("email") in SUPER_ADMIN_EMAILS)
-
-
-def _outbox_csv_sort_key(row: dict) -> tuple:
-    ordv = row.get("csv_row_order")
-    try:
-        ord_i = int(ordv) if ordv is not None else int(row.get("campaign_lead_id") or 0)
-    except (TypeError, ValueError):
-        ord_i = int(row.get("campaign_lead_id") or 0)
-    nr = row.get("next_run_at")
-    nr_key = 0
-    if nr is not None:
-        try:
-            nr_key = int(nr.timestamp()) if hasattr(nr, "timestamp") else 0
-        except Exception:
-            nr_key = 0
-    return (
-        int(row.get("step_priority") or 0),
-        ord_i,
-        int(row.get("campaign_lead_id") or 0),
-        nr_key,
-        int(row.get("id") or 0),
-    )
-
-
-def _rotation_mode_round_robin(row: dict) -> bool:
-    rm = (row.get("rotation_mode") or "single").strip().lower()
-    return rm == "round_robin"
-
-
-def _outbox_rr_instance_tie_key(row: dict) -> tuple:
-    """
-    Critério de empate para rotação entre instâncias (Task 4 / ADR-O3):
-    mesma campanha, passo, posição CSV na fila e janela ``next_run_at`` — exclui
-    ``instance_id`` e ``id`` da outbox para permitir mais de uma linha elegível.
-    """
-    t = _outbox_csv_sort_key(row)
-    return (int(row.get("campaign_id") or 0), t[0], t[1], t[3])
-
-
-def _pick_instance_round_robin(front: list[dict]) -> dict:
-    """Entre linhas empatadas na ordenação RR, alterna ``instance_id`` (estado global)."""
-    global _last_outbox_instance_id
-    if len(front) == 1:
-        return front[0]
-    inst_ids = sorted({int(c["instance_id"]) for c in front})
-    if len(inst_ids) == 1:
-        return min(front, key=lambda x: int(x["id"]))
-    last = _last_outbox_instance_id
-    if last is None or last not in inst_ids:
-        target = inst_ids[0]
-    else:
-        idx = inst_ids.index(last)
-        target = inst_ids[(idx + 1) % len(inst_ids)]
-    matching = [c for c in front if int(c["instance_id"]) == target]
-    return min(matching, key=lambda x: int(x["id"]))
-
-
-def _choose_outbox_row(candidates: list[dict]) -> dict:
-    """
-    ADR-O3 / Task 4: ordem estrita por ``_outbox_csv_sort_key`` (csv_row_order + desempates).
-    Com ``rotation_mode == round_robin``, entre linhas empatadas no critério acima **e**
-    no empate de instância (``_outbox_rr_instance_tie_key``), alterna ``instance_id``.
-    """
-    candidates.sort(key=_outbox_csv_sort_key)
-    head = candidates[0]
-    hk = _outbox_csv_sort_key(head)
-    strict_front = [c for c in candidates if _outbox_csv_sort_key(c) == hk]
-    if len(strict_front) > 1 and _rotation_mode_round_robin(head):
-        return _pick_instance_round_robin(strict_front)
-    rk = _outbox_rr_instance_tie_key(head)
-    rr_front = [c for c in candidates if _outbox_rr_instance_tie_key(c) == rk]
-    if len(rr_front) > 1 and _rotation_mode_round_robin(head):
-        return _pick_instance_round_robin(rr_front)
-    return head
+    is_sa = bool(row and row.get("email") in SUPER_ADMIN_EMAILS)
+    _outbox_cache_prune(_outbox_superadmin_cache, now)
+    _outbox_superadmin_cache[user_id] = (is_sa, now)
+    return is_sa
 
 
 def _log_outbox_schedule_skip(campaign_id: int, reason: str) -> None:
@@ -374,9 +381,10 @@ def _recover_stale_pending_initial_outbox(conn, *, max_rows: int = 100) -> int:
         row = dict(row)
         cid = int(row["campaign_id"])
         camp_win = _campaign_dict_from_row(row)
-        if is_campaign_send_window(camp_win) and check_initial_chunk_daily_quota_for_campaign(
-            cid
-        ):
+        # Cota pelo ledger (uma consulta por campanha, não por linha).
+        if is_campaign_send_window(camp_win) and _initial_quota_view(
+            _initial_quota_entry(cid)
+        ).get("allows_more"):
             continue
         try:
             nv = next_valid_send_utc_naive(camp_win, now_utc, margin_minutes=0)
@@ -615,7 +623,7 @@ def schedule_next_initial_outbox_batch(
               AND COALESCE(cl.removed_from_funnel, FALSE) = FALSE
               AND COALESCE(cl.cadence_status, 'active') NOT IN ('converted', 'lost')
               AND NOT EXISTS (
-                  SELECT 1 FROM campaign_message_outbox o
+                  SELECT 1 FROM campaign_message_outbox_all o
                   WHERE o.campaign_lead_id = cl.id
                     AND LOWER(TRIM(o.stage)) = 'initial'
                     AND o.status IN ('pending', 'sending', 'sent')
@@ -670,48 +678,34 @@ def schedule_next_initial_outbox_batch(
                 """,
                 (cid,),
             )
-            for i, lr in enumerate(leads):
-                lead_id = int(lr["id"])
-                if rotation_mode == "round_robin":
-                    inst = instances[i % n_inst]
-                else:
-                    inst = instances[0]
-                instance_id = int(inst["instance_id"])
-                idempotency_key = f"campaign-{cid}-lead-{lead_id}-initial"
-                payload_summary = json.dumps(
-                    {
-                        "stage": "initial",
-                        "enqueue": "schedule_next_initial_outbox_batch",
-                        "rotation_mode": rotation_mode,
-                    },
-                    ensure_ascii=False,
-                )
-                queued_at_val = now_utc + timedelta(
-                    seconds=i // 1_000_000, microseconds=i % 1_000_000
-                )
-                cur.execute(
-                    """
-                    INSERT INTO campaign_message_outbox (
-                        campaign_id, campaign_lead_id, instance_id,
-                        stage, step_priority, status, queued_at,
-                        next_run_at, idempotency_key, payload_summary
-                    )
-                    VALUES (
-                        %s, %s, %s, 'initial', 0, 'pending',
-                        %s, %s, %s, %s::jsonb
+            payload_summary = json.dumps(
+                {
+                    "stage": "initial",
+                    "enqueue": "schedule_next_initial_outbox_batch",
+                    "rotation_mode": rotation_mode,
+                },
+                ensure_ascii=False,
+            )
+            n_inserted = insert_outbox_rows(
+                cur,
+                [
+                    outbox_enqueue_row(
+                        campaign_id=cid,
+                        lead_id=int(lr["id"]),
+                        instance_id=int(
+                            instances[i % n_inst if rotation_mode == "round_robin" else 0][
+                                "instance_id"
+                            ]
+                        ),
+                        stage="initial",
+                        position=i,
+                        queued_base=now_utc,
+                        next_run_at=next_run_at_val,
+                        payload_summary=payload_summary,
                     )
-                    ON CONFLICT (campaign_lead_id, stage) DO NOTHING
-                    """,
-                    (
-                        cid,
-                        lead_id,
-                        instance_id,
-                        queued_at_val,
-                        next_run_at_val,
-                        idempotency_key,
-                        payload_summary,
-                    ),
-                )
+                    for i, lr in enumerate(leads)
+                ],
+            )
             lead_ids_out = [int(lr["id"]) for lr in leads]
             cur.execute(
                 """
@@ -738,12 +732,13 @@ def schedule_next_initial_outbox_batch(
             {
                 "event": "schedule_next_initial_outbox_batch",
                 "campaign_id": cid,
-                "rows_enqueued": len(leads),
+                "rows_enqueued": n_inserted,
+                "leads_selected": len(leads),
             },
             ensure_ascii=False,
         )
     )
-    return len(leads), None
+    return n_inserted, None
 
 
 def diagnose_initial_outbox_enqueue(conn, campaign_id: int) -> dict:
@@ -756,7 +751,7 @@ def diagnose_initial_outbox_enqueue(conn, campaign_id: int) -> dict:
         cur.execute(
             """
             SELECT status, COUNT(*)::int AS n
-            FROM campaign_message_outbox
+            FROM campaign_message_outbox_all
             WHERE campaign_id = %s AND LOWER(TRIM(stage)) = 'initial'
             GROUP BY status
             """,
@@ -782,7 +777,7 @@ def diagnose_initial_outbox_enqueue(conn, campaign_id: int) -> dict:
               AND COALESCE(cl.removed_from_funnel, FALSE) = FALSE
               AND COALESCE(cl.cadence_status, 'active') NOT IN ('converted', 'lost')
               AND NOT EXISTS (
-                  SELECT 1 FROM campaign_message_outbox o
+                  SELECT 1 FROM campaign_message_outbox_all o
                   WHERE o.campaign_lead_id = cl.id
                     AND LOWER(TRIM(o.stage)) = 'initial'
                     AND o.status IN ('pending', 'sending', 'sent')
@@ -888,150 +883,210 @@ def maybe_schedule_outbox_initial_batches(conn) -> None:
             )
 
 
-def enqueue_missing_cadence_outbox_rows(conn) -> None:
+_STAGE_STEP_PRIORITY = {"initial": 0, "follow1": 1, "follow2": 2, "breakup": 3}
+# Linhas por página do ``execute_values`` no enfileiramento em lote.
+_OUTBOX_ENQUEUE_PAGE_SIZE = 1000
+
+
+def outbox_enqueue_row(
+    *,
+    campaign_id: int,
+    lead_id: int,
+    instance_id: int,
+    stage: str,
+    position: int,
+    queued_base: datetime,
+    next_run_at: datetime,
+    payload_summary: str,
+) -> tuple:
+    """
+    Tupla de ``insert_outbox_rows``. ``queued_at`` avança 1µs por ``position`` para preservar a
+    ordem de enfileiramento (CSV / chunk) no ``ORDER BY`` do claim.
+    """
+    st = (stage or "initial").strip().lower()
+    return (
+        int(campaign_id),
+        int(lead_id),
+        int(instance_id),
+        st,
+        _STAGE_STEP_PRIORITY.get(st, 0),
+        queued_base + timedelta(seconds=position // 1_000_000, microseconds=position % 1_000_000),
+        next_run_at,
+        f"campaign-{int(campaign_id)}-lead-{int(lead_id)}-{st}",
+        payload_summary,
+    )
+
+
+def insert_outbox_rows(cur, rows: list[tuple]) -> int:
+    """
+    INSERT em lote (``execute_values``, uma ida à BD por página) das tuplas de
+    ``outbox_enqueue_row``, com ``ON CONFLICT (campaign_lead_id, stage) DO NOTHING``. Pares
+    (lead, stage) já arquivados em ``campaign_message_outbox_history`` também são ignorados
+    (o índice único só cobre a fila viva).
+    Devolve quantas linhas foram de facto inseridas (``RETURNING id``; conflitos não contam).
+    """
+    if not rows:
+        return 0
+    inserted = execute_values(
+        cur,
+        """
+        INSERT INTO campaign_message_outbox (
+            campaign_id, campaign_lead_id, instance_id,
+            stage, step_priority, status, queued_at,
+            next_run_at, idempotency_key, payload_summary
+        )
+        SELECT v.campaign_id, v.campaign_lead_id, v.instance_id,
+               v.stage, v.step_priority, 'pending', v.queued_at,
+               v.next_run_at, v.idempotency_key, v.payload_summary
+        FROM (VALUES %s) AS v (
+            campaign_id, campaign_lead_id, instance_id, stage, step_priority,
+            queued_at, next_run_at, idempotency_key, payload_summary
+        )
+        WHERE NOT EXISTS (
+            SELECT 1 FROM campaign_message_outbox_history h
+            WHERE h.campaign_lead_id = v.campaign_lead_id AND h.stage = v.stage
+        )
+        ON CONFLICT (campaign_lead_id, stage) DO NOTHING
+        RETURNING id
+        """,
+        rows,
+        template=(
+            "(%s::integer, %s::integer, %s::integer, %s::text, %s::integer,"
+            " %s::timestamp, %s::timestamp, %s::text, %s::jsonb)"
+        ),
+        page_size=_OUTBOX_ENQUEUE_PAGE_SIZE,
+        fetch=True,
+    )
+    return len(inserted or [])
+
+
+def enqueue_missing_cadence_outbox_rows(conn) -> int:
     """
     Para campanhas Uazapi com fila outbox e ``enable_cadence``: enfileira follow1/follow2/breakup
     quando o lead já passou pelo buffer (snoozed) e ``snooze_until`` expirou.
     Ordem de inserção = ``csv_row_order`` (mesma hierarquia visual do Kanban).
+
+    Um único ``INSERT … SELECT`` cobre todas as campanhas e etapas: parte do índice parcial
+    ``idx_campaign_leads_snoozed_due`` (só leads vencidos), resolve passo/instâncias por
+    campanha no SQL e distribui em round-robin por ``ROW_NUMBER``. Devolve linhas inseridas.
     """
     if not USE_MESSAGE_OUTBOX:
-        return
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            """
-            SELECT c.id AS campaign_id, c.user_id,
-                   COALESCE(NULLIF(TRIM(c.rotation_mode), ''), 'single') AS rotation_mode
-            FROM campaigns c
-            WHERE c.status IN ('running', 'pending')
-              AND COALESCE(c.enable_cadence, FALSE) = TRUE
-              AND COALESCE(c.use_uazapi_sender, FALSE) = TRUE
-              AND EXISTS (SELECT 1 FROM campaign_message_outbox o WHERE o.campaign_id = c.id LIMIT 1)
-            """
-        )
-        campaigns = cur.fetchall() or []
-
-    base_utc = datetime.utcnow()
-    for camp in campaigns:
-        cid = int(camp["campaign_id"])
-        uid = int(camp["user_id"])
-        rotation_mode = (camp.get("rotation_mode") or "single").strip().lower()
-        if rotation_mode not in ("single", "round_robin"):
-            rotation_mode = "single"
-
+        return 0
+    stages_sql = ", ".join(
+        f"('{stage}', {lead_step}, {step_priority}, {msg_step})"
+        for stage, lead_step, step_priority, msg_step in _CADENCE_OUTBOX_STAGES
+    )
+    try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(
-                """
-                SELECT i.id AS instance_id, i.apikey
-                FROM campaign_instances ci
-                JOIN instances i ON i.id = ci.instance_id
-                WHERE ci.campaign_id = %s
-                  AND COALESCE(i.api_provider, 'megaapi') = 'uazapi'
-                  AND i.apikey IS NOT NULL
-                  AND TRIM(i.apikey) <> ''
-                ORDER BY i.id ASC
-                """,
-                (cid,),
-            )
-            instances = cur.fetchall() or []
-        if not instances:
-            continue
-        n_inst = len(instances)
-
-        for stage, lead_step, step_priority, msg_step in _CADENCE_OUTBOX_STAGES:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(
-                    """
-                    SELECT 1 FROM campaign_steps
-                    WHERE campaign_id = %s AND step_number = %s
-                    LIMIT 1
-                    """,
-                    (cid, msg_step),
-                )
-                if not cur.fetchone():
-                    continue
-
-                cur.execute(
-                    """
-                    SELECT cl.id, COALESCE(cl.csv_row_order, cl.id) AS ord_key
+                f"""
+                WITH stages (stage, lead_step, step_priority, msg_step) AS (
+                    VALUES {stages_sql}
+                ),
+                due AS (
+                    SELECT cl.id AS lead_id, cl.campaign_id, s.stage, s.step_priority,
+                           COALESCE(cl.csv_row_order, cl.id) AS ord_key,
+                           CASE WHEN LOWER(TRIM(COALESCE(c.rotation_mode, ''))) = 'round_robin'
+                                THEN 'round_robin' ELSE 'single' END AS rotation_mode
                     FROM campaign_leads cl
-                    WHERE cl.campaign_id = %s
-                      AND cl.current_step = %s
-                      AND cl.cadence_status = 'snoozed'
+                    JOIN stages s ON s.lead_step = cl.current_step
+                    JOIN campaigns c ON c.id = cl.campaign_id
+                    WHERE cl.cadence_status = 'snoozed'
                       AND cl.snooze_until IS NOT NULL
-                      AND cl.snooze_until <= NOW()
                       AND COALESCE(cl.removed_from_funnel, FALSE) = FALSE
-                      AND COALESCE(cl.cadence_status, '') NOT IN ('converted', 'lost')
+                      AND cl.snooze_until <= NOW()
+                      AND c.status IN ('running', 'pending')
+                      AND COALESCE(c.enable_cadence, FALSE) = TRUE
+                      AND COALESCE(c.use_uazapi_sender, FALSE) = TRUE
+                      AND EXISTS (
+                          SELECT 1 FROM campaign_message_outbox_all o0 WHERE o0.campaign_id = c.id
+                      )
+                      AND EXISTS (
+                          SELECT 1 FROM campaign_steps cs
+                          WHERE cs.campaign_id = c.id AND cs.step_number = s.msg_step
+                      )
                       AND NOT EXISTS (
-                          SELECT 1 FROM campaign_message_outbox o
+                          SELECT 1 FROM campaign_message_outbox_all o
                           WHERE o.campaign_lead_id = cl.id
-                            AND LOWER(TRIM(o.stage)) = LOWER(%s)
+                            AND LOWER(TRIM(o.stage)) = s.stage
                             AND o.status IN ('pending', 'sending', 'sent')
                       )
-                    ORDER BY COALESCE(cl.csv_row_order, cl.id) ASC, cl.id ASC
-                    """,
-                    (cid, lead_step, stage),
+                      -- Como em ``insert_outbox_rows``: o ON CONFLICT só vê a fila viva; uma linha
+                      -- (ex. ``failed``) já arquivada não pode voltar a enfileirar a etapa.
+                      AND NOT EXISTS (
+                          SELECT 1 FROM campaign_message_outbox_history h
+                          WHERE h.campaign_lead_id = cl.id AND h.stage = s.stage
+                      )
+                ),
+                inst AS (
+                    SELECT ci.campaign_id, ARRAY_AGG(i.id ORDER BY i.id) AS ids
+                    FROM campaign_instances ci
+                    JOIN instances i ON i.id = ci.instance_id
+                    WHERE ci.campaign_id IN (SELECT DISTINCT campaign_id FROM due)
+                      AND COALESCE(i.api_provider, 'megaapi') = 'uazapi'
+                      AND i.apikey IS NOT NULL
+                      AND TRIM(i.apikey) <> ''
+                    GROUP BY ci.campaign_id
+                ),
+                numbered AS (
+                    SELECT d.*, inst.ids,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY d.campaign_id, d.stage
+                               ORDER BY d.ord_key ASC, d.lead_id ASC
+                           ) - 1 AS pos
+                    FROM due d
+                    JOIN inst ON inst.campaign_id = d.campaign_id
                 )
-                leads_to_queue = cur.fetchall() or []
-
-            if not leads_to_queue:
-                continue
-
-            try:
-                with conn.cursor() as cur:
-                    for i, lr in enumerate(leads_to_queue):
-                        lead_id = int(lr["id"])
-                        if rotation_mode == "round_robin":
-                            inst = instances[i % n_inst]
-                        else:
-                            inst = instances[0]
-                        instance_id = int(inst["instance_id"])
-                        idempotency_key = f"campaign-{cid}-lead-{lead_id}-{stage}"
-                        payload_summary = json.dumps(
-                            {
-                                "stage": stage,
-                                "enqueue": "cadence_followup_auto",
-                                "rotation_mode": rotation_mode,
-                            },
-                            ensure_ascii=False,
-                        )
-                        queued_at = base_utc + timedelta(
-                            seconds=i // 1_000_000, microseconds=i % 1_000_000
-                        )
-                        cur.execute(
-                            """
-                            INSERT INTO campaign_message_outbox (
-                                campaign_id, campaign_lead_id, instance_id,
-                                stage, step_priority, status, queued_at,
-                                next_run_at, idempotency_key, payload_summary
-                            )
-                            VALUES (
-                                %s, %s, %s, %s, %s, 'pending', %s,
-                                NOW(), %s, %s::jsonb
-                            )
-                            ON CONFLICT (campaign_lead_id, stage) DO NOTHING
-                            """,
-                            (
-                                cid,
-                                lead_id,
-                                instance_id,
-                                stage,
-                                step_priority,
-                                queued_at,
-                                idempotency_key,
-                                payload_summary,
-                            ),
-                        )
-                conn.commit()
-            except Exception:
-                conn.rollback()
-                logger.exception(
-                    "enqueue_missing_cadence_outbox_rows failed campaign_id=%s stage=%s",
-                    cid,
-                    stage,
+                INSERT INTO campaign_message_outbox (
+                    campaign_id, campaign_lead_id, instance_id,
+                    stage, step_priority, status, queued_at,
+                    next_run_at, idempotency_key, payload_summary
                 )
+                SELECT n.campaign_id, n.lead_id,
+                       CASE WHEN n.rotation_mode = 'round_robin'
+                            THEN n.ids[1 + (n.pos %% CARDINALITY(n.ids))]
+                            ELSE n.ids[1] END,
+                       n.stage, n.step_priority, 'pending',
+                       %(queued_base)s::timestamp + n.pos * INTERVAL '1 microsecond',
+                       NOW(),
+                       'campaign-' || n.campaign_id || '-lead-' || n.lead_id || '-' || n.stage,
+                       jsonb_build_object(
+                           'stage', n.stage,
+                           'enqueue', 'cadence_followup_auto',
+                           'rotation_mode', n.rotation_mode
+                       )
+                FROM numbered n
+                ORDER BY n.campaign_id, n.stage, n.pos
+                ON CONFLICT (campaign_lead_id, stage) DO NOTHING
+                RETURNING campaign_id, stage
+                """,
+                {"queued_base": datetime.utcnow()},
+            )
+            inserted = cur.fetchall() or []
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        logger.exception("enqueue_missing_cadence_outbox_rows failed")
+        return 0
 
-
-_STAGE_STEP_PRIORITY = {"initial": 0, "follow1": 1, "follow2": 2, "breakup": 3}
+    if inserted:
+        per_campaign: dict[tuple[int, str], int] = {}
+        for r in inserted:
+            key = (int(r["campaign_id"]), str(r["stage"]))
+            per_campaign[key] = per_campaign.get(key, 0) + 1
+        for (cid, stage), n in sorted(per_campaign.items()):
+            logger.info(
+                json.dumps(
+                    {
+                        "event": "outbox_cadence_followup_enqueued",
+                        "campaign_id": cid,
+                        "stage": stage,
+                        "rows_enqueued": n,
+                    },
+                    ensure_ascii=False,
+                )
+            )
+    return len(inserted)
 
 
 def enqueue_outbox_rows_for_leads(
@@ -1044,58 +1099,39 @@ def enqueue_outbox_rows_for_leads(
     enqueue_source: str,
     next_run_at: Optional[datetime] = None,
     supersede_send_id: Optional[int] = None,
+    instance_ids: Optional[list[int]] = None,
 ) -> int:
     """
     Enfileira leads na outbox com idempotency_key estável (legado → outbox / materialize).
-    Retorna número de linhas inseridas (ON CONFLICT ignorado).
+    Com ``instance_ids`` os leads são distribuídos em round-robin por essas instâncias (o
+    ``instance_id`` é ignorado). Retorna número de linhas inseridas (ON CONFLICT ignorado).
     """
     if not USE_MESSAGE_OUTBOX or not lead_ids:
         return 0
     cid = int(campaign_id)
     st = (stage or "initial").strip().lower()
-    step_priority = _STAGE_STEP_PRIORITY.get(st, 0)
-    iid = int(instance_id)
+    rr_ids = [int(x) for x in (instance_ids or [])] or [int(instance_id)]
     now_utc = datetime.utcnow()
     nr = next_run_at if next_run_at is not None else now_utc
-    enqueued = 0
+    payload_summary = json.dumps(
+        {"stage": st, "enqueue": enqueue_source},
+        ensure_ascii=False,
+    )
+    rows = [
+        outbox_enqueue_row(
+            campaign_id=cid,
+            lead_id=lid,
+            instance_id=rr_ids[i % len(rr_ids)],
+            stage=st,
+            position=i,
+            queued_base=now_utc,
+            next_run_at=nr,
+            payload_summary=payload_summary,
+        )
+        for i, lid in enumerate(lead_ids)
+    ]
     with conn.cursor() as cur:
-        for i, lead_id in enumerate(lead_ids):
-            lid = int(lead_id)
-            idempotency_key = f"campaign-{cid}-lead-{lid}-{st}"
-            payload_summary = json.dumps(
-                {"stage": st, "enqueue": enqueue_source},
-                ensure_ascii=False,
-            )
-            queued_at_val = now_utc + timedelta(
-                seconds=i // 1_000_000, microseconds=i % 1_000_000
-            )
-            cur.execute(
-                """
-                INSERT INTO campaign_message_outbox (
-                    campaign_id, campaign_lead_id, instance_id,
-                    stage, step_priority, status, queued_at,
-                    next_run_at, idempotency_key, payload_summary
-                )
-                VALUES (
-                    %s, %s, %s, %s, %s, 'pending',
-                    %s, %s, %s, %s::jsonb
-                )
-                ON CONFLICT (campaign_lead_id, stage) DO NOTHING
-                """,
-                (
-                    cid,
-                    lid,
-                    iid,
-                    st,
-                    step_priority,
-                    queued_at_val,
-                    nr,
-                    idempotency_key,
-                    payload_summary,
-                ),
-            )
-            if cur.rowcount:
-                enqueued += 1
+        enqueued = insert_outbox_rows(cur, rows)
         if supersede_send_id is not None:
             cur.execute(
                 """
@@ -1228,7 +1264,7 @@ def reconcile_in_flight_legacy_initial_to_outbox(
                   AND COALESCE(cl.removed_from_funnel, FALSE) = FALSE
                   AND COALESCE(cl.cadence_status, 'active') NOT IN ('converted', 'lost')
                   AND NOT EXISTS (
-                      SELECT 1 FROM campaign_message_outbox o
+                      SELECT 1 FROM campaign_message_outbox_all o
                       WHERE o.campaign_lead_id = cl.id
                         AND LOWER(TRIM(o.stage)) = 'initial'
                         AND o.status IN ('pending', 'sending', 'sent')
@@ -1303,43 +1339,11 @@ def reconcile_in_flight_legacy_initial_to_outbox(
     return total
 
 
-def _defer_row_next_window(
-    conn,
-    outbox_id: int,
-    campaign_dict: dict,
-    *,
-    campaign_id: Optional[int] = None,
-    reason: str = "outside_send_window",
-) -> None:
-    try:
-        nv = next_valid_send_utc_naive(campaign_dict, datetime.utcnow(), margin_minutes=0)
-    except Exception:
-        nv = datetime.utcnow() + timedelta(minutes=30)
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            UPDATE campaign_message_outbox
-            SET next_run_at = %s, updated_at = NOW()
-            WHERE id = %s
-            """,
-            (nv, outbox_id),
-        )
-    logger.info(
-        json.dumps(
-            {
-                "event": "outbox_next_day_deferred",
-                "campaign_id": campaign_id,
-                "outbox_id": outbox_id,
-                "reason": reason,
-                "next_run_at": nv.isoformat(),
-            },
-            ensure_ascii=False,
-        )
-    )
-
-
 def _defer_initial_row_daily_quota(conn, row: dict) -> None:
-    """Adia envio initial para a próxima janela BRT quando a cota diária esgotou."""
+    """
+    Adia envio initial para a próxima janela BRT quando a cota diária esgotou. A linha já
+    vem claimada (``sending``) do ``_claim_outbox_batch`` — volta a ``pending``.
+    """
     row = dict(row)
     cd = _campaign_dict_from_row(row)
     cid = int(row["campaign_id"])
@@ -1353,13 +1357,13 @@ def _defer_initial_row_daily_quota(conn, row: dict) -> None:
         cur.execute(
             """
             UPDATE campaign_message_outbox
-            SET next_run_at = %s, updated_at = NOW()
-            WHERE id = %s AND status = 'pending'
+            SET status = 'pending', next_run_at = %s,
+                claimed_by = NULL, lease_expires_at = NULL, updated_at = NOW()
+            WHERE id = %s AND status IN ('pending', 'sending')
             """,
             (nv, oid),
         )
-    quota = initial_chunk_quota_snapshot(cid)
-    _log_outbox_daily_quota_reached(cid, quota)
+    _log_outbox_daily_quota_reached(cid, _initial_quota_view(_initial_quota_entry(cid)))
     logger.info(
         json.dumps(
             {
@@ -1380,64 +1384,175 @@ def _defer_row_retry_later(conn, outbox_id: int, minutes: int = 45) -> None:
         cur.execute(
             """
             UPDATE campaign_message_outbox
-            SET next_run_at = %s, updated_at = NOW()
-            WHERE id = %s
+            SET status = 'pending', next_run_at = %s,
+                claimed_by = NULL, lease_expires_at = NULL, updated_at = NOW()
+            WHERE id = %s AND status IN ('pending', 'sending')
             """,
             (nv, outbox_id),
         )
 
 
 def _reaper_stale_sending(conn) -> None:
-    if _REAPER_MINUTES <= 0:
-        return
+    """
+    Devolve a ``pending`` as linhas ``sending`` com lease expirado (dono morto ou sem
+    heartbeat). Linhas sem lease (claims antigos) mantêm o corte por idade
+    ``UAZAPI_OUTBOX_SENDING_REAPER_MINUTES`` (0 desliga só esse corte).
+    """
     with conn.cursor() as cur:
         cur.execute(
             """
             UPDATE campaign_message_outbox
             SET status = 'pending',
+                claimed_by = NULL,
+                lease_expires_at = NULL,
                 updated_at = NOW()
             WHERE status = 'sending'
-              AND updated_at < (NOW() - (%s * INTERVAL '1 minute'))
+              AND (
+                  lease_expires_at < NOW()
+                  OR (
+                      lease_expires_at IS NULL
+                      AND %s > 0
+                      AND updated_at < (NOW() - (%s * INTERVAL '1 minute'))
+                  )
+              )
             """,
-            (_REAPER_MINUTES,),
+            (_REAPER_MINUTES, _REAPER_MINUTES),
         )
 
 
+def _initial_quota_entry(campaign_id: int) -> dict:
+    """
+    Entrada do ledger da campanha; consulta a BD só na primeira vez, após o TTL ou se mudou o
+    dia BRT. Com shard ativo (vários workers) consulta sempre: o dono da campanha pode ter
+    instâncias noutros nós, que também gastam a cota do dia.
+    """
+    now = time.monotonic()
+    today = datetime.now(BRAZIL_TZ).date()
+    ttl = 0.0 if _outbox_shard_instance_ids is not None else _OUTBOX_QUOTA_LEDGER_TTL_SEC
+    entry = _initial_quota_ledger.get(campaign_id)
+    if (
+        entry
+        and entry["brt_date"] == today
+        and now - entry["loaded_at"] < ttl
+    ):
+        return entry
+    snap = initial_chunk_quota_snapshot(campaign_id)
+    entry = {
+        "snapshot": snap,
+        "user_id": snap.get("user_id"),
+        "sent_user_today": int(snap.get("sent_user_today") or 0),
+        "sent_campaign_today": int(snap.get("sent_campaign_today") or 0),
+        "loaded_at": now,
+        "brt_date": today,
+    }
+    _initial_quota_ledger[campaign_id] = entry
+    return entry
+
+
+def _initial_quota_view(entry: dict) -> dict:
+    """Snapshot com os contadores locais do ledger (mesmo formato de ``initial_chunk_quota_snapshot``)."""
+    snap = dict(entry["snapshot"])
+    if "plan_limit" not in snap:
+        return snap
+    snap["sent_user_today"] = entry["sent_user_today"]
+    snap["sent_campaign_today"] = entry["sent_campaign_today"]
+    snap["allows_more"] = initial_chunk_daily_quota_allows(
+        entry["sent_user_today"],
+        entry["sent_campaign_today"],
+        plan_daily_limit=snap["plan_limit"],
+        campaign_daily_limit=snap["campaign_cap"],
+        policy=snap.get("policy"),
+    )
+    return snap
+
+
+def _record_initial_quota_send(campaign_id: int) -> None:
+    """Conta um initial enviado no ledger: na campanha e em todas as entradas do mesmo dono."""
+    entry = _initial_quota_ledger.get(campaign_id)
+    if not entry:
+        return
+    entry["sent_campaign_today"] += 1
+    owner = entry.get("user_id")
+    for other in _initial_quota_ledger.values():
+        if owner is not None and other.get("user_id") == owner:
+            other["sent_user_today"] += 1
+    if owner is None:
+        entry["sent_user_today"] += 1
+
+
 def _passes_throttle_initial(c: dict) -> bool:
     if (c.get("stage") or "").lower() != "initial":
         return True
-    return check_initial_chunk_daily_quota_for_campaign(int(c["campaign_id"]))
+    return bool(_initial_quota_view(_initial_quota_entry(int(c["campaign_id"]))).get("allows_more"))
+
 
+def _outbox_cache_prune(cache: dict, now: float) -> None:
+    if len(cache) <= _OUTBOX_CONTENT_CACHE_MAX_ENTRIES:
+        return
+    for key in [k for k, v in cache.items() if now - v[1] >= _OUTBOX_CONTENT_CACHE_TTL_SEC]:
+        cache.pop(key, None)
+    if len(cache) > _OUTBOX_CONTENT_CACHE_MAX_ENTRIES:
+        cache.clear()
+
+
+def _load_campaign_send_content(conn, campaign_id: int, version: Any = None) -> dict:
+    """
+    Templates já parseados e mídia de todos os passos + ``campaigns.message_template``
+    (fallback do passo 1). Cache por campanha, válido enquanto ``outbox_content_version``
+    (devolvida no claim) não muda e dentro do TTL — com cache quente o envio não lê templates.
+    """
+    now = time.monotonic()
+    hit = _outbox_content_cache.get(campaign_id)
+    if hit and hit[0] == version and now - hit[1] < _OUTBOX_CONTENT_CACHE_TTL_SEC:
+        return hit[2]
 
-def _load_step_row(conn, campaign_id: int, step_number: int) -> dict:
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute(
             """
             SELECT step_number, message_template, media_path, media_type
             FROM campaign_steps
-            WHERE campaign_id = %s AND step_number = %s
-            LIMIT 1
+            WHERE campaign_id = %s
+            ORDER BY step_number, id
             """,
-            (campaign_id, step_number),
+            (campaign_id,),
         )
-        row = cur.fetchone()
-    return dict(row) if row else {}
+        step_rows = cur.fetchall() or []
+        cur.execute(
+            "SELECT message_template FROM campaigns WHERE id = %s LIMIT 1",
+            (campaign_id,),
+        )
+        crow = cur.fetchone() or {}
+
+    steps: dict[int, dict] = {}
+    for r in step_rows:
+        r = dict(r)
+        n = int(r["step_number"])
+        if n in steps:
+            continue
+        r["messages"] = _parse_message_template(r.get("message_template") or "")
+        steps[n] = r
+    content = {
+        "steps": steps,
+        "campaign_messages": _parse_message_template(crow.get("message_template") or ""),
+    }
+    _outbox_cache_prune(_outbox_content_cache, now)
+    _outbox_content_cache[campaign_id] = (version, now, content)
+    return content
+
+
+def _load_step_row(conn, campaign_id: int, step_number: int, version: Any = None) -> dict:
+    return _load_campaign_send_content(conn, campaign_id, version)["steps"].get(
+        int(step_number), {}
+    )
 
 
-def _pick_message_text(conn, campaign_id: int, step_number: int) -> str:
-    row = _load_step_row(conn, campaign_id, step_number)
-    raw = row.get("message_template") or ""
-    msgs = _parse_message_template(raw)
+def _pick_message_text(conn, campaign_id: int, step_number: int, version: Any = None) -> str:
+    content = _load_campaign_send_content(conn, campaign_id, version)
+    msgs = content["steps"].get(int(step_number), {}).get("messages") or []
     if msgs:
         return random.choice(msgs)
     if step_number == 1:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                "SELECT message_template FROM campaigns WHERE id = %s LIMIT 1",
-                (campaign_id,),
-            )
-            crow = cur.fetchone() or {}
-        msgs = _parse_message_template(crow.get("message_template") or "")
+        msgs = content["campaign_messages"]
         if msgs:
             return random.choice(msgs)
     return ""
@@ -1503,137 +1618,261 @@ def _apply_lead_success(
     )
 
 
-def process_message_outbox_tick(conn) -> None:
-    """
-    Um envio por tick (global). Feature flag ``USE_MESSAGE_OUTBOX`` (utils.config).
-    """
-    global _last_outbox_instance_id
+# Ordem ADR-O3 / Task 4 do claim: passo, posição CSV, e — só em ``rotation_mode =
+# round_robin`` — alternância de ``instance_id`` a partir da última instância servida entre
+# linhas empatadas (mesmo passo / posição / ``next_run_at``). Colunas calculadas em ``due``.
+_OUTBOX_CLAIM_ORDER_BY = (
+    "k_prio, k_ord, k_rr_next_run, k_rr_rotation, k_rr_instance, k_lead, k_next_run, id"
+)
 
-    if not USE_MESSAGE_OUTBOX:
-        return
-    if not uazapi_service:
-        return
 
-    _reaper_stale_sending(conn)
-    _recover_stale_pending_initial_outbox(conn)
-    conn.commit()
+# Predicados partilhados pelo claim e pela espera do worker dedicado (``o``/``c``/``i``):
+# linha ``pending`` de campanha ativa, instância Uazapi com token e no arco deste worker.
+_OUTBOX_CLAIMABLE_SQL = """(
+    o.status = 'pending'
+    AND c.status IN ('running', 'pending')
+    AND COALESCE(i.api_provider, 'megaapi') = 'uazapi'
+    AND COALESCE(TRIM(i.apikey), '') <> ''
+    AND (%(shard_instance_ids)s::int[] IS NULL
+         OR o.instance_id = ANY(%(shard_instance_ids)s::int[]))
+)"""
+
+# Campanha ou instância com envio em curso (``sending``, de qualquer nó): o claim salta a linha.
+_OUTBOX_INFLIGHT_BLOCKED_SQL = """(
+    EXISTS (
+        SELECT 1 FROM campaign_message_outbox s
+        WHERE s.status = 'sending' AND s.campaign_id = o.campaign_id
+    )
+    OR EXISTS (
+        SELECT 1 FROM campaign_message_outbox s
+        WHERE s.status = 'sending' AND s.instance_id = o.instance_id
+    )
+)"""
 
-    enqueue_missing_cadence_outbox_rows(conn)
-    reconcile_in_flight_legacy_initial_to_outbox(conn)
-    conn.commit()
 
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            """
-            SELECT o.id, o.campaign_id, o.campaign_lead_id, o.instance_id, o.stage, o.step_priority,
-                   o.queued_at, o.next_run_at, o.idempotency_key, o.payload_summary,
-                   c.user_id, c.enable_cadence, c.status AS campaign_status,
-                   COALESCE(NULLIF(TRIM(c.rotation_mode), ''), 'single') AS rotation_mode,
-                   c.send_hour_start, c.send_hour_end, c.send_saturday, c.send_sunday,
-                   c.scheduled_start, c.outbox_delay_min_seconds, c.outbox_delay_max_seconds,
-                   cl.phone, cl.name AS lead_name, cl.csv_row_order,
-                   i.apikey, i.name AS instance_name,
-                   COALESCE(i.api_provider, 'megaapi') AS api_provider
+def _claim_outbox_batch(conn, max_lanes: int) -> list[dict]:
+    """
+    Fase (A) set-based: um único ``UPDATE … RETURNING`` escolhe as linhas vencidas (janela
+    BRT, gates de cooldown, instância Uazapi com token), no máximo uma por campanha
+    (cooldown ADR-2) e uma por ``instance_id`` (pacing por número), até ``max_lanes``;
+    passa-as a ``sending`` e devolve o payload do envio. Commit antes do HTTP.
+
+    A escolha é por pares (campanha, instância): a melhor linha de cada par, percorridos pela
+    ordem do claim e aceites enquanto nem a campanha nem a instância já tiverem lane (emparelhamento
+    guloso). Assim uma campanha cuja melhor linha perde a instância para outra ainda ocupa uma
+    instância livre onde também tem linhas vencidas.
+
+    Dois claims concorrentes sobre a mesma linha não duplicam: o ``o.status = 'pending'``
+    é reavaliado após o lock da linha e o segundo simplesmente não a recebe. Com vários
+    workers, cada um só vê as instâncias do seu arco do anel (``_outbox_shard_instance_ids``)
+    e campanhas/instâncias com linha ``sending`` (de qualquer nó) ficam de fora; a linha sai
+    com ``claimed_by`` e ``lease_expires_at``.
+
+    Uma campanha pode ter instâncias em arcos diferentes, e o ``NOT EXISTS … 'sending'`` do
+    ``UPDATE`` lê um snapshot: dois workers veriam a campanha livre ao mesmo tempo. Por isso o
+    claim começa por trancar as campanhas candidatas (``FOR UPDATE OF c SKIP LOCKED``) e só
+    depois, noutro statement (snapshot novo, já com os ``sending`` de quem largou o lock), faz o
+    ``UPDATE`` restrito a essas campanhas. Os locks caem no commit, antes do HTTP.
+    """
+    rr = "LOWER(TRIM(COALESCE(c.rotation_mode, ''))) = 'round_robin'"
+    free = "NOT (k.campaign_id = ANY(l.campaign_ids) OR k.instance_id = ANY(l.instance_ids))"
+    due_where = f"""{_OUTBOX_CLAIMABLE_SQL}
+              AND o.next_run_at <= NOW()
+              AND (c.scheduled_start IS NULL OR c.scheduled_start <= NOW())
+              AND (c.outbox_next_allowed_send_at IS NULL OR c.outbox_next_allowed_send_at <= NOW())
+              AND (i.outbox_next_allowed_send_at IS NULL OR i.outbox_next_allowed_send_at <= NOW())
+              AND {campaign_send_window_sql("c")}
+              AND NOT {_OUTBOX_INFLIGHT_BLOCKED_SQL}"""
+    lock_sql = f"""
+        SELECT c.id
+        FROM campaigns c
+        WHERE EXISTS (
+            SELECT 1
+            FROM campaign_message_outbox o
+            JOIN instances i ON i.id = o.instance_id
+            WHERE o.campaign_id = c.id
+              AND {due_where}
+        )
+        FOR UPDATE OF c SKIP LOCKED
+    """
+    sql = f"""
+        WITH RECURSIVE due AS (
+            SELECT o.id, o.campaign_id, o.instance_id,
+                   o.step_priority AS k_prio,
+                   COALESCE(cl.csv_row_order, cl.id) AS k_ord,
+                   CASE WHEN {rr} THEN o.next_run_at END AS k_rr_next_run,
+                   CASE
+                       WHEN NOT {rr} THEN 0
+                       WHEN c.outbox_last_instance_id IS NULL
+                            OR o.instance_id > c.outbox_last_instance_id THEN 0
+                       ELSE 1
+                   END AS k_rr_rotation,
+                   CASE WHEN {rr} THEN o.instance_id END AS k_rr_instance,
+                   cl.id AS k_lead,
+                   o.next_run_at AS k_next_run
             FROM campaign_message_outbox o
             JOIN campaigns c ON c.id = o.campaign_id
             JOIN campaign_leads cl ON cl.id = o.campaign_lead_id
             JOIN instances i ON i.id = o.instance_id
+            WHERE o.campaign_id = ANY(%(campaign_ids)s::int[])
+              AND {due_where}
+        ),
+        pair_heads AS (
+            SELECT due.*,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY campaign_id, instance_id ORDER BY {_OUTBOX_CLAIM_ORDER_BY}
+                   ) AS rn_pair
+            FROM due
+        ),
+        candidates AS MATERIALIZED (
+            SELECT id, campaign_id, instance_id,
+                   ROW_NUMBER() OVER (ORDER BY {_OUTBOX_CLAIM_ORDER_BY}) AS pos
+            FROM pair_heads
+            WHERE rn_pair = 1
+        ),
+        lane_cap AS (
+            -- Pára o percurso assim que não cabe mais nenhuma lane (campanhas ou instâncias esgotadas).
+            SELECT LEAST(
+                %(max_lanes)s, COUNT(DISTINCT campaign_id), COUNT(DISTINCT instance_id)
+            ) AS n
+            FROM candidates
+        ),
+        lanes AS (
+            SELECT 0::bigint AS pos, ARRAY[]::int[] AS ids,
+                   ARRAY[]::int[] AS campaign_ids, ARRAY[]::int[] AS instance_ids
+            UNION ALL
+            SELECT k.pos,
+                   CASE WHEN {free} THEN l.ids || k.id ELSE l.ids END,
+                   CASE WHEN {free} THEN l.campaign_ids || k.campaign_id ELSE l.campaign_ids END,
+                   CASE WHEN {free} THEN l.instance_ids || k.instance_id ELSE l.instance_ids END
+            FROM lanes l
+            JOIN candidates k ON k.pos = l.pos + 1
+            CROSS JOIN lane_cap
+            WHERE cardinality(l.ids) < lane_cap.n
+        ),
+        picked AS (
+            SELECT UNNEST(ids) AS id
+            FROM (SELECT ids FROM lanes ORDER BY pos DESC LIMIT 1) last_lane
+        )
+        UPDATE campaign_message_outbox o
+        SET status = 'sending',
+            claimed_by = %(worker_id)s,
+            lease_expires_at = NOW() + (%(lease_sec)s * INTERVAL '1 second'),
+            updated_at = NOW()
+        FROM picked p, campaigns c, campaign_leads cl, instances i
+        WHERE o.id = p.id
+          AND o.status = 'pending'
+          AND c.id = o.campaign_id
+          AND cl.id = o.campaign_lead_id
+          AND i.id = o.instance_id
+        RETURNING o.id, o.campaign_id, o.campaign_lead_id, o.instance_id, o.stage, o.step_priority,
+                  o.queued_at, o.next_run_at, o.idempotency_key, o.payload_summary, o.attempt_count,
+                  c.user_id, c.enable_cadence, c.status AS campaign_status,
+                  c.outbox_content_version,
+                  COALESCE(NULLIF(TRIM(c.rotation_mode), ''), 'single') AS rotation_mode,
+                  c.send_hour_start, c.send_hour_end, c.send_saturday, c.send_sunday,
+                  c.scheduled_start, c.outbox_delay_min_seconds, c.outbox_delay_max_seconds,
+                  cl.phone, cl.name AS lead_name, cl.csv_row_order,
+                  i.apikey, i.name AS instance_name,
+                  COALESCE(i.api_provider, 'megaapi') AS api_provider
+    """
+    params = {"shard_instance_ids": _outbox_shard_instance_ids}
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(lock_sql, params)
+            campaign_ids = [int(r["id"]) for r in (cur.fetchall() or [])]
+            rows = []
+            if campaign_ids:
+                cur.execute(
+                    sql,
+                    {
+                        **params,
+                        "campaign_ids": campaign_ids,
+                        "max_lanes": max(1, int(max_lanes)),
+                        "worker_id": OUTBOX_WORKER_ID,
+                        "lease_sec": _OUTBOX_LEASE_SEC,
+                    },
+                )
+                rows = [dict(r) for r in (cur.fetchall() or [])]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        logger.exception("outbox_claim_batch_failed")
+        return []
+    return rows
+
+
+def _defer_campaigns_outside_send_window(conn, *, max_campaigns: int = 50) -> int:
+    """
+    Campanhas com linhas vencidas mas fora da janela BRT: avança o gate
+    ``campaigns.outbox_next_allowed_send_at`` para o próximo instante válido (um UPDATE por
+    campanha, sem reescrever a fila) — o claim e o sleep do worker dedicado deixam de as
+    ver como elegíveis até lá.
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            f"""
+            SELECT DISTINCT c.id, c.send_hour_start, c.send_hour_end,
+                   c.send_saturday, c.send_sunday
+            FROM campaign_message_outbox o
+            JOIN campaigns c ON c.id = o.campaign_id
             WHERE o.status = 'pending'
               AND o.next_run_at <= NOW()
               AND c.status IN ('running', 'pending')
               AND (c.scheduled_start IS NULL OR c.scheduled_start <= NOW())
-            ORDER BY o.step_priority ASC,
-                     COALESCE(cl.csv_row_order, cl.id) ASC,
-                     cl.id ASC,
-                     o.next_run_at ASC,
-                     o.id ASC
-            LIMIT 300
-            """
+              AND (c.outbox_next_allowed_send_at IS NULL OR c.outbox_next_allowed_send_at <= NOW())
+              AND NOT {campaign_send_window_sql("c")}
+            LIMIT %s
+            """,
+            (max_campaigns,),
         )
         rows = cur.fetchall() or []
 
-    if not rows:
-        return
-
-    in_window: list[dict] = []
     for r in rows:
-        r = dict(r)
-        cd = _campaign_dict_from_row(r)
-        if is_campaign_send_window(cd):
-            in_window.append(r)
-
-    if not in_window:
-        first = dict(rows[0])
-        _defer_row_next_window(
-            conn,
-            int(first["id"]),
-            _campaign_dict_from_row(first),
-            campaign_id=int(first["campaign_id"]),
-            reason="outside_send_window",
+        cid = int(r["id"])
+        try:
+            nv = next_valid_send_utc_naive(
+                _campaign_dict_from_row(r), datetime.utcnow(), margin_minutes=0
+            )
+        except ValueError:
+            nv = datetime.utcnow() + timedelta(minutes=30)
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE campaigns
+                SET outbox_next_allowed_send_at = GREATEST(outbox_next_allowed_send_at, %s)
+                WHERE id = %s
+                """,
+                (nv, cid),
+            )
+        logger.info(
+            json.dumps(
+                {
+                    "event": "outbox_next_day_deferred",
+                    "campaign_id": cid,
+                    "reason": "outside_send_window",
+                    "next_allowed_send_at": nv.isoformat(),
+                },
+                ensure_ascii=False,
+            )
         )
-        conn.commit()
-        return
+    return len(rows)
 
-    candidates: list[dict] = []
-    for r in in_window:
-        if r.get("api_provider") != "uazapi" or not (r.get("apikey") or "").strip():
-            continue
-        if not _passes_throttle_initial(r):
-            _defer_initial_row_daily_quota(conn, r)
-            conn.commit()
-            return
-        candidates.append(r)
-
-    if not candidates:
-        return
-
-    chosen = _choose_outbox_row(candidates)
 
+def _prepare_outbox_send(conn, chosen: dict) -> dict:
+    """
+    Leituras de BD necessárias ao envio (template, mídia, superadmin) — ficam na thread
+    principal para que a fase (B) não toque na conexão psycopg2.
+    """
     outbox_id = int(chosen["id"])
     campaign_id = int(chosen["campaign_id"])
-    lead_id = int(chosen["campaign_lead_id"])
     user_id = int(chosen["user_id"])
     stage = (chosen.get("stage") or "initial").lower()
     step_number = STAGE_TO_STEP_NUMBER.get(stage, 1)
     track_id = (chosen.get("idempotency_key") or "").strip() or f"outbox-{outbox_id}"
-    track_source = "campaign_message_outbox"
 
-    # --- (A) Claim curto ---
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """
-                SELECT id, status FROM campaign_message_outbox
-                WHERE id = %s AND status = 'pending'
-                FOR UPDATE SKIP LOCKED
-                """,
-                (outbox_id,),
-            )
-            lk = cur.fetchone()
-            if not lk:
-                conn.rollback()
-                return
-            cur.execute(
-                """
-                UPDATE campaign_message_outbox
-                SET status = 'sending', updated_at = NOW()
-                WHERE id = %s AND status = 'pending'
-                """,
-                (outbox_id,),
-            )
-            if cur.rowcount != 1:
-                conn.rollback()
-                return
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        return
-
-    _last_outbox_instance_id = int(chosen["instance_id"])
-
-    phone_num = _normalize_phone_e164_br(chosen.get("phone"))
-    token = (chosen.get("apikey") or "").strip()
-    message = _pick_message_text(conn, campaign_id, step_number)
+    content_version = chosen.get("outbox_content_version")
+    message = _pick_message_text(conn, campaign_id, step_number, content_version)
     lead_name = (chosen.get("lead_name") or "Visitante").strip()
     message = (
         message.replace("{{nome}}", lead_name)
@@ -1642,44 +1881,70 @@ def process_message_outbox_tick(conn) -> None:
         .replace("{name}", lead_name)
     )
 
-    step_row = _load_step_row(conn, campaign_id, step_number)
-    media_path = step_row.get("media_path") or ""
-    media_type = (step_row.get("media_type") or "image").lower()
-    is_sa = _user_is_superadmin(conn, user_id)
+    step_row = _load_step_row(conn, campaign_id, step_number, content_version)
+    return {
+        "chosen": chosen,
+        "outbox_id": outbox_id,
+        "campaign_id": campaign_id,
+        "lead_id": int(chosen["campaign_lead_id"]),
+        "user_id": user_id,
+        "step_number": step_number,
+        "phone_num": _normalize_phone_e164_br(chosen.get("phone")),
+        "token": (chosen.get("apikey") or "").strip(),
+        "message": message,
+        "media_path": step_row.get("media_path") or "",
+        "media_type": (step_row.get("media_type") or "image").lower(),
+        "is_sa": _user_is_superadmin(conn, user_id),
+        "track_id": track_id,
+        "track_source": "campaign_message_outbox",
+    }
+
+
+def _send_outbox_http(prep: dict) -> dict:
+    """
+    Fase (B): HTTP fora de transação; sem acesso ao BD (pode correr numa lane paralela).
+    Devolve os kwargs de resultado para ``_persist_outcome``.
+    """
+    phone_num = prep["phone_num"]
+    message = prep["message"]
+    media_path = prep["media_path"]
+    media_type = prep["media_type"]
+    track_id = prep["track_id"]
+    track_source = prep["track_source"]
 
     if not phone_num:
-        latency_ms = 0
-        _persist_outcome(
-            conn,
-            outbox_id=outbox_id,
-            campaign_id=campaign_id,
-            lead_id=lead_id,
-            chosen=chosen,
-            http_status=None,
-            response_body="missing_phone",
-            outcome="failed",
-            latency_ms=latency_ms,
-            success=False,
-            track_from_response=None,
-            audit_request={"kind": "none", "reason": "missing_phone"},
-            audit_response_body=None,
-        )
-        return
+        return {
+            "http_status": None,
+            "response_body": "missing_phone",
+            "outcome": "failed",
+            "latency_ms": 0,
+            "success": False,
+            "track_from_response": None,
+            "audit_request": {"kind": "none", "reason": "missing_phone"},
+            "audit_response_body": None,
+        }
+    # Instância com circuito aberto (desconectada / token revogado): volta a pending em backoff
+    # sem ler mídia nem esperar timeout.
+    if uazapi_circuit_breaker.state(prep["token"] or "") == "open":
+        return {
+            "http_status": None,
+            "response_body": "uazapi_circuit_open",
+            "outcome": "failed",
+            "latency_ms": 0,
+            "success": False,
+            "track_from_response": None,
+            "audit_request": {"kind": "none", "reason": "uazapi_circuit_open"},
+            "audit_response_body": None,
+        }
 
     started = time.monotonic()
-    http_status: Optional[int] = None
-    response_body: Optional[str] = None
-    result_json: Optional[dict] = None
-
-    audit_request: dict[str, Any]
-    # --- (B) HTTP fora de transação ---
     if (
         media_path
-        and is_sa
-        and _is_media_path_safe(media_path, user_id)
+        and prep["is_sa"]
+        and _is_media_path_safe(media_path, prep["user_id"])
         and os.path.exists(media_path)
     ):
-        audit_request = {
+        audit_request: dict[str, Any] = {
             "kind": "media",
             "number": phone_num,
             "media_type": media_type if media_type in ("image", "video") else "image",
@@ -1689,7 +1954,7 @@ def process_message_outbox_tick(conn) -> None:
             "track_source": track_source,
         }
         result_json = uazapi_service.send_media_campaign(
-            token,
+            prep["token"],
             phone_num or "",
             media_type if media_type in ("image", "video") else "image",
             media_path,
@@ -1697,32 +1962,23 @@ def process_message_outbox_tick(conn) -> None:
             track_id=track_id,
             track_source=track_source,
         )
-        http_status = 200 if result_json else None
-        response_body = json.dumps(result_json) if result_json else None
     else:
         if not message.strip():
-            latency_ms = int((time.monotonic() - started) * 1000)
-            _persist_outcome(
-                conn,
-                outbox_id=outbox_id,
-                campaign_id=campaign_id,
-                lead_id=lead_id,
-                chosen=chosen,
-                http_status=None,
-                response_body="missing_message_template",
-                outcome="failed",
-                latency_ms=latency_ms,
-                success=False,
-                track_from_response=None,
-                audit_request={
+            return {
+                "http_status": None,
+                "response_body": "missing_message_template",
+                "outcome": "failed",
+                "latency_ms": int((time.monotonic() - started) * 1000),
+                "success": False,
+                "track_from_response": None,
+                "audit_request": {
                     "kind": "text",
                     "reason": "missing_message_template",
                     "number": phone_num,
-                    "step_number": step_number,
+                    "step_number": prep["step_number"],
                 },
-                audit_response_body=None,
-            )
-            return
+                "audit_response_body": None,
+            }
         audit_request = {
             "kind": "text",
             "number": phone_num,
@@ -1731,33 +1987,285 @@ def process_message_outbox_tick(conn) -> None:
             "track_source": track_source,
         }
         result_json = uazapi_service.send_text_idempotent(
-            token,
+            prep["token"],
             phone_num or "",
             message,
             track_id=track_id,
             track_source=track_source,
         )
-        http_status = 200 if result_json else None
-        response_body = json.dumps(result_json) if result_json else None
 
-    latency_ms = int((time.monotonic() - started) * 1000)
+    http_status = 200 if result_json else None
+    response_body = json.dumps(result_json) if result_json else None
     success = bool(result_json)
+    return {
+        "http_status": http_status,
+        "response_body": response_body,
+        "outcome": "sent" if success else "failed",
+        "latency_ms": int((time.monotonic() - started) * 1000),
+        "success": success,
+        "track_from_response": (result_json or None),
+        "audit_request": audit_request,
+        "audit_response_body": result_json
+        if isinstance(result_json, dict)
+        else _truncate(response_body, 4000),
+    }
+
+
+def _send_outbox_lane(prep: dict) -> dict:
+    """
+    Uma lane da fase (B): exceção inesperada vira resultado ``failed`` (transitório) para a
+    fase (C) persistir, em vez de derrubar as outras lanes e deixar as linhas em ``sending``.
+    """
+    try:
+        return _send_outbox_http(prep)
+    except Exception as e:
+        logger.exception(
+            json.dumps(
+                {
+                    "event": "outbox_lane_failed",
+                    "outbox_id": prep.get("outbox_id"),
+                    "campaign_id": prep.get("campaign_id"),
+                    "error": type(e).__name__,
+                },
+                ensure_ascii=False,
+            )
+        )
+        return {
+            "http_status": None,
+            "response_body": _truncate(f"outbox_lane_exception: {type(e).__name__}: {e}"),
+            "outcome": "failed",
+            "latency_ms": 0,
+            "success": False,
+            "track_from_response": None,
+            "audit_request": {"kind": "none", "reason": "outbox_lane_exception"},
+            "audit_response_body": None,
+        }
+
+
+def _run_outbox_lanes(preps: list[dict]) -> list[dict]:
+    """Executa a fase (B) das lanes — em paralelo quando há mais de uma."""
+    if len(preps) <= 1:
+        return [_send_outbox_lane(p) for p in preps]
+    with ThreadPoolExecutor(
+        max_workers=len(preps), thread_name_prefix="outbox-lane"
+    ) as pool:
+        return list(pool.map(_send_outbox_lane, preps))
 
-    _persist_outcome(
-        conn,
-        outbox_id=outbox_id,
-        campaign_id=campaign_id,
-        lead_id=lead_id,
-        chosen=chosen,
-        http_status=http_status,
-        response_body=response_body,
-        outcome="sent" if success else "failed",
-        latency_ms=latency_ms,
-        success=success,
-        track_from_response=(result_json or None),
-        audit_request=audit_request,
-        audit_response_body=result_json if isinstance(result_json, dict) else _truncate(response_body, 4000),
-    )
+
+def _outbox_worker_heartbeat(conn) -> Optional[list[int]]:
+    """
+    Regista este processo em ``outbox_workers``, renova o lease das suas linhas ``sending`` e
+    recalcula o shard de instâncias (hash consistente entre os workers com heartbeat dentro do
+    lease). Com um só worker vivo o shard fica None (todas as instâncias). Devolve o shard.
+    """
+    global _outbox_shard_instance_ids
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            INSERT INTO outbox_workers (worker_id, hostname, pid, started_at, heartbeat_at)
+            VALUES (%s, %s, %s, NOW(), NOW())
+            ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = NOW()
+            """,
+            (OUTBOX_WORKER_ID, socket.gethostname(), os.getpid()),
+        )
+        cur.execute(
+            """
+            UPDATE campaign_message_outbox
+            SET lease_expires_at = NOW() + (%s * INTERVAL '1 second')
+            WHERE status = 'sending' AND claimed_by = %s
+            """,
+            (_OUTBOX_LEASE_SEC, OUTBOX_WORKER_ID),
+        )
+        cur.execute(
+            """
+            DELETE FROM outbox_workers
+            WHERE heartbeat_at < NOW() - (%s * INTERVAL '1 second')
+            """,
+            (_OUTBOX_LEASE_SEC * 10,),
+        )
+        cur.execute(
+            """
+            SELECT worker_id FROM outbox_workers
+            WHERE heartbeat_at >= NOW() - (%s * INTERVAL '1 second')
+            """,
+            (_OUTBOX_LEASE_SEC,),
+        )
+        live = [str(r["worker_id"]) for r in (cur.fetchall() or [])]
+        shard: Optional[list[int]] = None
+        if any(w != OUTBOX_WORKER_ID for w in live):
+            cur.execute(
+                """
+                SELECT id FROM instances
+                WHERE COALESCE(api_provider, 'megaapi') = 'uazapi'
+                """
+            )
+            shard = owned_instance_ids(
+                OUTBOX_WORKER_ID, live, [int(r["id"]) for r in (cur.fetchall() or [])]
+            )
+    conn.commit()
+
+    if shard != _outbox_shard_instance_ids:
+        logger.info(
+            json.dumps(
+                {
+                    "event": "outbox_shard_changed",
+                    "worker_id": OUTBOX_WORKER_ID,
+                    "live_workers": len(live),
+                    "instances": None if shard is None else len(shard),
+                },
+                ensure_ascii=False,
+            )
+        )
+    _outbox_shard_instance_ids = shard
+    return shard
+
+
+def _unregister_outbox_worker(conn) -> None:
+    """Saída limpa: remove o registo para os outros nós reassumirem o shard já no próximo heartbeat."""
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM outbox_workers WHERE worker_id = %s", (OUTBOX_WORKER_ID,))
+    conn.commit()
+
+
+def _outbox_heartbeat_loop(stop: threading.Event) -> None:
+    """Thread do worker dedicado: heartbeat a cada ``lease / 3`` numa conexão própria."""
+    conn = None
+    while True:
+        try:
+            if conn is None:
+                conn = get_db_connection()
+            _outbox_worker_heartbeat(conn)
+        except Exception:
+            logger.exception("outbox_worker_heartbeat_failed")
+            try:
+                if conn is not None:
+                    conn.close()
+            except Exception:
+                pass
+            conn = None
+        if stop.wait(max(5.0, _OUTBOX_LEASE_SEC / 3.0)):
+            break
+    try:
+        if conn is None:
+            conn = get_db_connection()
+        _unregister_outbox_worker(conn)
+    except Exception:
+        logger.exception("outbox_worker_unregister_failed")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def _maybe_archive_outbox(conn) -> None:
+    """Arquivo hot/cold + compactação, no máximo a cada ``UAZAPI_OUTBOX_ARCHIVE_INTERVAL_SECONDS``."""
+    global _last_outbox_archive_mono
+
+    now_mono = time.monotonic()
+    if (
+        _last_outbox_archive_mono is not None
+        and now_mono - _last_outbox_archive_mono < _OUTBOX_ARCHIVE_INTERVAL_SEC
+    ):
+        return
+    _last_outbox_archive_mono = now_mono
+    for _ in range(_OUTBOX_ARCHIVE_MAX_BATCHES):
+        if archive_finalized_outbox_rows(conn) == 0:
+            break
+    compact_send_attempt_payloads(conn)
+
+
+def _outbox_housekeeping(conn) -> None:
+    """
+    Reaper de ``sending``, recuperação de initial stale, enfileiramento de follow-ups e
+    (espaçado) arquivo das linhas finalizadas.
+    """
+    _reaper_stale_sending(conn)
+    _recover_stale_pending_initial_outbox(conn)
+    conn.commit()
+
+    enqueue_missing_cadence_outbox_rows(conn)
+    reconcile_in_flight_legacy_initial_to_outbox(conn)
+    conn.commit()
+
+    try:
+        _maybe_archive_outbox(conn)
+    except Exception:
+        conn.rollback()
+        logger.exception("outbox_archive_housekeeping_failed")
+
+
+def process_message_outbox_tick(conn) -> None:
+    """
+    Feature flag ``USE_MESSAGE_OUTBOX`` (utils.config). Por tick envia até
+    ``UAZAPI_OUTBOX_MAX_PARALLEL_LANES`` mensagens (default 1), no máximo uma por instância;
+    (A) claims → (B) HTTP das lanes em paralelo → (C) ``_persist_outcome`` na thread principal.
+    """
+    if not USE_MESSAGE_OUTBOX:
+        return
+    if not uazapi_service:
+        return
+
+    _outbox_worker_heartbeat(conn)
+    _outbox_housekeeping(conn)
+    dispatch_message_outbox(conn)
+
+
+def dispatch_message_outbox(conn) -> int:
+    """
+    Só a parte de envio do tick (sem housekeeping). Devolve o número de linhas claimadas
+    e persistidas — 0 quando não havia nada elegível agora.
+    """
+    # Gate das campanhas fora da janela BRT: a cada tick, haja ou não linhas para claimar
+    # (senão uma campanha fora da janela só era adiada quando a fila inteira estava parada).
+    _defer_campaigns_outside_send_window(conn)
+    conn.commit()
+
+    # --- (A) Claim set-based: até uma lane por instância / campanha ---
+    claimed = _claim_outbox_batch(conn, _OUTBOX_MAX_PARALLEL_LANES)
+    if not claimed:
+        return 0
+
+    preps: list[dict] = []
+    for chosen in claimed:
+        if not _passes_throttle_initial(chosen):
+            _defer_initial_row_daily_quota(conn, chosen)
+            conn.commit()
+            continue
+        try:
+            preps.append(_prepare_outbox_send(conn, chosen))
+        except Exception:
+            # Linha já claimada: devolve-a a ``pending`` em vez de a deixar ``sending`` até ao
+            # reaper; as outras linhas do lote seguem.
+            conn.rollback()
+            logger.exception(
+                json.dumps(
+                    {
+                        "event": "outbox_prepare_failed",
+                        "outbox_id": chosen.get("id"),
+                        "campaign_id": chosen.get("campaign_id"),
+                    },
+                    ensure_ascii=False,
+                )
+            )
+            _defer_row_retry_later(conn, int(chosen["id"]), minutes=15)
+            conn.commit()
+    if not preps:
+        return 0
+
+    # --- (B) HTTP fora de transação ---
+    results = _run_outbox_lanes(preps)
+
+    # --- (C) Persistência sequencial na conexão do tick ---
+    for prep, res in zip(preps, results):
+        _persist_outcome(
+            conn,
+            outbox_id=prep["outbox_id"],
+            campaign_id=prep["campaign_id"],
+            lead_id=prep["lead_id"],
+            chosen=prep["chosen"],
+            **res,
+        )
+    return len(preps)
 
 
 def _persist_outcome(
@@ -1794,13 +2302,6 @@ def _persist_outcome(
     if not track_stored:
         track_stored = (chosen.get("idempotency_key") or "") or None
 
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            "SELECT COALESCE(MAX(attempt_no), 0) AS m FROM campaign_send_attempts WHERE outbox_id = %s",
-            (outbox_id,),
-        )
-        attempt_no = int((cur.fetchone() or {}).get("m") or 0) + 1
-
     result_json_classify = _result_json_for_classify(response_body, audit_response_body)
     if success:
         attempt_row_outcome = outcome
@@ -1817,35 +2318,60 @@ def _persist_outcome(
             else "retry_scheduled"
         )
 
+    # Estado da linha + tentativa num único statement: ``attempt_count`` incrementa de forma
+    # atómica e o ``attempt_no`` sai dele (sem MAX(attempt_no) antes de cada INSERT). Só grava
+    # se o claim ainda é deste worker (lease não foi retomado por outro nó).
+    if success:
+        outbox_set_sql = "status = 'sent', uazapi_track_id = %(track_id)s"
+    elif attempt_row_outcome == "failed_terminal":
+        outbox_set_sql = "status = 'failed'"
+    else:
+        outbox_set_sql = (
+            "status = 'pending', next_run_at = NOW() + (%(retry_delay_sec)s * INTERVAL '1 second')"
+        )
+    retry_delay_sec = _outbox_retry_backoff_seconds(int(chosen.get("attempt_count") or 0) + 1)
+
     try:
-        with conn.cursor() as cur:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(
-                """
+                f"""
+                WITH bumped AS (
+                    UPDATE campaign_message_outbox
+                    SET attempt_count = attempt_count + 1,
+                        {outbox_set_sql},
+                        claimed_by = NULL,
+                        lease_expires_at = NULL,
+                        updated_at = NOW()
+                    WHERE id = %(outbox_id)s
+                      AND (claimed_by IS NULL OR claimed_by = %(worker_id)s)
+                    RETURNING id, attempt_count
+                )
                 INSERT INTO campaign_send_attempts
                     (outbox_id, attempt_no, http_status, uazapi_response, outcome, latency_ms, finished_at)
-                VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                SELECT id, attempt_count, %(http_status)s, %(uazapi_response)s, %(outcome)s,
+                       %(latency_ms)s, NOW()
+                FROM bumped
+                RETURNING attempt_no
                 """,
-                (
-                    outbox_id,
-                    attempt_no,
-                    http_status,
-                    _truncate(response_body),
-                    attempt_row_outcome,
-                    latency_ms,
-                ),
+                {
+                    "outbox_id": outbox_id,
+                    "worker_id": OUTBOX_WORKER_ID,
+                    "track_id": track_stored,
+                    "retry_delay_sec": retry_delay_sec,
+                    "http_status": http_status,
+                    "uazapi_response": _truncate(response_body),
+                    "outcome": attempt_row_outcome,
+                    "latency_ms": latency_ms,
+                },
             )
+            attempt_row = cur.fetchone()
+            if not attempt_row:
+                raise RuntimeError(
+                    f"campaign_message_outbox {outbox_id} not found or claimed by another worker"
+                )
+            attempt_no = int(attempt_row["attempt_no"])
 
             if success:
-                cur.execute(
-                    """
-                    UPDATE campaign_message_outbox
-                    SET status = 'sent',
-                        uazapi_track_id = %s,
-                        updated_at = NOW()
-                    WHERE id = %s
-                    """,
-                    (track_stored, outbox_id),
-                )
                 _apply_lead_success(
                     cur,
                     campaign_id=campaign_id,
@@ -1854,52 +2380,35 @@ def _persist_outcome(
                     instance_name=instance_name,
                     enable_cadence=enable_cadence,
                 )
-                cur.execute(
-                    """
-                    UPDATE campaigns
-                    SET sent_today = COALESCE(sent_today, 0) + 1
-                    WHERE id = %s
-                    """,
-                    (campaign_id,),
-                )
-
+                # Cooldown ADR-2 no gate da campanha (1 linha), não em cada ``pending`` da fila.
                 dmin = int(chosen.get("outbox_delay_min_seconds") or 600)
                 dmax = int(chosen.get("outbox_delay_max_seconds") or 900)
                 lo, hi = min(dmin, dmax), max(dmin, dmax)
                 delta_sec = random.randint(lo, hi)
                 cur.execute(
                     """
-                    UPDATE campaign_message_outbox
-                    SET next_run_at = GREATEST(next_run_at, NOW() + (%s * INTERVAL '1 second')),
-                        updated_at = NOW()
-                    WHERE campaign_id = %s
-                      AND status = 'pending'
-                      AND id <> %s
+                    UPDATE campaigns
+                    SET sent_today = COALESCE(sent_today, 0) + 1,
+                        outbox_next_allowed_send_at = GREATEST(
+                            outbox_next_allowed_send_at,
+                            NOW() + (%s * INTERVAL '1 second')
+                        ),
+                        outbox_last_instance_id = %s
+                    WHERE id = %s
                     """,
-                    (delta_sec, campaign_id, outbox_id),
+                    (delta_sec, int(chosen.get("instance_id") or 0) or None, campaign_id),
                 )
-            else:
-                if attempt_row_outcome == "failed_terminal":
+                if _OUTBOX_INSTANCE_MIN_INTERVAL_SEC > 0:
                     cur.execute(
                         """
-                        UPDATE campaign_message_outbox
-                        SET status = 'failed',
-                            updated_at = NOW()
-                        WHERE id = %s
-                        """,
-                        (outbox_id,),
-                    )
-                else:
-                    delay_sec = _outbox_retry_backoff_seconds(attempt_no)
-                    cur.execute(
-                        """
-                        UPDATE campaign_message_outbox
-                        SET status = 'pending',
-                            next_run_at = NOW() + (%s * INTERVAL '1 second'),
-                            updated_at = NOW()
+                        UPDATE instances
+                        SET outbox_next_allowed_send_at = GREATEST(
+                            outbox_next_allowed_send_at,
+                            NOW() + (%s * INTERVAL '1 second')
+                        )
                         WHERE id = %s
                         """,
-                        (delay_sec, outbox_id),
+                        (_OUTBOX_INSTANCE_MIN_INTERVAL_SEC, int(chosen.get("instance_id") or 0)),
                     )
 
         conn.commit()
@@ -1941,6 +2450,7 @@ def _persist_outcome(
                 outbox_id,
             )
         if success and stage == "initial":
+            _record_initial_quota_send(campaign_id)
             _try_schedule_next_initial_outbox_after_batch(conn, campaign_id)
     except Exception as e:
         conn.rollback()
@@ -1967,19 +2477,171 @@ def _persist_outcome(
                 cur.execute(
                     """
                     UPDATE campaign_message_outbox
-                    SET status = 'pending', updated_at = NOW()
+                    SET status = 'pending', claimed_by = NULL, lease_expires_at = NULL,
+                        updated_at = NOW()
                     WHERE id = %s AND status = 'sending'
+                      AND (claimed_by IS NULL OR claimed_by = %s)
                     """,
-                    (outbox_id,),
+                    (outbox_id, OUTBOX_WORKER_ID),
                 )
             conn.commit()
         except Exception:
             conn.rollback()
 
 
-if __name__ == "__main__":
-    c = get_db_connection()
+def _seconds_until_next_outbox_due(conn) -> Optional[float]:
+    """
+    Segundos até a próxima linha que o claim deste worker pode apanhar ficar elegível
+    (``next_run_at`` e gates de cooldown da campanha/instância); None sem trabalho pendente.
+
+    Usa os mesmos predicados do ``_claim_outbox_batch`` (arco do anel, token). Linhas
+    bloqueadas por um envio em curso noutro nó não contam como vencidas já: o fim desse envio
+    não gera NOTIFY, por isso voltam a ser vistas ao fim de ``_OUTBOX_WORKER_INFLIGHT_POLL_SEC``.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT EXTRACT(EPOCH FROM (
+                MIN(GREATEST(
+                    o.next_run_at,
+                    c.scheduled_start,
+                    c.outbox_next_allowed_send_at,
+                    i.outbox_next_allowed_send_at,
+                    CASE WHEN {_OUTBOX_INFLIGHT_BLOCKED_SQL}
+                         THEN NOW() + (%(inflight_poll_sec)s * INTERVAL '1 second')
+                    END
+                )) - NOW()
+            ))
+            FROM campaign_message_outbox o
+            JOIN campaigns c ON c.id = o.campaign_id
+            JOIN instances i ON i.id = o.instance_id
+            WHERE {_OUTBOX_CLAIMABLE_SQL}
+            """,
+            {
+                "shard_instance_ids": _outbox_shard_instance_ids,
+                "inflight_poll_sec": _OUTBOX_WORKER_INFLIGHT_POLL_SEC,
+            },
+        )
+        row = cur.fetchone()
+    if not row or row[0] is None:
+        return None
+    return float(row[0])
+
+
+def _outbox_wait_timeout(seconds_until_due: Optional[float]) -> float:
+    """Espera limitada a [``_OUTBOX_WORKER_MIN_WAIT_SEC``, ``_OUTBOX_WORKER_MAX_SLEEP_SEC``]."""
+    if seconds_until_due is None:
+        return float(_OUTBOX_WORKER_MAX_SLEEP_SEC)
+    return max(
+        float(_OUTBOX_WORKER_MIN_WAIT_SEC),
+        min(float(_OUTBOX_WORKER_MAX_SLEEP_SEC), float(seconds_until_due)),
+    )
+
+
+def _open_outbox_listen_connection():
+    """Conexão dedicada em autocommit com ``LISTEN`` no canal da outbox."""
+    conn = get_db_connection()
+    conn.commit()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {OUTBOX_NOTIFY_CHANNEL}")
+    return conn
+
+
+def _wait_for_outbox_notify(listen_conn, timeout: float) -> bool:
+    """Bloqueia até ``NOTIFY`` ou ``timeout``; devolve True se houve notificação."""
+    if select.select([listen_conn], [], [], max(0.0, timeout)) == ([], [], []):
+        return False
+    listen_conn.poll()
+    woke = bool(listen_conn.notifies)
+    del listen_conn.notifies[:]
+    return woke
+
+
+def run_message_outbox_worker() -> None:
+    """
+    Processo dedicado da outbox (``python worker_message_outbox.py``): envia logo que há linha
+    elegível, acordado por ``NOTIFY campaign_message_outbox`` (trigger em ``init_db``) ou pelo
+    próximo ``next_run_at`` / gate de cooldown. Housekeeping corre a cada
+    ``UAZAPI_OUTBOX_HOUSEKEEPING_SECONDS``. Com ``UAZAPI_OUTBOX_DEDICATED_WORKER=1`` o
+    ``worker_cadence`` deixa de chamar ``process_message_outbox_tick``.
+
+    Vários processos podem correr em paralelo (nós diferentes): cada um mantém heartbeat e
+    lease numa thread própria e só reclama as instâncias do seu shard.
+    """
+    if not USE_MESSAGE_OUTBOX or not uazapi_service:
+        logger.warning("worker_message_outbox: USE_MESSAGE_OUTBOX desligado ou Uazapi indisponível")
+        return
+    if not OUTBOX_DEDICATED_WORKER:
+        logger.warning(
+            "worker_message_outbox: UAZAPI_OUTBOX_DEDICATED_WORKER=0 — o worker_cadence também "
+            "despacha a outbox; ligue a flag nos dois processos."
+        )
+    maybe_start_outbox_metrics_http_server()
+
+    heartbeat_stop = threading.Event()
+    heartbeat = threading.Thread(
+        target=_outbox_heartbeat_loop,
+        args=(heartbeat_stop,),
+        name="outbox-heartbeat",
+        daemon=True,
+    )
+    heartbeat.start()
     try:
-        process_message_outbox_tick(c)
+        _run_message_outbox_loop()
     finally:
-        c.close()
+        heartbeat_stop.set()
+        heartbeat.join(timeout=10)
+
+
+def _run_message_outbox_loop() -> None:
+    conn = None
+    listen_conn = None
+    last_housekeeping_mono: Optional[float] = None
+    while True:
+        try:
+            if listen_conn is None:
+                listen_conn = _open_outbox_listen_connection()
+            if conn is None:
+                conn = get_db_connection()
+
+            now_mono = time.monotonic()
+            if (
+                last_housekeeping_mono is None
+                or now_mono - last_housekeeping_mono >= _OUTBOX_HOUSEKEEPING_SEC
+            ):
+                _outbox_housekeeping(conn)
+                last_housekeeping_mono = now_mono
+
+            if dispatch_message_outbox(conn) > 0:
+                continue
+
+            timeout = _outbox_wait_timeout(_seconds_until_next_outbox_due(conn))
+            conn.commit()
+            if last_housekeeping_mono is not None:
+                timeout = min(
+                    timeout,
+                    max(
+                        float(_OUTBOX_WORKER_MIN_WAIT_SEC),
+                        _OUTBOX_HOUSEKEEPING_SEC - (time.monotonic() - last_housekeeping_mono),
+                    ),
+                )
+            _wait_for_outbox_notify(listen_conn, timeout)
+        except Exception:
+            logger.exception("worker_message_outbox: erro no loop; reconectando em 5s")
+            for c in (conn, listen_conn):
+                try:
+                    if c is not None:
+                        c.close()
+                except Exception:
+                    pass
+            conn = None
+            listen_conn = None
+            time.sleep(5)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # SIGTERM (docker stop) → SystemExit, para o atexit drenar o buffer da auditoria JSONL.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    run_message_outbox_worker()